@@ -1,10 +1,24 @@
+import argparse
+import sys
 import customtkinter as ctk
 from modules.modern_editor_ui import ModernEditorUI
+from modules.crypto_backends import format_codec_info, codec_info
+from modules.json_engine import format_engine_info, engine_info
 
 def main():
     """
     现代化主程序入口
     """
+    parser = argparse.ArgumentParser(description='丝之歌存档编辑器')
+    parser.add_argument('--codec-info', action='store_true', help='显示加密后端和JSON引擎的自测结果后退出')
+    args = parser.parse_args()
+    
+    if args.codec_info:
+        print(format_codec_info())
+        print(format_engine_info())
+        # 环境变量指定了无效的后端时以非零状态退出
+        sys.exit(1 if codec_info()['override_errors'] or engine_info()['override_error'] else 0)
+    
     # 创建CustomTkinter根窗口
     root = ctk.CTk()
     
@@ -0,0 +1,275 @@
+import os
+import json
+import lzma
+import zlib
+import time
+import hashlib
+from datetime import datetime
+from .save_codec import SaveCodec, atomic_write
+
+# 压缩方式 -> (压缩函数, 解压函数)
+COMPRESSORS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+class BackupStore:
+    """
+    按内容寻址的压缩备份仓库
+
+    每个备份对象以原文件内容的SHA-256命名，相同内容只保存一次。
+    .dat存档会先解密为明文再压缩（恢复时重新加密，且只在能逐字节还原时才这样做），
+    其他文件直接压缩原始字节。index.jsonl每行记录一次备份的路径、时间、哈希和元数据。
+
+    目录结构:
+        backups/
+        ├── index.jsonl
+        └── objects/ab/abcdef...  # 压缩后的对象
+    """
+    INDEX_NAME = 'index.jsonl'
+    OBJECTS_DIR = 'objects'
+
+    def __init__(self, root, compression='zlib', codec=None):
+        """
+        初始化备份仓库，目录在第一次备份时创建
+
+        参数:
+            root: 仓库根目录
+            compression: 新对象使用的压缩方式（zlib或lzma）
+            codec: 用于解密/重新加密.dat存档的SaveCodec，默认新建
+        """
+        if compression not in COMPRESSORS:
+            raise ValueError(f'未知的压缩方式: {compression}')
+        self.root = root
+        self.compression = compression
+        self.codec = codec or SaveCodec()
+        self.index_path = os.path.join(root, self.INDEX_NAME)
+        self._entries = None
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, self.OBJECTS_DIR, digest[:2], digest)
+
+    def entries(self, file_path=None):
+        """
+        读取备份记录，按时间从旧到新排列
+
+        参数:
+            file_path: 如果提供，只返回该文件的备份
+
+        返回:
+            list: 备份记录字典列表
+        """
+        if self._entries is None:
+            self._entries = []
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip()
+                        if line:
+                            self._entries.append(json.loads(line))
+        if file_path is None:
+            return list(self._entries)
+        file_path = os.path.abspath(file_path)
+        return [entry for entry in self._entries if entry['path'] == file_path]
+
+    def _find_object(self, digest):
+        """
+        查找已保存的对象记录，用于去重
+        """
+        for entry in reversed(self.entries()):
+            if entry['hash'] == digest and os.path.exists(self._object_path(digest)):
+                return entry
+        return None
+
+    def _pack(self, content):
+        """
+        选择对象的存储形式: 能逐字节还原的.dat存档保存明文，否则保存原始字节
+        """
+        try:
+            plaintext = self.codec.decrypt(content)
+            if self.codec.encrypt(plaintext) == content:
+                return 'dat-plaintext', plaintext
+        except ValueError:
+            pass
+        return 'raw', content
+
+    def _metadata(self, file_path):
+        """
+        读取存档的少量元数据，非存档文件返回空字典
+        """
+        try:
+            return self.codec.peek_metadata(file_path)
+        except (ValueError, IndexError):
+            return {}
+
+    def add(self, file_path):
+        """
+        备份文件的当前内容
+
+        参数:
+            file_path: 要备份的文件
+
+        返回:
+            dict: 备份记录；文件不存在时返回None
+        """
+        if not os.path.exists(file_path):
+            return None
+        file_path = os.path.abspath(file_path)
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+
+        # 与该文件最近一次备份相同时不再追加记录
+        history = self.entries(file_path)
+        if history and history[-1]['hash'] == digest and os.path.exists(self._object_path(digest)):
+            return history[-1]
+
+        existing = self._find_object(digest)
+        if existing is not None:
+            encoding, compression, stored = existing['encoding'], existing['compression'], existing['stored']
+        else:
+            encoding, payload = self._pack(content)
+            compression = self.compression
+            compressed = COMPRESSORS[compression][0](bytes(payload))
+            stored = len(compressed)
+            object_path = self._object_path(digest)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            with atomic_write(object_path) as f:
+                f.write(compressed)
+
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'path': file_path,
+            'hash': digest,
+            'size': len(content),
+            'stored': stored,
+            'encoding': encoding,
+            'compression': compression,
+            'metadata': self._metadata(file_path),
+        }
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._entries.append(entry)
+        return entry
+
+    def find(self, prefix):
+        """
+        按哈希前缀查找备份记录
+
+        参数:
+            prefix: 哈希的前缀（至少4个字符）
+
+        返回:
+            dict: 最近一条匹配的备份记录
+        """
+        if len(prefix) < 4:
+            raise ValueError('哈希前缀至少需要4个字符')
+        matches = {entry['hash']: entry for entry in self.entries() if entry['hash'].startswith(prefix)}
+        if not matches:
+            raise KeyError(f'没有找到备份: {prefix}')
+        if len(matches) > 1:
+            raise ValueError(f'哈希前缀不唯一: {prefix}')
+        return next(iter(matches.values()))
+
+    def read(self, entry):
+        """
+        读取备份的原始文件内容
+
+        参数:
+            entry: 备份记录
+
+        返回:
+            bytes: 与备份时逐字节相同的文件内容
+        """
+        with open(self._object_path(entry['hash']), 'rb') as f:
+            payload = COMPRESSORS[entry['compression']][1](f.read())
+        if entry['encoding'] == 'dat-plaintext':
+            payload = bytes(self.codec.encrypt(payload))
+        if hashlib.sha256(payload).hexdigest() != entry['hash']:
+            raise ValueError(f"备份内容校验失败: {entry['hash']}")
+        return payload
+
+    def restore(self, entry, target_path=None):
+        """
+        将备份恢复到文件
+
+        参数:
+            entry: 备份记录
+            target_path: 目标路径，默认恢复到原文件位置
+
+        返回:
+            str: 写入的文件路径
+        """
+        target_path = target_path or entry['path']
+        content = self.read(entry)
+        with atomic_write(target_path) as f:
+            f.write(content)
+        return target_path
+
+    def gc(self, keep=None, max_age_days=None):
+        """
+        按数量和时间清理备份记录，并删除不再被引用的对象；每个文件最近的一次备份总是保留
+
+        参数:
+            keep: 每个文件最多保留的备份数
+            max_age_days: 删除早于该天数的备份
+
+        返回:
+            dict: 删除的记录数、对象数和释放的字节数
+        """
+        entries = self.entries()
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+
+        # 从新到旧遍历，统计每个文件已保留的数量
+        kept = []
+        counts = {}
+        for entry in reversed(entries):
+            count = counts.get(entry['path'], 0)
+            expired = cutoff is not None and datetime.fromisoformat(entry['time']).timestamp() < cutoff
+            if count == 0 or not ((keep is not None and count >= keep) or expired):
+                kept.append(entry)
+                counts[entry['path']] = count + 1
+        kept.reverse()
+
+        if len(kept) != len(entries):
+            os.makedirs(self.root, exist_ok=True)
+            with atomic_write(self.index_path, 'w', encoding='utf-8') as f:
+                for entry in kept:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._entries = kept
+
+        # 删除未被任何记录引用的对象
+        referenced = {entry['hash'] for entry in kept}
+        objects_removed = 0
+        bytes_freed = 0
+        objects_dir = os.path.join(self.root, self.OBJECTS_DIR)
+        if os.path.isdir(objects_dir):
+            for dir_path, _, file_names in os.walk(objects_dir):
+                for name in file_names:
+                    if name not in referenced:
+                        path = os.path.join(dir_path, name)
+                        bytes_freed += os.path.getsize(path)
+                        os.remove(path)
+                        objects_removed += 1
+
+        return {
+            'entries_removed': len(entries) - len(kept),
+            'objects_removed': objects_removed,
+            'bytes_freed': bytes_freed,
+        }
+
+    def disk_usage(self):
+        """
+        统计对象占用的磁盘空间和对应的原始大小
+
+        返回:
+            dict: 对象数、压缩后字节数，以及所有备份记录的原始字节数
+        """
+        objects = {entry['hash']: entry['stored'] for entry in self.entries()}
+        return {
+            'entries': len(self.entries()),
+            'objects': len(objects),
+            'stored_bytes': sum(objects.values()),
+            'original_bytes': sum(entry['size'] for entry in self.entries()),
+        }
@@ -0,0 +1,543 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .save_codec import SaveCodec
+from .backup_store import BackupStore
+from .delta_backups import DeltaBackupStore
+from .json_patch import changed_paths
+from .scene_store import SceneStore
+from .extract_keys import KeySchema, SCHEMA_FILE, infer_schema
+from . import json_engine
+from .json_engine import ENGINES, format_engine_info, engine_info
+from .crypto_backends import format_codec_info, codec_info, best_time
+
+# 工作进程内复用的编解码器
+_worker_codec = None
+
+def _get_codec():
+    """
+    获取当前进程的编解码器实例
+    """
+    global _worker_codec
+    if _worker_codec is None:
+        _worker_codec = SaveCodec()
+    return _worker_codec
+
+def _output_path(file_path, output_dir, ext):
+    """
+    根据输入文件和输出目录计算输出文件路径
+    """
+    base_name = os.path.splitext(os.path.basename(file_path))[0] + ext
+    return os.path.join(output_dir or os.path.dirname(file_path), base_name)
+
+def decode_one(file_path, output_dir=None):
+    """
+    解码单个.dat存档为格式化的JSON文件
+
+    参数:
+        file_path: .dat文件路径
+        output_dir: 输出目录，默认与输入文件相同
+
+    返回:
+        dict: 处理结果
+    """
+    data = _get_codec().decode_file(file_path)
+    output_file = _output_path(file_path, output_dir, '.json')
+    with open(output_file, 'wb') as f:
+        f.write(json_engine.dumps_pretty(data))
+    return {'output': output_file}
+
+def encode_one(file_path, output_dir=None):
+    """
+    将JSON文件编码为游戏可读取的.dat存档
+
+    参数:
+        file_path: .json文件路径
+        output_dir: 输出目录，默认与输入文件相同
+
+    返回:
+        dict: 处理结果
+    """
+    with open(file_path, 'rb') as f:
+        data = json_engine.loads(f.read())
+    output_file = _output_path(file_path, output_dir, '.dat')
+    _get_codec().write_file(output_file, data)
+    return {'output': output_file}
+
+def verify_one(file_path, output_dir=None):
+    """
+    解码后重新编码，检查结果与原文件是否逐字节一致
+
+    参数:
+        file_path: .dat文件路径
+        output_dir: 未使用
+
+    返回:
+        dict: 处理结果
+    """
+    with open(file_path, 'rb') as f:
+        original = f.read()
+    codec = _get_codec()
+    identical = codec.encode(codec.decode(original)) == original
+    if not identical:
+        raise ValueError('重新编码后的数据与原文件不一致')
+    return {'identical': True}
+
+def _run_one(task, file_path, output_dir):
+    """
+    执行单个任务并把结果或异常整理为一条记录
+    """
+    start = time.perf_counter()
+    result = {'file': file_path}
+    try:
+        result['bytes'] = os.path.getsize(file_path)
+        result.update(TASKS[task][0](file_path, output_dir))
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+# 子命令 -> (处理函数, 目录中匹配的文件模式)
+TASKS = {
+    'decode': (decode_one, '*.dat'),
+    'encode': (encode_one, '*.json'),
+    'roundtrip-verify': (verify_one, '*.dat'),
+}
+
+def collect_files(inputs, pattern):
+    """
+    展开命令行给出的文件、目录和通配符
+
+    参数:
+        inputs: 路径、目录或glob模式列表
+        pattern: 目录中匹配的文件模式
+
+    返回:
+        list: 去重后的文件路径列表
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(glob.glob(os.path.join(item, pattern)))
+        elif os.path.isfile(item):
+            matches = [item]
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+        files.extend(m for m in matches if os.path.isfile(m))
+    return list(dict.fromkeys(files))
+
+def run_batch(args):
+    """
+    使用进程池批量处理存档，逐行输出JSON结果并在最后汇总吞吐量
+    """
+    files = collect_files(args.inputs, TASKS[args.command][1])
+    if not files:
+        print("没有找到要处理的文件", file=sys.stderr)
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    total_bytes = 0
+    failed = 0
+
+    def report(result):
+        nonlocal total_bytes, failed
+        total_bytes += result.get('bytes', 0)
+        if result['status'] != 'ok':
+            failed += 1
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    if args.jobs <= 1:
+        for file_path in files:
+            report(_run_one(args.command, file_path, args.output_dir))
+    else:
+        # 限制同时排队的任务数，避免一次性提交成百上千个任务
+        max_pending = args.jobs * 2
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            pending = set()
+            for file_path in files:
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        report(future.result())
+                pending.add(executor.submit(_run_one, args.command, file_path, args.output_dir))
+            for future in wait(pending).done:
+                report(future.result())
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"共处理 {len(files)} 个文件，失败 {failed} 个，耗时 {elapsed:.2f} 秒，"
+          f"{len(files) / elapsed:.1f} 文件/秒，{total_bytes / (1024 * 1024) / elapsed:.1f} MB/秒",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+def inflate_save(data, factor):
+    """
+    将存档中的sceneData列表重复factor次，生成用于测试的大存档
+
+    参数:
+        data: 存档数据
+        factor: 膨胀倍数
+
+    返回:
+        dict: 膨胀后的存档数据
+    """
+    inflated = dict(data)
+    scene_data = {}
+    for name, section in data.get('sceneData', {}).items():
+        if isinstance(section, dict) and isinstance(section.get('serializedList'), list):
+            section = dict(section, serializedList=section['serializedList'] * factor)
+        scene_data[name] = section
+    inflated['sceneData'] = scene_data
+    return inflated
+
+def bench(args):
+    """
+    比较不同线程数下膨胀存档的解密和加密速度
+    """
+    data = SaveCodec().decode_file(args.file)
+    encrypted = SaveCodec().encode(inflate_save(data, args.inflate))
+    plaintext = SaveCodec().decrypt(encrypted)
+    size_mb = len(plaintext) / (1024 * 1024)
+
+    print(f"文件: {os.path.basename(args.file)}  膨胀倍数: {args.inflate}  明文大小: {size_mb:.1f} MB")
+    print(f"{'线程数':>6} {'解密(ms)':>10} {'解密MB/s':>10} {'加密(ms)':>10} {'加密MB/s':>10}")
+
+    for threads in args.threads:
+        codec = SaveCodec(max_workers=threads, parallel_threshold=0 if threads > 1 else None)
+        decrypt_time = best_time(lambda: codec.decrypt(encrypted), args.repeat)
+        encrypt_time = best_time(lambda: codec.encrypt(plaintext), args.repeat)
+        print(f"{threads:>6} {decrypt_time * 1000:>10.1f} {size_mb / decrypt_time:>10.1f} "
+              f"{encrypt_time * 1000:>10.1f} {size_mb / encrypt_time:>10.1f}")
+
+def backup_list(args):
+    """
+    列出备份记录
+    """
+    store = BackupStore(args.dir)
+    for entry in store.entries(args.file):
+        metadata = ' '.join(f"{key}={value}" for key, value in entry['metadata'].items())
+        print(f"{entry['hash'][:12]}  {entry['time']}  {entry['size']:>9}  {entry['path']}  {metadata}")
+    usage = store.disk_usage()
+    print(f"共 {usage['entries']} 条记录，{usage['objects']} 个对象，占用 {usage['stored_bytes'] / 1024:.0f} KB"
+          f"（原始大小 {usage['original_bytes'] / 1024:.0f} KB）", file=sys.stderr)
+    return 0
+
+def backup_restore(args):
+    """
+    按哈希前缀恢复备份
+    """
+    store = BackupStore(args.dir)
+    try:
+        target = store.restore(store.find(args.hash), args.output)
+    except (KeyError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(f"已恢复到: {target}", file=sys.stderr)
+    return 0
+
+def backup_history(args):
+    """
+    列出增量备份的版本，或显示某个版本的改动
+    """
+    store = DeltaBackupStore(args.dir)
+    if args.show is not None:
+        try:
+            patch = store.changes(args.file, args.show)
+        except KeyError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        for op in patch:
+            value = '' if op['op'] == 'remove' else ' ' + json.dumps(op['value'], ensure_ascii=False)[:200]
+            print(f"{op['op']:<8} {op['path']}{value}")
+        return 0
+
+    versions = store.versions(args.file)
+    if not versions:
+        print(f"没有增量备份: {args.file}", file=sys.stderr)
+        return 1
+    for record in versions:
+        if record.get('base'):
+            detail = '完整快照'
+        else:
+            paths = changed_paths(record['patch'])
+            detail = f"{len(paths)} 处改动: " + ', '.join('/'.join(path) for path in paths[:3]) + (' ...' if len(paths) > 3 else '')
+        print(f"{record['n']:>5}  {record['time']}  {record['hash'][:12]}  {detail}")
+    return 0
+
+def backup_restore_version(args):
+    """
+    将增量备份的某个版本写入文件
+    """
+    store = DeltaBackupStore(args.dir)
+    try:
+        target, identical = store.restore_file(args.file, args.version, args.output)
+    except KeyError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(f"已恢复到: {target}" + ('' if identical else '（内容与备份时不完全相同）'), file=sys.stderr)
+    return 0
+
+def backup_gc(args):
+    """
+    按数量和时间清理备份
+    """
+    if args.keep is None and args.max_age_days is None:
+        print("请至少指定 --keep 或 --max-age-days", file=sys.stderr)
+        return 1
+    result = BackupStore(args.dir).gc(keep=args.keep, max_age_days=args.max_age_days)
+    delta_result = DeltaBackupStore(args.dir).gc(keep=args.keep, max_age_days=args.max_age_days)
+    print(f"删除 {result['entries_removed']} 条记录、{result['objects_removed']} 个对象、"
+          f"{delta_result['versions_removed']} 个增量版本，"
+          f"释放 {(result['bytes_freed'] + delta_result['bytes_freed']) / 1024:.0f} KB", file=sys.stderr)
+    return 0
+
+def json_check(args):
+    """
+    检查各JSON引擎的往返一致性，并比较解析和格式化输出的速度
+
+    存档的保存路径是“引擎解析 -> 标准库序列化 -> 加密”，因此要求引擎解析的结果经标准库序列化后
+    与标准库解析的结果逐字节相同（浮点数、键顺序和非ASCII文本都不能变），重新加密后与原存档一致。
+    """
+    codec = SaveCodec()
+    pretty_engine = json_engine.get_engine().pretty_name
+    failed = 0
+
+    print(f"{'文件':<20} {'引擎':<8} {'解析(ms)':>9} {'格式化(ms)':>10} {'存档往返':>8} {'格式化一致':>10}")
+    for file_path in args.files:
+        with open(file_path, 'rb') as f:
+            original = f.read()
+        is_dat = os.path.splitext(file_path)[1].lower() == '.dat'
+        text = bytes(codec.decrypt(original)) if is_dat else original
+        reference = json.loads(text)
+        canonical = json.dumps(reference, ensure_ascii=False)
+        encrypted = original if is_dat else bytes(codec.encode(reference))
+        pretty = json.dumps(reference, ensure_ascii=False, indent=2).encode('utf-8')
+
+        for name, engine_class in ENGINES.items():
+            try:
+                engine = engine_class()
+            except ImportError:
+                print(f"{os.path.basename(file_path):<20} {name:<8} {'未安装':>9}")
+                continue
+            parsed = engine.loads(text)
+            round_trip = json.dumps(parsed, ensure_ascii=False) == canonical and bytes(codec.encode(parsed)) == encrypted
+            pretty_exact = engine.dumps_pretty(reference) == pretty
+            if not round_trip or (name == pretty_engine and not pretty_exact):
+                failed += 1
+
+            parse_time = best_time(lambda: engine.loads(text), args.repeat)
+            pretty_time = best_time(lambda: engine.dumps_pretty(reference), args.repeat)
+            print(f"{os.path.basename(file_path):<20} {name:<8} {parse_time * 1000:>9.2f} {pretty_time * 1000:>10.2f} "
+                  f"{'一致' if round_trip else '不一致':>8} {'一致' if pretty_exact else '不一致':>10}")
+
+    print(format_engine_info(), file=sys.stderr)
+    return 1 if failed else 0
+
+# memory-check的上限（明文大小的倍数）: 解密的峰值，以及解码时除解析出的文档本身以外的峰值
+DECRYPT_PEAK_LIMIT = 2.0
+DECODE_OVERHEAD_LIMIT = 2.5
+
+def _traced(func):
+    """
+    在tracemalloc下运行func，返回(结果, 结束时仍占用的字节数, 峰值字节数)
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+def memory_check(args):
+    """
+    用tracemalloc测量膨胀存档解码时的内存峰值，超过上限时返回非零
+
+    decrypt_file（mmap读取+解密）的峰值应不超过明文的DECRYPT_PEAK_LIMIT倍；
+    decode_file（解密+解析）的峰值中包含解析出的文档本身（Python对象，约为明文的3.7倍），
+    上限只约束除文档以外的临时占用（明文缓冲区、解析时的文本副本），即 峰值 - 结果 <= DECODE_OVERHEAD_LIMIT倍明文。
+    mmap映射的文件内容不经过Python的内存分配器，不计入。
+    """
+    data = inflate_save(SaveCodec().decode_file(args.file), args.inflate)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, 'inflated.dat')
+        with open(file_path, 'wb') as f:
+            f.write(SaveCodec().encode(data))
+        del data
+
+        plaintext, _, decrypt_peak = _traced(lambda: SaveCodec().decrypt_file(file_path))
+        size = len(plaintext)
+        del plaintext
+        document, document_size, decode_peak = _traced(lambda: SaveCodec().decode_file(file_path))
+        del document
+
+    decrypt_ratio = decrypt_peak / size
+    overhead_ratio = (decode_peak - document_size) / size
+    print(f"文件: {os.path.basename(args.file)}  膨胀倍数: {args.inflate}  明文大小: {size / (1024 * 1024):.1f} MB  "
+          f"JSON引擎: {json_engine.get_engine().parser_name}")
+    print(f"decrypt_file 峰值: {decrypt_peak / (1024 * 1024):.1f} MB = {decrypt_ratio:.2f}x 明文（上限 {DECRYPT_PEAK_LIMIT}x）")
+    print(f"decode_file  峰值: {decode_peak / (1024 * 1024):.1f} MB = {decode_peak / size:.2f}x 明文，"
+          f"其中文档 {document_size / size:.2f}x，临时占用 {overhead_ratio:.2f}x（上限 {DECODE_OVERHEAD_LIMIT}x）")
+    failed = decrypt_ratio > DECRYPT_PEAK_LIMIT or overhead_ratio > DECODE_OVERHEAD_LIMIT
+    if failed:
+        print('内存峰值超过上限', file=sys.stderr)
+    return 1 if failed else 0
+
+def _records_size(records):
+    """
+    估算记录列表（dict、键和值对象）占用的字节数，驻留的字符串只计算一次
+    """
+    seen = set()
+    total = sys.getsizeof(records)
+    for record in records:
+        total += sys.getsizeof(record)
+        for obj in (*record, *record.values()):
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                total += sys.getsizeof(obj)
+    return total
+
+def scene_stats(args):
+    """
+    将sceneData的记录列表转换为列式存储，比较内存占用并检查序列化结果是否与原JSON一致
+    """
+    codec = SaveCodec()
+    failed = 0
+    print(f"{'文件':<20} {'部分':<16} {'行数':>6} {'场景':>5} {'ID':>5} {'dict(KB)':>9} {'列式(KB)':>9} {'往返':>4}")
+    for file_path in args.files:
+        data = codec.decode_file(file_path)
+        scene_data = data.get('sceneData', {})
+        store = SceneStore.from_scene_data(scene_data)
+        for name, table in store.tables.items():
+            records = scene_data[name]['serializedList']
+            exact = table.dumps() == json.dumps(records, ensure_ascii=False)
+            failed += not exact
+            print(f"{os.path.basename(file_path):<20} {name:<16} {len(table):>6} {len(table.scenes.strings):>5} "
+                  f"{len(table.ids.strings):>5} {_records_size(records) / 1024:>9.1f} {table.nbytes() / 1024:>9.1f} "
+                  f"{'一致' if exact else '不一致':>4}")
+    return 1 if failed else 0
+
+def key_schema(args):
+    """
+    一次遍历多个存档推断键架构并写入文件，--merge时并入已有的架构文件
+    """
+    files = collect_files(args.inputs, '*.dat')
+    if not files:
+        print('没有找到.dat文件', file=sys.stderr)
+        return 1
+    schema = KeySchema.load(args.output) if args.merge and os.path.exists(args.output) else KeySchema()
+    previous = schema.documents
+    codec = SaveCodec()
+    # 逐个解码，同一时间只有一个存档在内存中
+    infer_schema((codec.decode_file(file_path) for file_path in files), schema)
+    schema.save(args.output)
+    paths = sum(1 for _ in schema.paths())
+    print(f'已合并 {len(files)} 个存档（架构中共 {schema.documents} 个，此前 {previous} 个），'
+          f'{paths} 条路径，{os.path.getsize(args.output) / 1024:.1f} KB: {args.output}')
+    return 0
+
+class _CodecInfoAction(argparse.Action):
+    """
+    --codec-info: 显示加密后端和JSON引擎的自测结果后退出
+    """
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(option_strings, dest, nargs=0, default=argparse.SUPPRESS, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(format_codec_info())
+        print(format_engine_info())
+        # 环境变量指定了无效的后端时以非零状态退出
+        parser.exit(1 if codec_info()['override_errors'] or engine_info()['override_error'] else 0)
+
+def main(argv=None):
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(prog='python -m modules.codec', description='存档编解码命令行工具')
+    parser.add_argument('--codec-info', action=_CodecInfoAction, help='显示加密后端和JSON引擎的自测结果后退出')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for command, help_text in (('decode', '将.dat存档解码为JSON文件'),
+                               ('encode', '将JSON文件编码为.dat存档'),
+                               ('roundtrip-verify', '检查存档解码后重新编码是否逐字节一致')):
+        batch_parser = subparsers.add_parser(command, help=help_text)
+        batch_parser.add_argument('inputs', nargs='+', help='文件、目录或通配符')
+        batch_parser.add_argument('-o', '--output-dir', help='输出目录，默认与输入文件相同')
+        batch_parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='并行进程数')
+        batch_parser.set_defaults(func=run_batch)
+
+    bench_parser = subparsers.add_parser('bench', help='比较不同线程数下的编解码速度')
+    bench_parser.add_argument('file', nargs='?', default=os.path.join(project_root, 'sample_user.dat'), help='用作基准的存档文件')
+    bench_parser.add_argument('--inflate', type=int, default=50, help='sceneData列表的膨胀倍数')
+    bench_parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8], help='要比较的线程数')
+    bench_parser.add_argument('--repeat', type=int, default=3, help='每项测试的重复次数')
+    bench_parser.set_defaults(func=bench)
+
+    check_parser = subparsers.add_parser('json-check', help='检查各JSON引擎的往返一致性并比较速度')
+    check_parser.add_argument('files', nargs='*', default=[os.path.join(project_root, 'sample_user.dat'),
+                                                           os.path.join(project_root, 'data', 'key_example.json')],
+                              help='用于检查的.dat存档或JSON文件')
+    check_parser.add_argument('--repeat', type=int, default=5, help='每项测试的重复次数')
+    check_parser.set_defaults(func=json_check)
+
+    memory_parser = subparsers.add_parser('memory-check', help='用tracemalloc检查膨胀存档解码时的内存峰值')
+    memory_parser.add_argument('file', nargs='?', default=os.path.join(project_root, 'sample_user.dat'), help='用作基准的存档文件')
+    memory_parser.add_argument('--inflate', type=int, default=50, help='sceneData列表的膨胀倍数')
+    memory_parser.set_defaults(func=memory_check)
+
+    scenes_parser = subparsers.add_parser('scenes', help='统计sceneData记录列表的列式存储占用并检查往返一致性')
+    scenes_parser.add_argument('files', nargs='*', default=[os.path.join(project_root, 'sample_user.dat')],
+                               help='.dat存档')
+    scenes_parser.set_defaults(func=scene_stats)
+
+    schema_parser = subparsers.add_parser('schema', help='从存档推断键架构（列表元素合并为[*]）')
+    schema_parser.add_argument('inputs', nargs='*', default=[project_root], help='文件、目录或通配符，默认为项目根目录')
+    schema_parser.add_argument('-o', '--output', default=SCHEMA_FILE, help='架构文件')
+    schema_parser.add_argument('--merge', action='store_true', help='并入已有的架构文件而不是覆盖')
+    schema_parser.set_defaults(func=key_schema)
+
+    backup_dir = os.path.join(project_root, 'backups')
+    list_parser = subparsers.add_parser('backups', help='列出备份记录')
+    list_parser.add_argument('file', nargs='?', help='只列出该文件的备份')
+    list_parser.add_argument('--dir', default=backup_dir, help='备份仓库目录')
+    list_parser.set_defaults(func=backup_list)
+
+    restore_parser = subparsers.add_parser('restore', help='按哈希前缀恢复备份')
+    restore_parser.add_argument('hash', help='备份哈希或其前缀')
+    restore_parser.add_argument('-o', '--output', help='恢复到的文件，默认为原文件位置')
+    restore_parser.add_argument('--dir', default=backup_dir, help='备份仓库目录')
+    restore_parser.set_defaults(func=backup_restore)
+
+    history_parser = subparsers.add_parser('history', help='列出文件的增量备份版本')
+    history_parser.add_argument('file', help='备份的文件')
+    history_parser.add_argument('--show', type=int, metavar='N', help='显示版本N相对于上一版本的改动')
+    history_parser.add_argument('--dir', default=backup_dir, help='备份仓库目录')
+    history_parser.set_defaults(func=backup_history)
+
+    version_parser = subparsers.add_parser('restore-version', help='恢复增量备份的某个版本')
+    version_parser.add_argument('file', help='备份的文件')
+    version_parser.add_argument('version', type=int, nargs='?', help='版本号，默认为最新版本')
+    version_parser.add_argument('-o', '--output', help='恢复到的文件，默认为原文件位置')
+    version_parser.add_argument('--dir', default=backup_dir, help='备份仓库目录')
+    version_parser.set_defaults(func=backup_restore_version)
+
+    gc_parser = subparsers.add_parser('gc', help='按数量和时间清理备份')
+    gc_parser.add_argument('--keep', type=int, help='每个文件最多保留的备份数')
+    gc_parser.add_argument('--max-age-days', type=float, help='删除早于该天数的备份')
+    gc_parser.add_argument('--dir', default=backup_dir, help='备份仓库目录')
+    gc_parser.set_defaults(func=backup_gc)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
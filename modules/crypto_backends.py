@@ -0,0 +1,248 @@
+import os
+import time
+import base64
+import binascii
+import threading
+import warnings
+
+# 环境变量: 强制使用指定的AES/Base64后端
+AES_BACKEND_ENV = 'SILKSONG_AES_BACKEND'
+BASE64_BACKEND_ENV = 'SILKSONG_BASE64_BACKEND'
+
+# FIPS-197 AES-256 测试向量
+_TEST_KEY = bytes(range(32))
+_TEST_PLAIN = bytes.fromhex('00112233445566778899aabbccddeeff')
+_TEST_CIPHER = bytes.fromhex('8ea2b7ca516745bfeafc49904b496089')
+
+# 自测使用的合成数据大小（48字节的整数倍）
+_BENCH_BYTES = 48 * 4096
+
+class _PycryptodomeECB:
+    """
+    pycryptodome的AES-ECB实现，支持直接写入输出缓冲区
+    """
+    def __init__(self, key):
+        from Crypto.Cipher import AES
+        # ECB模式的AES对象只保存轮密钥，可以在多个线程间共享
+        self._cipher = AES.new(key, AES.MODE_ECB)
+
+    def encrypt(self, data):
+        return self._cipher.encrypt(data)
+
+    def decrypt(self, data, output=None):
+        return self._cipher.decrypt(data, output=output)
+
+class _CryptographyECB:
+    """
+    cryptography包的AES-ECB实现，每个线程使用独立的加解密上下文
+    """
+    def __init__(self, key):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        self._cipher = Cipher(algorithms.AES(key), modes.ECB())
+        self._local = threading.local()
+
+    def _contexts(self):
+        contexts = getattr(self._local, 'contexts', None)
+        if contexts is None:
+            contexts = self._local.contexts = (self._cipher.encryptor(), self._cipher.decryptor())
+        return contexts
+
+    def encrypt(self, data):
+        return self._contexts()[0].update(data)
+
+    def decrypt(self, data, output=None):
+        result = self._contexts()[1].update(data)
+        if output is None:
+            return result
+        output[:len(result)] = result
+
+def _import_pybase64():
+    import pybase64
+    return (lambda data: pybase64.b64decode(data),
+            lambda data: pybase64.b64encode(data))
+
+# 名称 -> 创建AES-ECB对象的工厂函数（参数为密钥）
+AES_BACKENDS = {
+    'pycryptodome': _PycryptodomeECB,
+    'cryptography': _CryptographyECB,
+}
+
+# 名称 -> 返回(解码函数, 编码函数)的工厂函数
+BASE64_BACKENDS = {
+    'binascii': lambda: (binascii.a2b_base64, lambda data: binascii.b2a_base64(data, newline=False)),
+    'base64': lambda: (base64.b64decode, base64.b64encode),
+    'pybase64': _import_pybase64,
+}
+
+class CryptoBackend:
+    """
+    选定的AES和Base64后端组合
+    """
+    def __init__(self, aes_name, base64_name):
+        self.aes_name = aes_name
+        self.base64_name = base64_name
+        self._aes_factory = AES_BACKENDS[aes_name]
+        self.b64decode, self.b64encode = BASE64_BACKENDS[base64_name]()
+
+    def new_cipher(self, key):
+        """
+        创建AES-ECB对象
+
+        参数:
+            key: AES密钥
+
+        返回:
+            具有encrypt(data)和decrypt(data, output=None)方法的对象
+        """
+        return self._aes_factory(key)
+
+    def __repr__(self):
+        return f'CryptoBackend(aes={self.aes_name!r}, base64={self.base64_name!r})'
+
+_lock = threading.Lock()
+_selected = None
+_report = None
+
+def best_time(func, repeat=3):
+    """
+    多次运行并返回最短耗时（秒）
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def _probe_aes(name, buffer):
+    """
+    检查AES后端是否可用且结果正确，并测量加解密耗时
+    """
+    try:
+        cipher = AES_BACKENDS[name](_TEST_KEY)
+        if cipher.encrypt(_TEST_PLAIN) != _TEST_CIPHER or cipher.decrypt(_TEST_CIPHER) != _TEST_PLAIN:
+            return {'available': True, 'correct': False}
+        encrypted = cipher.encrypt(buffer)
+        output = bytearray(len(buffer))
+        cipher.decrypt(encrypted, output=memoryview(output))
+        if output != buffer:
+            return {'available': True, 'correct': False}
+        seconds = best_time(lambda: cipher.decrypt(cipher.encrypt(buffer), output=memoryview(output)))
+        return {'available': True, 'correct': True, 'seconds': seconds}
+    except ImportError:
+        return {'available': False}
+    except Exception as e:
+        return {'available': True, 'correct': False, 'error': str(e)}
+
+def _probe_base64(name, buffer):
+    """
+    检查Base64后端是否可用且结果正确，并测量编解码耗时
+    """
+    try:
+        decode, encode = BASE64_BACKENDS[name]()
+        reference = binascii.b2a_base64(buffer, newline=False)
+        if bytes(encode(buffer)) != reference or bytes(decode(memoryview(reference))) != buffer:
+            return {'available': True, 'correct': False}
+        seconds = best_time(lambda: decode(encode(buffer)))
+        return {'available': True, 'correct': True, 'seconds': seconds}
+    except ImportError:
+        return {'available': False}
+    except Exception as e:
+        return {'available': True, 'correct': False, 'error': str(e)}
+
+def _override_error(results, override, kind):
+    """
+    检查环境变量指定的后端，返回错误说明；可以使用时返回None
+    """
+    if override not in results:
+        return f'未知的{kind}后端: {override}'
+    if not results[override].get('correct'):
+        return f'{kind}后端不可用: {override}'
+    return None
+
+def _choose(results, override, kind):
+    """
+    根据环境变量或自测结果选择后端；指定的后端无效时发出警告并改用自测选出的后端
+    """
+    if override:
+        error = _override_error(results, override, kind)
+        if error is None:
+            return override
+        warnings.warn(f'{error}，改为自动选择', RuntimeWarning, stacklevel=3)
+    usable = [name for name, result in results.items() if result.get('correct')]
+    if not usable:
+        raise RuntimeError(f'没有可用的{kind}后端')
+
+    # 测量有噪声，只有明显更快（超过10%）时才替换注册顺序靠前的后端
+    best = usable[0]
+    for name in usable[1:]:
+        if results[name]['seconds'] < results[best]['seconds'] * 0.9:
+            best = name
+    return best
+
+def get_backend():
+    """
+    获取当前进程使用的加密后端，首次调用时运行自测并选择最快的正确实现
+
+    返回:
+        CryptoBackend: 选定的后端
+    """
+    global _selected, _report
+    with _lock:
+        if _selected is None:
+            buffer = os.urandom(_BENCH_BYTES)
+            aes_results = {name: _probe_aes(name, buffer) for name in AES_BACKENDS}
+            base64_results = {name: _probe_base64(name, buffer) for name in BASE64_BACKENDS}
+            aes_override = os.environ.get(AES_BACKEND_ENV)
+            base64_override = os.environ.get(BASE64_BACKEND_ENV)
+
+            _selected = CryptoBackend(_choose(aes_results, aes_override, 'AES'),
+                                      _choose(base64_results, base64_override, 'Base64'))
+            _report = {
+                'aes': aes_results,
+                'base64': base64_results,
+                'selected': {'aes': _selected.aes_name, 'base64': _selected.base64_name},
+                'override': {'aes': aes_override, 'base64': base64_override},
+                'override_errors': [error for error in (
+                    aes_override and _override_error(aes_results, aes_override, 'AES'),
+                    base64_override and _override_error(base64_results, base64_override, 'Base64'),
+                ) if error],
+                'bench_bytes': _BENCH_BYTES,
+            }
+        return _selected
+
+def codec_info():
+    """
+    返回后端自测结果和选择情况
+
+    返回:
+        dict: 各后端的可用性、正确性、耗时以及选中的后端
+    """
+    get_backend()
+    return _report
+
+def format_codec_info():
+    """
+    将后端自测结果格式化为便于阅读的文本
+    """
+    info = codec_info()
+    size_mb = info['bench_bytes'] / (1024 * 1024)
+    lines = []
+    for kind, title in (('aes', 'AES-ECB'), ('base64', 'Base64')):
+        selected = info['selected'][kind]
+        override = info['override'][kind]
+        lines.append(f"{title} 后端: {selected}" + (f"（由环境变量指定: {override}）" if override == selected else "（自动选择）"))
+        for name, result in info[kind].items():
+            if not result.get('available'):
+                status = '未安装'
+            elif not result.get('correct'):
+                status = '结果错误' + (f": {result['error']}" if 'error' in result else '')
+            else:
+                status = f"{size_mb * 2 / result['seconds']:.1f} MB/秒"
+            marker = '*' if name == selected else ' '
+            lines.append(f"  {marker} {name:<14} {status}")
+    for error in info['override_errors']:
+        lines.append(f"环境变量无效: {error}")
+    return '\n'.join(lines)
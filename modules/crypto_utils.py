@@ -1,29 +1,20 @@
-import base64
-import json
-from Crypto.Cipher import AES
+from .save_codec import SaveCodec
+
+# 共享的编解码器实例，避免每次调用都重新创建AES对象
+_codec = SaveCodec()
 
 class CryptoUtils:
+    """
+    兼容旧接口的加密解密工具，实际工作委托给SaveCodec
+    """
     @staticmethod
     def remove_header(data):
         """
         移除C#固定头部和长度前缀
         """
         try:
-            # C# fixed header
-            csharp_header = bytes([0, 1, 0, 0, 0, 255, 255, 255, 255, 1, 0, 0, 0, 0, 0, 0, 0, 6, 1, 0, 0, 0])
-            
-            # Remove fixed header and ending byte 11
-            data = data[len(csharp_header):-1]
-            
-            # Remove LengthPrefixedString header
-            length_count = 0
-            for i in range(5):
-                length_count += 1
-                if (data[i] & 0x80) == 0:
-                    break
-            
-            data = data[length_count:]
-            return data
+            start, end = _codec.payload_bounds(data)
+            return data[start:end]
         except Exception as e:
             print(f'移除头部时出错: {str(e)}')
             return None
@@ -34,25 +25,7 @@ class CryptoUtils:
         解密数据
         """
         try:
-            # Base64解码
-            decoded = base64.b64decode(data)
-            
-            # AES解密 (ECB模式)
-            key = 'UKu52ePUBwetZ9wNX88o54dnfKRu0T1l'.encode('utf-8')[:32]  # 固定密钥
-            cipher = AES.new(key, AES.MODE_ECB)
-            decrypted = cipher.decrypt(decoded)
-            
-            # 移除PKCS7填充
-            padding_length = decrypted[-1]
-            if padding_length > AES.block_size:
-                raise ValueError("Invalid padding")
-            for i in range(1, padding_length + 1):
-                if decrypted[-i] != padding_length:
-                    raise ValueError("Invalid padding")
-            unpadded = decrypted[:-padding_length]
-            
-            # 返回UTF-8字符串
-            return unpadded.decode('utf-8')
+            return _codec.decrypt_payload(data).decode('utf-8')
         except Exception as e:
             print(f'解密失败: {str(e)}')
             return None
@@ -63,25 +36,7 @@ class CryptoUtils:
         加密数据
         """
         try:
-            # 转换为字节
-            if isinstance(data, str):
-                data = data.encode('utf-8')
-            
-            # PKCS7填充
-            block_size = AES.block_size
-            padding_length = block_size - (len(data) % block_size)
-            padded = data + bytes([padding_length] * padding_length)
-            
-            # AES加密 (ECB模式)
-            key = 'UKu52ePUBwetZ9wNX88o54dnfKRu0T1l'.encode('utf-8')[:32]  # 固定密钥
-            cipher = AES.new(key, AES.MODE_ECB)
-            encrypted = cipher.encrypt(padded)
-            
-            # Base64编码
-            encoded = base64.b64encode(encrypted)
-            
-            # 添加头部
-            return CryptoUtils.add_header(encoded)
+            return bytes(_codec.encrypt(data))
         except Exception as e:
             print(f'加密失败: {str(e)}')
             return None
@@ -91,40 +46,22 @@ class CryptoUtils:
         """
         生成带长度前缀的字符串
         """
-        result = bytearray()
-        
-        # 7-bit encoded int
-        while True:
-            # Get 7 bits
-            value = length & 0x7F
-            length >>= 7
-            
-            if length > 0:
-                # Set the high bit
-                value |= 0x80
-            
-            result.append(value)
-            
-            if length == 0:
-                break
-        
-        return bytes(result)
+        return SaveCodec.length_prefix(length)
     
     @staticmethod
     def add_header(data):
         """
         添加C#固定头部和长度前缀
         """
-        # C# fixed header
-        csharp_header = bytes([0, 1, 0, 0, 0, 255, 255, 255, 255, 1, 0, 0, 0, 0, 0, 0, 0, 6, 1, 0, 0, 0])
-        
-        # Generate LengthPrefixedString header
-        length_data = CryptoUtils.generate_length_prefixed_string(len(data))
-        
-        # Combine all parts
-        result = bytearray(csharp_header)
-        result.extend(length_data)
-        result.extend(data)
-        result.append(11)  # fixed ending byte
-        
-        return bytes(result)
\ No newline at end of file
+        return bytes(_codec.wrap(data))
+    
+    @staticmethod
+    def peek_metadata(file_path):
+        """
+        只解密存档开头部分，读取版本、日期、存档ID、游戏时间和钢魂模式
+        """
+        try:
+            return _codec.peek_metadata(file_path)
+        except Exception as e:
+            print(f'读取存档信息失败: {str(e)}')
+            return None
\ No newline at end of file
@@ -0,0 +1,299 @@
+import os
+import json
+import zlib
+import time
+import marshal
+import hashlib
+from datetime import datetime
+from . import json_patch
+from . import json_engine
+from .lazy_document import plain_document
+from .save_codec import SaveCodec, atomic_write
+
+def copy_document(data):
+    """
+    快速深拷贝JSON文档（marshal比copy.deepcopy快一个数量级）
+    """
+    return marshal.loads(marshal.dumps(plain_document(data)))
+
+def file_hash(file_path):
+    """
+    计算文件内容的SHA-256
+    """
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class DeltaBackupStore:
+    """
+    结构化增量备份: 每个文件保存一份完整的解码快照和之后的一串JSON补丁
+
+    每次保存只记录与上一版本的差异（通常只有几个字段），
+    补丁数达到rebase_every时重新保存一份完整快照，以限制恢复时需要重放的补丁数。
+
+    目录结构:
+        backups/deltas/<路径哈希>/
+        ├── chain.jsonl   # 每行一个版本: 完整快照的标记或补丁
+        └── base-<n>.zlib # 版本n的完整文档（压缩的JSON文本）
+    """
+    DELTAS_DIR = 'deltas'
+    CHAIN_NAME = 'chain.jsonl'
+
+    def __init__(self, root, rebase_every=20, codec=None):
+        """
+        初始化增量备份仓库，目录在第一次备份时创建
+
+        参数:
+            root: 备份仓库根目录
+            rebase_every: 两份完整快照之间最多的补丁数
+            codec: 用于读写.dat存档的SaveCodec，默认新建
+        """
+        self.root = root
+        self.rebase_every = rebase_every
+        self.codec = codec or SaveCodec()
+        # 绝对路径 -> (最新版本记录, 最新版本文档的副本)
+        self._tips = {}
+
+    def _chain_dir(self, file_path):
+        key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.root, self.DELTAS_DIR, key)
+
+    def _base_path(self, file_path, n):
+        return os.path.join(self._chain_dir(file_path), f'base-{n}.zlib')
+
+    def versions(self, file_path):
+        """
+        读取文件的全部版本记录，按版本号从旧到新排列
+
+        参数:
+            file_path: 备份的文件
+
+        返回:
+            list: 版本记录；快照记录含'base': True，补丁记录含'patch'
+        """
+        chain_path = os.path.join(self._chain_dir(file_path), self.CHAIN_NAME)
+        if not os.path.exists(chain_path):
+            return []
+        with open(chain_path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _version(self, versions, n):
+        for record in versions:
+            if record['n'] == n:
+                return record
+        raise KeyError(f'没有版本 {n}')
+
+    def restore(self, file_path, n=None):
+        """
+        从最近的完整快照开始重放补丁，得到指定版本的文档
+
+        参数:
+            file_path: 备份的文件
+            n: 版本号，默认为最新版本
+
+        返回:
+            dict: 该版本的文档
+        """
+        versions = self.versions(file_path)
+        if not versions:
+            raise KeyError(f'没有备份: {file_path}')
+        if n is None:
+            n = versions[-1]['n']
+        self._version(versions, n)
+
+        base = max(record['n'] for record in versions if record.get('base') and record['n'] <= n)
+        with open(self._base_path(file_path, base), 'rb') as f:
+            document = json_engine.loads(zlib.decompress(f.read()))
+        for record in versions:
+            if base < record['n'] <= n:
+                document = json_patch.apply(document, record['patch'])
+        return document
+
+    def changes(self, file_path, n):
+        """
+        返回版本n相对于上一版本的补丁
+
+        参数:
+            file_path: 备份的文件
+            n: 版本号
+
+        返回:
+            list: 补丁操作列表
+        """
+        versions = self.versions(file_path)
+        record = self._version(versions, n)
+        if 'patch' in record:
+            return record['patch']
+        older = [r['n'] for r in versions if r['n'] < n]
+        if not older:
+            return json_patch.diff({}, self.restore(file_path, n))
+        return json_patch.diff(self.restore(file_path, older[-1]), self.restore(file_path, n))
+
+    def _tip(self, file_path, versions):
+        """
+        获取最新版本的记录和文档，优先使用内存中的副本
+        """
+        file_path = os.path.abspath(file_path)
+        if not versions:
+            return None, None
+        cached = self._tips.get(file_path)
+        if cached is not None and cached[0]['n'] == versions[-1]['n']:
+            return cached
+        tip = (versions[-1], self.restore(file_path))
+        self._tips[file_path] = tip
+        return tip
+
+    def record(self, file_path, data, digest=None):
+        """
+        记录文件的一个新版本
+
+        参数:
+            file_path: 备份的文件
+            data: 该版本的文档
+            digest: 该版本文件内容的SHA-256，默认读取当前文件计算
+
+        返回:
+            dict: 版本记录
+        """
+        if digest is None:
+            digest = file_hash(file_path)
+        # 只读使用，延迟解析的文档不会因此失去复用原始文本的能力
+        data = plain_document(data)
+        versions = self.versions(file_path)
+        tip_record, tip_document = self._tip(file_path, versions)
+        if tip_record is not None and tip_record['hash'] == digest:
+            return tip_record
+
+        n = versions[-1]['n'] + 1 if versions else 0
+        record = {'n': n, 'time': datetime.now().isoformat(timespec='seconds'), 'hash': digest}
+        bases = [r['n'] for r in versions if r.get('base')]
+        chain_dir = self._chain_dir(file_path)
+        os.makedirs(chain_dir, exist_ok=True)
+
+        if not bases or n - bases[-1] > self.rebase_every:
+            record['base'] = True
+            record['path'] = os.path.abspath(file_path)
+            text = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            with atomic_write(self._base_path(file_path, n)) as f:
+                f.write(zlib.compress(text, 6))
+        else:
+            record['patch'] = json_patch.diff(tip_document, data)
+
+        with open(os.path.join(chain_dir, self.CHAIN_NAME), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._tips[os.path.abspath(file_path)] = (record, copy_document(data))
+        return record
+
+    def _read_document(self, file_path):
+        if os.path.splitext(file_path)[1].lower() == '.dat':
+            return self.codec.decode_file(file_path)
+        with open(file_path, 'rb') as f:
+            return json_engine.loads(f.read())
+
+    def prepare(self, file_path):
+        """
+        覆盖文件之前调用，确保磁盘上的当前内容已经是某个版本
+        （第一次保存或文件被外部程序修改过时，会解码磁盘文件并记录下来）
+
+        参数:
+            file_path: 即将被覆盖的文件
+
+        返回:
+            dict: 与磁盘内容对应的版本记录；文件不存在时返回None
+        """
+        if not os.path.exists(file_path):
+            return None
+        digest = file_hash(file_path)
+        versions = self.versions(file_path)
+        if versions and versions[-1]['hash'] == digest:
+            return versions[-1]
+        return self.record(file_path, self._read_document(file_path), digest)
+
+    def encode(self, file_path, document):
+        """
+        按文件类型把文档编码为文件内容（与FileUtils保存的格式一致）
+        """
+        if os.path.splitext(file_path)[1].lower() == '.dat':
+            return bytes(self.codec.encode(document))
+        return json_engine.dumps_pretty(plain_document(document))
+
+    def restore_file(self, file_path, n=None, target_path=None):
+        """
+        将指定版本写入文件
+
+        参数:
+            file_path: 备份的文件
+            n: 版本号，默认为最新版本
+            target_path: 目标路径，默认恢复到原文件位置
+
+        返回:
+            (target_path, identical): 写入的路径，以及内容是否与备份时逐字节相同
+        """
+        versions = self.versions(file_path)
+        if n is None and versions:
+            n = versions[-1]['n']
+        content = self.encode(file_path, self.restore(file_path, n))
+        target_path = target_path or file_path
+        with atomic_write(target_path) as f:
+            f.write(content)
+        return target_path, hashlib.sha256(content).hexdigest() == self._version(versions, n)['hash']
+
+    def tracked_files(self):
+        """
+        返回所有有增量备份的文件路径
+        """
+        deltas_dir = os.path.join(self.root, self.DELTAS_DIR)
+        if not os.path.isdir(deltas_dir):
+            return []
+        files = []
+        for name in sorted(os.listdir(deltas_dir)):
+            chain_path = os.path.join(deltas_dir, name, self.CHAIN_NAME)
+            if os.path.exists(chain_path):
+                with open(chain_path, 'r', encoding='utf-8') as f:
+                    first = f.readline()
+                if first.strip():
+                    files.append(json.loads(first)['path'])
+        return files
+
+    def gc(self, keep=None, max_age_days=None):
+        """
+        删除整段过期的快照链；最新的一段快照链总是保留
+
+        参数:
+            keep: 每个文件至少保证最近keep个版本仍可恢复
+            max_age_days: 删除最后一个版本早于该天数的快照链
+
+        返回:
+            dict: 删除的版本数和释放的字节数
+        """
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+        removed = 0
+        bytes_freed = 0
+
+        for file_path in self.tracked_files():
+            versions = self.versions(file_path)
+            bases = [r['n'] for r in versions if r.get('base')]
+            latest = versions[-1]['n']
+            drop = set()
+            for start, end in zip(bases, bases[1:]):
+                chain = [r for r in versions if start <= r['n'] < end]
+                too_many = keep is not None and chain[-1]['n'] <= latest - keep
+                expired = cutoff is not None and datetime.fromisoformat(chain[-1]['time']).timestamp() < cutoff
+                if too_many or expired:
+                    drop.update(r['n'] for r in chain)
+                    base_path = self._base_path(file_path, start)
+                    bytes_freed += os.path.getsize(base_path)
+                    os.remove(base_path)
+            if not drop:
+                continue
+
+            chain_path = os.path.join(self._chain_dir(file_path), self.CHAIN_NAME)
+            bytes_freed += os.path.getsize(chain_path)
+            kept = [r for r in versions if r['n'] not in drop]
+            with atomic_write(chain_path, 'w', encoding='utf-8') as f:
+                for record in kept:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            bytes_freed -= os.path.getsize(chain_path)
+            removed += len(drop)
+            self._tips.pop(os.path.abspath(file_path), None)
+
+        return {'versions_removed': removed, 'bytes_freed': bytes_freed}
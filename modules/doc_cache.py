@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import marshal
+import hashlib
+import threading
+from .save_codec import atomic_write
+
+class DocumentCache:
+    """
+    已解码文档的磁盘缓存
+
+    缓存项保存marshal格式的文档和派生索引，加载时跳过解密和JSON解析。
+    键为(绝对路径, 文件大小, mtime_ns, 内容SHA-256)，每个文件只保留最新的一项，
+    缓存总大小超过上限时按最近使用时间淘汰。
+
+    目录结构:
+        cache/
+        ├── index.json      # 键 -> 缓存项信息
+        └── <键>.marshal
+    """
+    INDEX_NAME = 'index.json'
+    # 缓存内容的格式版本，派生索引的结构改变时需要加一，使旧的缓存项失效
+    FORMAT = 2
+
+    def __init__(self, root, max_bytes=64 * 1024 * 1024):
+        """
+        初始化缓存，目录在第一次写入时创建
+
+        参数:
+            root: 缓存目录
+            max_bytes: 缓存文件的总大小上限
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, self.INDEX_NAME)
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = {}
+            if os.path.exists(self.index_path):
+                try:
+                    with open(self.index_path, 'r', encoding='utf-8') as f:
+                        self._index = json.load(f)
+                except (OSError, ValueError):
+                    self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        with atomic_write(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, f'{key}.marshal')
+
+    @staticmethod
+    def _key(file_path, size, mtime_ns, digest):
+        text = f'{DocumentCache.FORMAT}|{file_path}|{size}|{mtime_ns}|{digest}'
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def signature(file_path):
+        """
+        计算文件的缓存键，应在读取文件内容之前调用，
+        这样读取期间文件被替换时缓存项只会因为键不匹配而失效
+
+        参数:
+            file_path: 原文件路径
+
+        返回:
+            (绝对路径, 文件大小, mtime_ns, 内容SHA-256)
+        """
+        file_path = os.path.abspath(file_path)
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            digest = hashlib.sha256(f.read()).hexdigest()
+        return file_path, stat.st_size, stat.st_mtime_ns, digest
+
+    def get(self, signature):
+        """
+        查找缓存项
+
+        参数:
+            signature: signature()返回的缓存键
+
+        返回:
+            dict: 缓存的内容（{'document': ..., 'index': ...}）；未命中时返回None
+        """
+        key = self._key(*signature)
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                try:
+                    with open(self._entry_path(key), 'rb') as f:
+                        payload = marshal.loads(f.read())
+                except (OSError, ValueError, EOFError, TypeError):
+                    self._remove(key)
+                    self._save_index()
+                else:
+                    index[key]['last_used'] = time.time()
+                    self._save_index()
+                    self.hits += 1
+                    return payload
+            self.misses += 1
+            return None
+
+    def put(self, signature, document, index=None):
+        """
+        写入缓存项，并按最近使用时间淘汰超出上限的旧项
+
+        参数:
+            signature: 读取文件之前由signature()得到的缓存键
+            document: 解码后的文档
+            index: 文档的派生索引
+        """
+        file_path, size, mtime_ns, _ = signature
+        key = self._key(*signature)
+        content = marshal.dumps({'document': document, 'index': index})
+        if len(content) > self.max_bytes:
+            return
+
+        with self._lock:
+            entries = self._load_index()
+            # 同一文件的旧版本不会再命中
+            for old_key in [k for k, entry in entries.items() if entry['path'] == file_path]:
+                self._remove(old_key)
+
+            os.makedirs(self.root, exist_ok=True)
+            with atomic_write(self._entry_path(key)) as f:
+                f.write(content)
+            entries[key] = {
+                'path': file_path,
+                'size': size,
+                'mtime_ns': mtime_ns,
+                'bytes': len(content),
+                'last_used': time.time(),
+            }
+
+            total = sum(entry['bytes'] for entry in entries.values())
+            for old_key in sorted(entries, key=lambda k: entries[k]['last_used']):
+                if total <= self.max_bytes:
+                    break
+                total -= entries[old_key]['bytes']
+                self._remove(old_key)
+            self._save_index()
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """
+        删除所有缓存项
+        """
+        with self._lock:
+            for key in list(self._load_index()):
+                self._remove(key)
+            self._save_index()
+
+    def describe(self):
+        """
+        返回命中统计的简短说明
+        """
+        return f'缓存命中 {self.hits} 次 / 未命中 {self.misses} 次'
@@ -1,10 +1,12 @@
 import os
 import json
-from .crypto_utils import CryptoUtils
+from .save_codec import SaveCodec
+from . import json_engine
+from .path_index import PathIndex, TYPE_NAMES
 
 def extract_keys(data, prefix='', result=None):
     """
-    递归提取JSON数据中的所有键
+    提取JSON数据中的所有键
     
     参数:
         data: 要提取键的数据
@@ -17,19 +19,251 @@ def extract_keys(data, prefix='', result=None):
     if result is None:
         result = {}
     
-    if isinstance(data, dict):
-        for key, value in data.items():
-            current_key = f"{prefix}.{key}" if prefix else key
-            result[current_key] = type(value).__name__
-            extract_keys(value, current_key, result)
-    elif isinstance(data, list):
-        for i, item in enumerate(data):
-            current_key = f"{prefix}[{i}]"
-            result[current_key] = type(item).__name__
-            extract_keys(item, current_key, result)
+    index = PathIndex.build(data)
+    for row, path in enumerate(index.paths):
+        current_key = index.format(row)
+        if prefix:
+            current_key = f"{prefix}.{current_key}" if isinstance(path[0], str) else prefix + current_key
+        result[current_key] = TYPE_NAMES[index.types[row]]
     
     return result
 
+# 架构路径中代表任意列表元素的路径段
+ITEMS = '[*]'
+
+# 编辑器启动时加载的架构文件
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'key_schema.json')
+
+# 架构中类型的输出顺序
+_TYPE_ORDER = ('dict', 'list', 'str', 'int', 'float', 'bool', 'NoneType')
+
+def _type_key(name):
+    return _TYPE_ORDER.index(name) if name in _TYPE_ORDER else len(_TYPE_ORDER)
+
+class SchemaNode:
+    """
+    架构中的一个节点: 出现过的类型、对象的字段、列表元素（所有元素合并为一个节点）和列表长度范围
+
+    count和dict_count只在推断过程中使用，用来判断字段是否可选；
+    从文件加载的节点计数为0，可选标记直接取自文件。
+    """
+    __slots__ = ('types', 'count', 'dict_count', 'optional', 'fields', 'items', 'min_length', 'max_length')
+
+    def __init__(self):
+        self.types = set()
+        self.count = 0
+        self.dict_count = 0
+        self.optional = False
+        self.fields = {}
+        self.items = None
+        self.min_length = None
+        self.max_length = None
+
+    def observe(self, value):
+        """
+        把一个值并入本节点
+        """
+        kind = type(value)
+        self.types.add(kind.__name__)
+        self.count += 1
+        if kind is dict:
+            self.dict_count += 1
+            fields = self.fields
+            for key, child in value.items():
+                node = fields.get(key)
+                if node is None:
+                    node = fields[key] = SchemaNode()
+                node.observe(child)
+        elif kind is list:
+            length = len(value)
+            self.min_length = length if self.min_length is None else min(self.min_length, length)
+            self.max_length = length if self.max_length is None else max(self.max_length, length)
+            if length:
+                items = self.items
+                if items is None:
+                    items = self.items = SchemaNode()
+                for item in value:
+                    items.observe(item)
+
+    def merge(self, other):
+        """
+        把另一个节点并入本节点；只在一方出现的字段标记为可选
+        """
+        had_dict = 'dict' in self.types
+        for key, node in self.fields.items():
+            if key not in other.fields and 'dict' in other.types:
+                node.optional = True
+        for key, node in other.fields.items():
+            mine = self.fields.get(key)
+            if mine is None:
+                self.fields[key] = node
+                node.optional = node.optional or had_dict
+            else:
+                mine.merge(node)
+        if other.items is not None:
+            if self.items is None:
+                self.items = other.items
+            else:
+                self.items.merge(other.items)
+        if other.min_length is not None:
+            self.min_length = other.min_length if self.min_length is None else min(self.min_length, other.min_length)
+            self.max_length = other.max_length if self.max_length is None else max(self.max_length, other.max_length)
+        self.types |= other.types
+        self.count += other.count
+        self.dict_count += other.dict_count
+        self.optional = self.optional or other.optional
+
+    def type_names(self):
+        return '|'.join(sorted(self.types, key=_type_key))
+
+    def to_json(self, parent=None):
+        """
+        转换为可以写入JSON的紧凑结构: 没有子节点的节点只是类型字符串（可选时以?结尾），
+        其余节点为 {"type", "optional", "fields", "items", "length"}
+        """
+        optional = self.optional or (parent is not None and self.count < parent.dict_count)
+        if not self.fields and self.items is None and self.min_length is None:
+            return self.type_names() + ('?' if optional else '')
+        result = {'type': self.type_names()}
+        if optional:
+            result['optional'] = True
+        if self.fields:
+            result['fields'] = {key: node.to_json(self) for key, node in self.fields.items()}
+        if self.items is not None:
+            result['items'] = self.items.to_json()
+        if self.min_length is not None:
+            result['length'] = [self.min_length, self.max_length]
+        return result
+
+    @classmethod
+    def from_json(cls, value):
+        node = cls()
+        if isinstance(value, str):
+            node.optional = value.endswith('?')
+            node.types = set(value.rstrip('?').split('|')) - {''}
+            return node
+        node.types = set(value['type'].split('|')) - {''}
+        node.optional = value.get('optional', False)
+        node.fields = {key: cls.from_json(child) for key, child in value.get('fields', {}).items()}
+        if 'items' in value:
+            node.items = cls.from_json(value['items'])
+        if 'length' in value:
+            node.min_length, node.max_length = value['length']
+        return node
+
+class KeySchema:
+    """
+    从一个或多个存档推断出的键架构
+
+    与extract_keys不同，列表中的所有元素合并为一个 [*] 节点，
+    因此架构的大小只取决于不同字段的数量，与列表长度和存档数量无关。
+    """
+    VERSION = 1
+
+    def __init__(self, root=None, documents=0):
+        self.root = root if root is not None else SchemaNode()
+        self.documents = documents
+
+    def observe(self, data):
+        """
+        把一个存档并入架构
+        """
+        self.root.observe(data)
+        self.documents += 1
+
+    def merge(self, other):
+        """
+        把另一个架构（如之前生成的架构文件）并入本架构
+        """
+        self.root.merge(other.root)
+        self.documents += other.documents
+
+    def lookup(self, tokens):
+        """
+        按路径段查找节点，列表下标（int）和 [*] 都对应列表元素节点
+
+        返回:
+            SchemaNode；路径不在架构中时返回None
+        """
+        node = self.root
+        for token in tokens:
+            node = node.items if isinstance(token, int) or token == ITEMS else node.fields.get(token)
+            if node is None:
+                return None
+        return node
+
+    def paths(self, node=None, path=()):
+        """
+        遍历架构中的所有路径，生成(路径段元组, 节点)；路径段元组在遍历时逐层构建
+        """
+        node = self.root if node is None else node
+        for key, child in node.fields.items():
+            child_path = path + (key,)
+            yield child_path, child
+            yield from self.paths(child, child_path)
+        if node.items is not None:
+            child_path = path + (ITEMS,)
+            yield child_path, node.items
+            yield from self.paths(node.items, child_path)
+
+    def to_json(self):
+        return {'version': self.VERSION, 'documents': self.documents, 'schema': self.root.to_json()}
+
+    @classmethod
+    def from_json(cls, value):
+        if value.get('version') != cls.VERSION:
+            raise ValueError(f'不支持的架构版本: {value.get("version")}')
+        return cls(SchemaNode.from_json(value['schema']), value.get('documents', 0))
+
+    def dumps(self):
+        return json.dumps(self.to_json(), ensure_ascii=False, separators=(',', ':'))
+
+    def save(self, file_path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'rb') as f:
+            return cls.from_json(json_engine.loads(f.read()))
+
+def format_schema_path(path):
+    """
+    将架构路径段元组格式化为 playerData.Tools.savedData[*].Name 形式
+    """
+    text = ''
+    for token in path:
+        if token == ITEMS:
+            text += ITEMS
+        else:
+            text = f'{text}.{token}' if text else token
+    return text
+
+def infer_schema(documents, schema=None):
+    """
+    一次遍历多个存档推断键架构
+
+    参数:
+        documents: 存档数据的可迭代对象
+        schema: 要并入的已有架构，默认新建
+
+    返回:
+        KeySchema
+    """
+    schema = schema if schema is not None else KeySchema()
+    for data in documents:
+        schema.observe(data)
+    return schema
+
+def load_default_schema():
+    """
+    加载data/key_schema.json，文件不存在或无法解析时返回None
+    """
+    try:
+        return KeySchema.load(SCHEMA_FILE)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
 def main():
     # 获取项目根目录下的所有.dat文件
     project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,26 +277,15 @@ def main():
     data_dir = os.path.join(project_root, 'data')
     os.makedirs(data_dir, exist_ok=True)
     
+    codec = SaveCodec()
+    
     for dat_file in dat_files:
         try:
             dat_file_path = os.path.join(project_root, dat_file)
             print(f"处理文件: {dat_file}")
             
-            # 读取.dat文件
-            with open(dat_file_path, 'rb') as f:
-                data = f.read()
-            
-            # 移除头部
-            data = CryptoUtils.remove_header(data)
-            
-            # 解密数据
-            json_str = CryptoUtils.decrypt_data(data)
-            if not json_str:
-                print(f"解密失败: {dat_file}")
-                continue
-            
-            # 解析JSON
-            json_data = json.loads(json_str)
+            # 读取、解密并解析.dat文件
+            json_data = codec.decode_file(dat_file_path)
             
             # 提取所有键
             keys = extract_keys(json_data)
@@ -70,15 +293,15 @@ def main():
             # 保存为JSON文件
             base_name = os.path.splitext(os.path.basename(dat_file))[0]
             output_file = os.path.join(data_dir, f"{base_name}_keys.json")
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(keys, f, indent=2, ensure_ascii=False)
+            with open(output_file, 'wb') as f:
+                f.write(json_engine.dumps_pretty(keys))
             
             print(f"已生成键列表: {output_file}")
             
             # 同时保存完整的JSON数据
             full_json_file = os.path.join(data_dir, f"{base_name}_full.json")
-            with open(full_json_file, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, indent=2, ensure_ascii=False)
+            with open(full_json_file, 'wb') as f:
+                f.write(json_engine.dumps_pretty(json_data))
             
             print(f"已生成完整JSON: {full_json_file}")
             
@@ -1,9 +1,22 @@
 import os
-import json
-import shutil
-from datetime import datetime
+import time
+import warnings
 from tkinter import filedialog, messagebox
-from .crypto_utils import CryptoUtils
+from .save_codec import SaveCodec, atomic_write
+from .backup_store import BackupStore
+from .delta_backups import DeltaBackupStore
+from .doc_cache import DocumentCache
+from .lazy_document import LazyDocument, plain_document
+from . import json_engine
+
+# 环境变量: 备份方式，delta（默认，完整快照+JSON补丁）或full（按内容去重的完整文件）
+BACKUP_MODE_ENV = 'SILKSONG_BACKUP_MODE'
+BACKUP_MODES = ('delta', 'full')
+
+class LoadCancelled(Exception):
+    """
+    进度回调抛出此异常以中止正在进行的加载
+    """
 
 class FileUtils:
     def __init__(self, status_callback=None):
@@ -14,6 +27,20 @@ class FileUtils:
             status_callback: 状态更新回调函数
         """
         self.status_callback = status_callback
+        self.codec = SaveCodec()
+        
+        # 按内容去重的压缩备份仓库，以及基于JSON补丁的增量备份
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        backup_dir = os.path.join(project_root, 'backups')
+        self.backups = BackupStore(backup_dir, codec=self.codec)
+        self.deltas = DeltaBackupStore(backup_dir, codec=self.codec)
+        
+        # 已解码文档的磁盘缓存，重复打开同一存档时跳过解密和解析
+        self.doc_cache = DocumentCache(os.path.join(project_root, 'cache'))
+        self.backup_mode = os.environ.get(BACKUP_MODE_ENV) or 'delta'
+        if self.backup_mode not in BACKUP_MODES:
+            warnings.warn(f'未知的备份方式: {self.backup_mode}，改用增量备份', RuntimeWarning, stacklevel=2)
+            self.backup_mode = 'delta'
     
     def load_file(self, file_path=None):
         """
@@ -41,30 +68,10 @@ class FileUtils:
             return None, None
         
         try:
-            # 根据文件扩展名决定如何加载
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.dat':
-                # 处理.dat文件
-                with open(file_path, 'rb') as f:
-                    data = f.read()
-                
-                # 移除头部
-                data = CryptoUtils.remove_header(data)
-                
-                # 解密数据
-                result = CryptoUtils.decrypt_data(data)
-                if not result:
-                    raise Exception('解密失败')
-                
-                data = json.loads(result)
-            else:
-                # 普通JSON文件
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+            data, _, cache_hit, seconds, _ = self.load_document(file_path)
             
             if self.status_callback:
-                self.status_callback(f'已加载: {os.path.basename(file_path)}')
+                self.status_callback(f'已加载: {os.path.basename(file_path)}, {self.describe_load(cache_hit, seconds)}')
             
             return data, file_path
             
@@ -72,6 +79,109 @@ class FileUtils:
             messagebox.showerror('错误', f'无法加载文件: {str(e)}')
             return None, None
     
+    def load_document(self, file_path, progress=None, build_index=None, lazy=False):
+        """
+        加载文档及其派生索引，命中磁盘缓存时跳过解密和解析，可以在后台线程中调用
+        
+        参数:
+            file_path: 文件路径
+            progress: 阶段回调，见read_document；命中缓存时以'read'、'cache'调用，计算索引时以'index'调用
+            build_index: 根据文档计算派生索引的函数，结果与文档一起缓存
+            lazy: 未命中缓存时是否延迟解析sceneData（见read_document）；
+                此时文档还不完整，不会写入缓存，需要调用complete_document
+            
+        返回:
+            (data, index, cache_hit, seconds, signature): 文档、派生索引、是否命中缓存、耗时（秒），
+            以及文档对应的文件签名（见DocumentCache.signature）
+        """
+        start = time.perf_counter()
+        report = progress or (lambda stage: None)
+        
+        report('read')
+        signature = self.doc_cache.signature(file_path)
+        cached = self.doc_cache.get(signature)
+        if cached is not None:
+            report('cache')
+            if os.path.splitext(file_path)[1].lower() == '.dat':
+                # 没有经过解密，增量保存需要的明文/密文对在第一次保存时再建立
+                self.codec.remember_file(file_path, os.path.abspath(file_path))
+            index = cached['index']
+            if index is None and build_index is not None:
+                report('index')
+                index = build_index(cached['document'])
+            return cached['document'], index, True, time.perf_counter() - start, signature
+        
+        data = self.read_document(file_path, progress, lazy)
+        index = None
+        if build_index is not None:
+            report('index')
+            index = build_index(data)
+        if isinstance(data, LazyDocument):
+            return data, index, False, time.perf_counter() - start, signature
+        
+        try:
+            self.doc_cache.put(signature, data, index)
+        except OSError:
+            pass  # 缓存写入失败不影响加载
+        return data, index, False, time.perf_counter() - start, signature
+    
+    def complete_document(self, data, signature, build_index=None):
+        """
+        解析延迟加载的文档的剩余部分，并把磁盘版本写入缓存，应在后台线程中调用
+        
+        参数:
+            data: load_document(lazy=True)返回的LazyDocument
+            signature: load_document返回的文件签名
+            build_index: 与load_document相同，对完整的磁盘版本重新计算派生索引
+            
+        返回:
+            (disk_document, index): 与磁盘内容一致的独立副本（编辑器中的文档此时可能已被修改）及其派生索引
+        """
+        data.materialize()
+        disk_document = data.pristine()
+        index = build_index(disk_document) if build_index else None
+        try:
+            self.doc_cache.put(signature, disk_document, index)
+        except OSError:
+            pass  # 缓存写入失败不影响加载
+        return disk_document, index
+    
+    def describe_load(self, cache_hit, seconds):
+        """
+        生成加载耗时和缓存命中情况的简短说明
+        """
+        return f"{'缓存命中' if cache_hit else '缓存未命中'}，耗时 {seconds * 1000:.1f} ms（{self.doc_cache.describe()}）"
+    
+    def read_document(self, file_path, progress=None, lazy=False):
+        """
+        读取并解析文件，不弹出任何对话框，出错时直接抛出异常，可以在后台线程中调用
+        
+        参数:
+            file_path: 文件路径
+            progress: 阶段回调，依次以'read'、'decrypt'、'parse'调用；抛出LoadCancelled可中止加载
+            lazy: 对.dat存档只解析playerData，sceneData在第一次访问时才解析（见LazyDocument）
+            
+        返回:
+            dict: 加载的数据
+        """
+        report = progress or (lambda stage: None)
+        ext = os.path.splitext(file_path)[1].lower()
+        
+        report('read')
+        if ext == '.dat':
+            # 处理.dat文件，通过mmap直接解密到预分配缓冲区，并记住明文/密文对用于增量保存
+            report('decrypt')
+            plaintext = self.codec.decrypt_file(file_path, cache_key=os.path.abspath(file_path))
+        else:
+            # 普通JSON文件
+            with open(file_path, 'rb') as f:
+                plaintext = f.read()
+        
+        report('parse')
+        if lazy and ext == '.dat':
+            return LazyDocument.parse(plaintext)
+        return json_engine.loads(plaintext)
+    
     def save_file(self, data, file_path, update_game_save=True):
         """
         保存文件，支持.dat和.json格式
@@ -89,43 +199,12 @@ class FileUtils:
             return False
         
         try:
-            # 获取项目根目录
-            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            
-            # 创建备份
-            backup_dir = os.path.join(project_root, 'backups')
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            backup_name = f"{os.path.basename(file_path)}.{datetime.now().strftime('%Y%m%d%H%M%S')}.bak"
-            backup_path = os.path.join(backup_dir, backup_name)
-            
-            if os.path.exists(file_path):
-                shutil.copy2(file_path, backup_path)
-            
-            # 根据文件扩展名决定如何保存
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.dat':
-                # 将数据转换为JSON字符串
-                json_str = json.dumps(data, ensure_ascii=False)
-                
-                # 加密数据
-                encrypted_data = CryptoUtils.encrypt_data(json_str)
-                if not encrypted_data:
-                    raise Exception('加密失败')
-                
-                # 保存为二进制文件
-                with open(file_path, 'wb') as f:
-                    f.write(encrypted_data)
-            else:
-                # 普通JSON文件
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+            backup, reuse_info = self.write_document(data, file_path)
             
             # 保存成功提示
             if self.status_callback:
-                self.status_callback(f'已保存: {os.path.basename(file_path)}, 备份至: {backup_name}')
-            messagebox.showinfo('成功', f'文件已保存，备份至: {backup_path}')
+                self.status_callback(f'已保存: {os.path.basename(file_path)}, {self.describe_backup(backup)}{reuse_info}')
+            messagebox.showinfo('成功', f'文件已保存，{self.describe_backup(backup)}')
             
             return True
             
@@ -133,6 +212,55 @@ class FileUtils:
             messagebox.showerror('错误', f'保存文件时出错: {str(e)}')
             return False
     
+    def write_document(self, data, file_path):
+        """
+        备份原文件后保存数据，不弹出任何对话框，出错时直接抛出异常，可以在后台线程中调用
+        
+        参数:
+            data: 要保存的数据，保存期间不能被修改
+            file_path: 文件路径
+            
+        返回:
+            (backup, reuse_info): 备份记录（文件原本不存在时为None）和密文复用说明
+        """
+        # 创建备份: 增量模式下记录即将被覆盖的版本（磁盘内容就是上次保存的版本时无需任何操作），
+        # 完整模式下按内容去重保存文件
+        if self.backup_mode == 'delta':
+            backup = self.deltas.prepare(file_path)
+        else:
+            backup = self.backups.add(file_path)
+        
+        # 根据文件扩展名决定如何保存
+        ext = os.path.splitext(file_path)[1].lower()
+        reuse_info = ''
+        
+        if ext == '.dat':
+            # 加密并原子替换存档文件，未改动的密文前缀直接复用
+            self.codec.write_file(file_path, data, cache_key=os.path.abspath(file_path))
+            
+            reuse_info = f', 复用密文 {self.codec.last_reused_bytes // 1024} KB'
+        else:
+            # 普通JSON文件，输出与json.dump(indent=2)逐字节一致
+            with atomic_write(file_path) as f:
+                f.write(json_engine.dumps_pretty(plain_document(data)))
+        
+        if self.backup_mode == 'delta':
+            # 记录刚保存的版本，下次保存时只需要计算与它的差异
+            self.deltas.record(file_path, data)
+        
+        return backup, reuse_info
+    
+    @staticmethod
+    def describe_backup(backup):
+        """
+        生成备份记录的简短说明
+        """
+        if backup is None:
+            return '原文件不存在，未创建备份'
+        if 'n' in backup:
+            return f"备份: 版本 {backup['n']}"
+        return f"备份: {backup['hash'][:12]}"
+    
     def save_as_game_file(self, data):
         """
         将数据保存为游戏可读取的.dat文件
@@ -159,17 +287,8 @@ class FileUtils:
             if not file_path:
                 return False
             
-            # 将数据转换为JSON字符串
-            json_str = json.dumps(data, ensure_ascii=False)
-            
-            # 加密数据
-            encrypted_data = CryptoUtils.encrypt_data(json_str)
-            if not encrypted_data:
-                raise Exception('加密失败')
-            
-            # 保存为二进制文件
-            with open(file_path, 'wb') as f:
-                f.write(encrypted_data)
+            # 流式加密并原子替换目标文件
+            self.codec.write_file(file_path, data)
             
             if self.status_callback:
                 self.status_callback(f'已保存游戏存档: {os.path.basename(file_path)}')
@@ -0,0 +1,234 @@
+import os
+import json
+import threading
+import warnings
+
+# 环境变量: 强制使用指定的JSON引擎
+JSON_ENGINE_ENV = 'SILKSONG_JSON_ENGINE'
+
+# 自测文档: 浮点数、键顺序、非ASCII文本、空容器、指数形式的浮点数和超出64位范围的整数
+_PROBES = (
+    '{"playTime": 129061.594, "zeta": 1, "alpha": [0.1, -0.0, 3.141592653589793, -7], '
+    '"名称": "丝之歌 – ü\\u00e9\\ud83d\\ude00", "empty": {}, "list": [], "flag": true, "none": null}',
+    '[2.5e-05, 1e+16, 1.7976931348623157e+308, 5e-324]',
+    '{"big": 123456789012345678901, "max": 18446744073709551615, "min": -9223372036854775808}',
+    '[-9223372036854775809, 9223372036854775808, -9999999999999999999]',
+)
+
+# 19位及以上的数字串可能超出64位整数（如-9223372036854775809），orjson会把它们静默转换成浮点数。
+# 把数字映射为'0'、其他字节映射为空格后查找连续19个'0'，比正则表达式快一个数量级
+_DIGIT_MASK = bytes(ord('0') if chr(c).isdigit() and c < 128 else ord(' ') for c in range(256))
+_LONG_DIGITS = b'0' * 19
+
+def _has_long_digits(data):
+    return bytes(data).translate(_DIGIT_MASK).find(_LONG_DIGITS) >= 0
+
+def _stdlib_dumps_pretty(data):
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+class _StdlibEngine:
+    """
+    标准库json
+    """
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps_pretty(self, data):
+        return _stdlib_dumps_pretty(data)
+
+class _OrjsonEngine:
+    """
+    orjson；遇到它不支持的输入（超过64位的整数、NaN等）时回退到标准库
+    """
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def loads(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if _has_long_digits(data):
+            return json.loads(data)
+        try:
+            return self._orjson.loads(data)
+        except self._orjson.JSONDecodeError:
+            return json.loads(data)
+
+    def dumps_pretty(self, data):
+        try:
+            return self._orjson.dumps(data, option=self._orjson.OPT_INDENT_2)
+        except self._orjson.JSONEncodeError:
+            return _stdlib_dumps_pretty(data)
+
+class _UjsonEngine:
+    """
+    ujson；解析失败时回退到标准库
+    """
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, data):
+        if not isinstance(data, (str, bytes)):
+            data = bytes(data)
+        try:
+            return self._ujson.loads(data)
+        except (ValueError, OverflowError):
+            return json.loads(data)
+
+    def dumps_pretty(self, data):
+        try:
+            return self._ujson.dumps(data, ensure_ascii=False, indent=2, escape_forward_slashes=False).encode('utf-8')
+        except OverflowError:
+            return _stdlib_dumps_pretty(data)
+
+# 名称 -> 引擎类，按优先顺序排列（加速实现在前，标准库兜底）
+ENGINES = {
+    'orjson': _OrjsonEngine,
+    'ujson': _UjsonEngine,
+    'stdlib': _StdlibEngine,
+}
+
+class JsonEngine:
+    """
+    选定的解析引擎和格式化输出引擎组合
+
+    .dat存档的明文始终由标准库生成（见SaveCodec.encode和iter_json），
+    这里的格式化输出只用于indent=2的.json文件。
+    """
+    def __init__(self, parser_name, pretty_name):
+        self.parser_name = parser_name
+        self.pretty_name = pretty_name
+        self.loads = ENGINES[parser_name]().loads
+        self.dumps_pretty = ENGINES[pretty_name]().dumps_pretty
+
+    def __repr__(self):
+        return f'JsonEngine(parser={self.parser_name!r}, pretty={self.pretty_name!r})'
+
+def _canonical(data):
+    # 标准库的紧凑输出区分了类型、键顺序和浮点数的精确值
+    return json.dumps(data, ensure_ascii=False)
+
+def probe_engine(name, probes=_PROBES):
+    """
+    检查引擎是否可用，以及解析结果、格式化输出是否与标准库逐字节一致
+
+    参数:
+        name: 引擎名称
+        probes: 用于检查的JSON文本
+
+    返回:
+        dict: available、parse_exact、pretty_exact以及出错信息
+    """
+    try:
+        engine = ENGINES[name]()
+    except ImportError:
+        return {'available': False}
+
+    result = {'available': True, 'parse_exact': True, 'pretty_exact': True}
+    for text in probes:
+        expected = json.loads(text)
+        try:
+            if _canonical(engine.loads(text.encode('utf-8'))) != _canonical(expected):
+                result['parse_exact'] = False
+        except Exception as e:
+            result['parse_exact'] = False
+            result['error'] = str(e)
+        try:
+            if engine.dumps_pretty(expected) != _stdlib_dumps_pretty(expected):
+                result['pretty_exact'] = False
+        except Exception as e:
+            result['pretty_exact'] = False
+            result['error'] = str(e)
+    return result
+
+def _override_error(results, override):
+    """
+    检查环境变量指定的引擎，返回错误说明；可以使用时返回None
+    """
+    if override not in results:
+        return f'未知的JSON引擎: {override}'
+    if not results[override]['available']:
+        return f'JSON引擎未安装: {override}'
+    return None
+
+def _choose(results, override, capability):
+    """
+    根据环境变量或自测结果选择引擎: 指定的引擎不满足要求时使用标准库，无效时按自测结果选择
+    """
+    if override and _override_error(results, override) is None:
+        return override if results[override].get(capability) else 'stdlib'
+    for name, result in results.items():
+        if result.get(capability):
+            return name
+    return 'stdlib'
+
+_lock = threading.Lock()
+_selected = None
+_report = None
+
+def get_engine():
+    """
+    获取当前进程使用的JSON引擎，首次调用时运行自测
+
+    返回:
+        JsonEngine: 选定的引擎
+    """
+    global _selected, _report
+    with _lock:
+        if _selected is None:
+            results = {name: probe_engine(name) for name in ENGINES}
+            override = os.environ.get(JSON_ENGINE_ENV)
+            override_error = override and _override_error(results, override)
+            if override_error:
+                warnings.warn(f'{override_error}，改为自动选择', RuntimeWarning, stacklevel=3)
+            _selected = JsonEngine(_choose(results, override, 'parse_exact'),
+                                   _choose(results, override, 'pretty_exact'))
+            _report = {
+                'engines': results,
+                'selected': {'parser': _selected.parser_name, 'pretty': _selected.pretty_name},
+                'override': override,
+                'override_error': override_error or None,
+            }
+        return _selected
+
+def loads(data):
+    """
+    使用选定的引擎解析JSON（str、bytes或bytearray）
+    """
+    return get_engine().loads(data)
+
+def dumps_pretty(data):
+    """
+    生成与json.dumps(data, ensure_ascii=False, indent=2)逐字节一致的UTF-8输出
+    """
+    return get_engine().dumps_pretty(data)
+
+def engine_info():
+    """
+    返回引擎自测结果和选择情况
+    """
+    get_engine()
+    return _report
+
+def format_engine_info():
+    """
+    将引擎自测结果格式化为便于阅读的文本
+    """
+    info = engine_info()
+    override = info['override']
+    lines = [f"JSON 解析: {info['selected']['parser']}  格式化输出: {info['selected']['pretty']}"
+             + (f"（由环境变量指定: {override}）" if override and not info['override_error'] else "（自动选择）")]
+    for name, result in info['engines'].items():
+        marker = '*' if name in info['selected'].values() else ' '
+        if not result['available']:
+            status = '未安装'
+        else:
+            status = (f"解析{'一致' if result['parse_exact'] else '不一致'}，"
+                      f"格式化输出{'一致' if result['pretty_exact'] else '不一致'}")
+            if 'error' in result:
+                status += f": {result['error']}"
+        lines.append(f"  {marker} {name:<14} {status}")
+    if info['override_error']:
+        lines.append(f"环境变量无效: {info['override_error']}")
+    return '\n'.join(lines)
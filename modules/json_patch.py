@@ -0,0 +1,135 @@
+def escape_token(token):
+    """
+    按RFC 6901转义JSON指针中的一段
+    """
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+def unescape_token(token):
+    """
+    还原JSON指针中被转义的一段
+    """
+    return token.replace('~1', '/').replace('~0', '~')
+
+def split_pointer(pointer):
+    """
+    将JSON指针拆分为路径段列表，空字符串表示根
+    """
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError(f'无效的JSON指针: {pointer}')
+    return [unescape_token(token) for token in pointer[1:].split('/')]
+
+def _same(a, b):
+    # JSON中true和1、1和1.0是不同的值，Python中却相等
+    return type(a) is type(b) and a == b
+
+def diff(source, target):
+    """
+    计算把source变为target的RFC 6902补丁（只使用add、remove和replace）
+
+    相等的子树通过一次C层面的==比较直接跳过，因此补丁计算的开销主要取决于改动的部分。
+    对象的键顺序会被保留：增删键后顺序与target不同时，直接替换整个对象，
+    保证应用补丁后重新序列化得到的文本与target完全一致。
+    注意容器内部的比较沿用Python的==，值相等但类型不同（如true和1）的叶子、
+    以及只有键顺序不同的对象不会被识别。
+
+    参数:
+        source: 原文档
+        target: 目标文档
+
+    返回:
+        list: 补丁操作列表，值直接引用target中的对象
+    """
+    ops = []
+    _diff(source, target, '', ops)
+    return ops
+
+def _diff(a, b, path, ops):
+    if _same(a, b):
+        return
+
+    if isinstance(a, dict) and isinstance(b, dict):
+        removed = [key for key in a if key not in b]
+        added = [key for key in b if key not in a]
+        if [key for key in a if key in b] + added != list(b):
+            ops.append({'op': 'replace', 'path': path, 'value': b})
+            return
+        for key in removed:
+            ops.append({'op': 'remove', 'path': f'{path}/{escape_token(key)}'})
+        for key, value in a.items():
+            if key in b:
+                _diff(value, b[key], f'{path}/{escape_token(key)}', ops)
+        for key in added:
+            ops.append({'op': 'add', 'path': f'{path}/{escape_token(key)}', 'value': b[key]})
+    elif isinstance(a, list) and isinstance(b, list):
+        common = min(len(a), len(b))
+        for i in range(common):
+            _diff(a[i], b[i], f'{path}/{i}', ops)
+        # 从尾部开始删除，保证前面的下标不变
+        for i in range(len(a) - 1, common - 1, -1):
+            ops.append({'op': 'remove', 'path': f'{path}/{i}'})
+        for i in range(common, len(b)):
+            ops.append({'op': 'add', 'path': f'{path}/{i}', 'value': b[i]})
+    else:
+        ops.append({'op': 'replace', 'path': path, 'value': b})
+
+def _resolve(document, tokens):
+    """
+    定位路径最后一段的父容器
+    """
+    parent = document
+    for token in tokens[:-1]:
+        parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+    return parent
+
+def apply(document, patch):
+    """
+    将补丁原地应用到文档
+
+    参数:
+        document: 要修改的文档
+        patch: 补丁操作列表
+
+    返回:
+        应用补丁后的文档（替换根节点时是新的对象）
+    """
+    for op in patch:
+        kind = op['op']
+        tokens = split_pointer(op['path'])
+        if not tokens:
+            if kind == 'remove':
+                raise ValueError('不能删除根节点')
+            document = op['value']
+            continue
+
+        parent = _resolve(document, tokens)
+        token = tokens[-1]
+        if isinstance(parent, list):
+            if kind == 'add':
+                if token == '-':
+                    parent.append(op['value'])
+                else:
+                    parent.insert(int(token), op['value'])
+            elif kind == 'remove':
+                del parent[int(token)]
+            elif kind == 'replace':
+                parent[int(token)] = op['value']
+            else:
+                raise ValueError(f'不支持的补丁操作: {kind}')
+        else:
+            if kind in ('add', 'replace'):
+                if kind == 'replace' and token not in parent:
+                    raise KeyError(op['path'])
+                parent[token] = op['value']
+            elif kind == 'remove':
+                del parent[token]
+            else:
+                raise ValueError(f'不支持的补丁操作: {kind}')
+    return document
+
+def changed_paths(patch):
+    """
+    返回补丁涉及的路径（路径段元组），按出现顺序去重
+    """
+    return list(dict.fromkeys(tuple(split_pointer(op['path'])) for op in patch))
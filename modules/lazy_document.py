@@ -0,0 +1,304 @@
+import json
+import threading
+from json.decoder import scanstring, WHITESPACE
+from . import json_engine
+
+# 默认延迟解析的顶层成员（存档中它总是最后一个成员，约占明文的60%）
+LAZY_KEYS = ('sceneData',)
+
+# loaded_items()中表示尚未解析的成员
+UNPARSED = object()
+
+_decoder = json.JSONDecoder()
+
+def _skip(text, idx):
+    return WHITESPACE.match(text, idx).end()
+
+class LazyDocument(dict):
+    """
+    延迟解析的顶层JSON对象
+
+    加载时逐个解析顶层成员，遇到lazy_keys中的成员时停止: 从它开始直到结尾的文本
+    只记录位置，不做任何扫描（存档中就是最后一个成员sceneData），
+    第一次访问或调用materialize()时才解析，可以在后台线程中提前调用。
+    解析完成后对象中保存了全部成员，行为与普通dict相同。
+
+    每个顶层成员对应的原始文本位置一直保留。通过[]、get、items等方法拿到成员的引用后，
+    它就可能被修改，记为已改动；json_pieces()对未改动的成员直接输出原始文本。
+    只读的代码应使用loaded_items()或plain()，它们不会把成员记为已改动。
+    """
+    def __init__(self, text, members, tail=None):
+        """
+        参数:
+            text: 完整的JSON文本
+            members: [(键, 值, 值的起始位置, 值的结束位置)]，已解析的成员
+            tail: (键, 值的起始位置, 结束位置)，尚未解析的最后一段；没有时为None
+        """
+        super().__init__()
+        self._text = text
+        self._spans = {}
+        self._touched = set()
+        self._tail = tail
+        self._lock = threading.RLock()
+        for key, value, start, end in members:
+            dict.__setitem__(self, key, value)
+            self._spans[key] = (start, end)
+
+    @classmethod
+    def parse(cls, plaintext, lazy_keys=LAZY_KEYS):
+        """
+        解析JSON文本，lazy_keys中的第一个成员及其后的内容延迟解析
+
+        参数:
+            plaintext: JSON文本（str、bytes或bytearray）
+            lazy_keys: 需要延迟解析的顶层键
+
+        返回:
+            LazyDocument；文本不是对象或不含lazy_keys中的键时返回普通的解析结果
+        """
+        text = plaintext if isinstance(plaintext, str) else bytes(plaintext).decode('utf-8')
+        idx = _skip(text, 0)
+        if not text.startswith('{', idx):
+            return json_engine.loads(plaintext)
+
+        members = []
+        idx = _skip(text, idx + 1)
+        if text.startswith('}', idx):
+            return json_engine.loads(plaintext)
+        while True:
+            if not text.startswith('"', idx):
+                raise json.JSONDecodeError('Expecting property name enclosed in double quotes', text, idx)
+            key, idx = scanstring(text, idx + 1)
+            idx = _skip(text, idx)
+            if not text.startswith(':', idx):
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, idx)
+            idx = _skip(text, idx + 1)
+
+            if key in lazy_keys:
+                end = len(text.rstrip()) - 1
+                if end <= idx or text[end] != '}':
+                    raise json.JSONDecodeError('Expecting \'}\' at end of document', text, end)
+                return cls(text, members, (key, idx, len(text[:end].rstrip())))
+
+            value, end = _decoder.raw_decode(text, idx)
+            members.append((key, value, idx, end))
+            idx = _skip(text, end)
+            if text.startswith(',', idx):
+                idx = _skip(text, idx + 1)
+            elif text.startswith('}', idx):
+                if _skip(text, idx + 1) != len(text):
+                    raise json.JSONDecodeError('Extra data', text, _skip(text, idx + 1))
+                # 没有需要延迟的成员
+                return dict((key, value) for key, value, _, _ in members)
+            else:
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, idx)
+
+    def materialize(self):
+        """
+        解析尚未解析的部分（线程安全，只会解析一次）
+
+        返回:
+            LazyDocument: 自身
+        """
+        with self._lock:
+            if self._tail is None:
+                return self
+            key, start, end = self._tail
+            # 剩余文本可能不止一个成员，补上括号整体解析
+            tail = json_engine.loads('{' + json.dumps(key, ensure_ascii=False) + ': ' + self._text[start:end] + '}')
+            for name, value in tail.items():
+                dict.__setitem__(self, name, value)
+            if len(tail) == 1:
+                self._spans[key] = (start, end)
+            self._tail = None
+        return self
+
+    def is_loaded(self):
+        """
+        是否已经全部解析
+        """
+        return self._tail is None
+
+    def raw_size(self, key):
+        """
+        成员原始文本的长度（不触发解析）；没有原始文本时返回None
+        """
+        if self._tail is not None and key == self._tail[0]:
+            return self._tail[2] - self._tail[1]
+        span = self._spans.get(key)
+        return span[1] - span[0] if span else None
+
+    def loaded_items(self):
+        """
+        只读遍历顶层成员，不触发解析；尚未解析的成员的值为UNPARSED
+        """
+        with self._lock:
+            items = list(dict.items(self))
+            if self._tail is not None:
+                items.append((self._tail[0], UNPARSED))
+            return items
+
+    def peek(self, key):
+        """
+        只读获取成员，必要时解析，不把它记为已改动
+        """
+        if key not in self:
+            raise KeyError(key)
+        if not dict.__contains__(self, key):
+            self.materialize()
+        return dict.__getitem__(self, key)
+
+    def loaded(self, key):
+        """
+        只读获取已经解析的成员，不触发解析，也不把它记为已改动；尚未解析时返回UNPARSED
+        """
+        with self._lock:
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+        if key in self:
+            return UNPARSED
+        raise KeyError(key)
+
+    def plain(self):
+        """
+        全部解析后返回包含相同成员的普通dict（浅拷贝），用于只读遍历和marshal等只接受dict的场合
+        """
+        self.materialize()
+        return dict(dict.items(self))
+
+    def pristine(self):
+        """
+        重新解析加载时的完整文本，得到与磁盘版本一致、与本对象互不影响的文档
+        """
+        return json_engine.loads(self._text)
+
+    def _touch(self, keys):
+        self._touched.update(keys)
+
+    def json_pieces(self):
+        """
+        生成JSON文本片段，拼接结果与json.dumps(self, ensure_ascii=False)一致；
+        未改动的成员直接复用原始文本，尚未解析的部分保持原样输出
+        """
+        with self._lock:
+            pieces = []
+            for key, value in dict.items(self):
+                span = self._spans.get(key) if key not in self._touched else None
+                pieces.append(json.dumps(key, ensure_ascii=False) + ': '
+                              + (self._text[span[0]:span[1]] if span else json.dumps(value, ensure_ascii=False)))
+            if self._tail is not None:
+                key, start, end = self._tail
+                pieces.append(json.dumps(key, ensure_ascii=False) + ': ' + self._text[start:end])
+        yield '{'
+        yield ', '.join(pieces)
+        yield '}'
+
+    # 以下方法覆盖dict的接口: 只读的长度、成员判断和迭代不触发解析，
+    # 其余方法先全部解析，并把可能被修改的成员记为已改动
+
+    def __len__(self):
+        return dict.__len__(self) + (self._tail is not None)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (self._tail is not None and key == self._tail[0])
+
+    def __iter__(self):
+        return iter([key for key, _ in self.loaded_items()])
+
+    def __getitem__(self, key):
+        value = self.peek(key)
+        self._touch((key,))
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        self.materialize()
+        self._touch((key,))
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.materialize()
+        self._touch((key,))
+        dict.__delitem__(self, key)
+
+    def keys(self):
+        self.materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self.materialize()
+        self._touch(dict.keys(self))
+        return dict.values(self)
+
+    def items(self):
+        self.materialize()
+        self._touch(dict.keys(self))
+        return dict.items(self)
+
+    def pop(self, key, *default):
+        self.materialize()
+        self._touch((key,))
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self.materialize()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self.materialize()
+        self._touch((key,))
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self.materialize()
+        other = dict(*args, **kwargs)
+        self._touch(other)
+        dict.update(self, other)
+
+    def clear(self):
+        self.materialize()
+        dict.clear(self)
+
+    def copy(self):
+        self.materialize()
+        self._touch(dict.keys(self))
+        return dict(dict.items(self))
+
+    def __eq__(self, other):
+        self.materialize()
+        if isinstance(other, LazyDocument):
+            other.materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        self.materialize()
+        return dict.__repr__(self)
+
+    def __reduce_ex__(self, protocol):
+        # pickle/copy.deepcopy得到普通dict
+        self.materialize()
+        self._touch(dict.keys(self))
+        return dict, (dict(dict.items(self)),)
+
+def plain_document(data):
+    """
+    返回可以交给只接受普通dict的代码（marshal、orjson、只读遍历）的文档，
+    LazyDocument会先全部解析，且不把成员记为已改动
+    """
+    return data.plain() if isinstance(data, LazyDocument) else data
+
+def dumps_document(data):
+    """
+    与json.dumps(data, ensure_ascii=False)结果一致，LazyDocument未改动的成员直接复用原始文本
+    """
+    if isinstance(data, LazyDocument):
+        return ''.join(data.json_pieces())
+    return json.dumps(data, ensure_ascii=False)
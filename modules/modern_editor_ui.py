@@ -1,9 +1,39 @@
 import customtkinter as ctk
 from tkinter import messagebox, filedialog
 import os
-from .file_utils import FileUtils
+import queue
+import threading
+from .file_utils import FileUtils, LoadCancelled
+from .doc_cache import DocumentCache
+from .delta_backups import copy_document
+from .lazy_document import LazyDocument, LAZY_KEYS
+from .save_watcher import SaveWatcher
+from .record_index import RecordIndex, parse_path, format_path
+from .scene_index import SceneIndex, SCENE_RECORDS
+from .extract_keys import load_default_schema
+from .virtual_tree import VirtualTree
+from .subtree_stats import SubtreeStats
+from .path_index import PathIndex, STR, BOOL
+from .search_index import SearchIndex
+from . import json_patch
+
+# 后台加载阶段 -> 状态栏显示的名称
+LOAD_STAGES = {
+    'read': '读取文件',
+    'cache': '读取缓存',
+    'decrypt': '解密',
+    'parse': '解析JSON',
+    'index': '建立索引',
+}
 
 class ModernEditorUI:
+    # 主线程轮询后台任务结果的间隔（毫秒）
+    POLL_INTERVAL = 50
+    # 检查存档是否被外部程序修改的间隔（毫秒）
+    WATCH_INTERVAL = 1000
+    # 上级容器整体展开后不超过此行数时，其中的子容器在数据树中随上级一起展开
+    SMALL_NODE_LINES = 200
+    
     def __init__(self, root):
         """
         初始化现代化编辑器UI
@@ -32,6 +62,45 @@ class ModernEditorUI:
         self.current_search_term = ""
         self.original_tree_data = None
         
+        # 后台加载/保存相关变量
+        self.worker_queue = queue.Queue()
+        self.load_generation = 0  # 每次打开文件时加一，旧的加载结果会被丢弃
+        self.loading = False
+        self.saving = False
+        self.polling = False
+        self.close_after_save = False
+        self.editable_selected = False
+        # 每个容器的节点数、行数和大小，由后台加载时预先计算（与文档一起缓存），修改时增量更新
+        self.subtree_stats = SubtreeStats()
+        # 所有节点按文档顺序排列的扁平索引，供搜索和上下文视图使用，修改时增量更新
+        self.path_index = PathIndex()
+        # 键和值的三字母组索引，加载后由后台线程建立，完成前为None（搜索时逐个节点比较）；
+        # 建立期间的修改先记录下来，索引交给主线程后再补上
+        self.search_index = None
+        self.search_index_pending = []
+        # 带键的记录列表的索引，支持 savedData{Name=...} 形式的路径
+        self.record_index = RecordIndex()
+        # 场景名 -> 引用它的记录和列表位置，由后台线程建立（延迟解析时在sceneData解析完成后），完成前为None
+        self.scene_index = None
+        # 场景视图当前显示的场景（None表示场景列表）及其标题控件，用于判断场景视图是否仍在显示
+        self.scene_view_scene = None
+        self.scene_view_title = None
+        # 从多个存档推断的键架构（data/key_schema.json），用于显示字段出现过的类型；没有架构文件时为None
+        self.key_schema = load_default_schema()
+        
+        # 外部修改检测: 编辑器中的文档对应的磁盘版本副本，用于计算外部修改了哪些字段
+        self.watcher = SaveWatcher()
+        self.disk_document = None
+        self.reloading = False
+        # 读取外部修改期间请求的保存（读取结束后开始）: (文件路径, 保存后是否关闭)
+        self.pending_save = None
+        # 保存期间收到的外部修改，保存结束后再合并: (加载代数, 'reloaded'的内容)
+        self.deferred_reload = None
+        # sceneData延迟解析时，后台线程仍在解析剩余部分（此时还没有磁盘版本副本）
+        self.parsing = False
+        # 后台线程正在建立搜索索引
+        self.indexing = False
+        
         # 创建文件工具类
         self.file_utils = FileUtils(self.update_status)
         
@@ -43,6 +112,9 @@ class ModernEditorUI:
         
         # 绑定关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # 定期检查打开的存档是否被游戏改写
+        self.root.after(self.WATCH_INTERVAL, self._watch_tick)
     
     def _create_menu(self):
         """
@@ -126,7 +198,7 @@ class ModernEditorUI:
             width=120,
             height=30,
             anchor="w",
-            state="normal" if self.data else "disabled"
+            state="normal" if self.data and not self.saving else "disabled"
         )
         save_button.pack(fill="x", padx=2, pady=2)
         
@@ -137,7 +209,7 @@ class ModernEditorUI:
             width=120,
             height=30,
             anchor="w",
-            state="normal" if self.data else "disabled"
+            state="normal" if self.data and not self.saving else "disabled"
         )
         save_as_button.pack(fill="x", padx=2, pady=2)
         
@@ -247,6 +319,15 @@ class ModernEditorUI:
         )
         self.clear_search_button.pack(side="left", padx=2)
         
+        self.scene_button = ctk.CTkButton(
+            search_frame,
+            text="🗺️ 场景",
+            command=self.show_scene_view,
+            width=70,
+            height=35
+        )
+        self.scene_button.pack(side="left", padx=2)
+        
         # 主题切换按钮
         self.theme_button = ctk.CTkButton(
             button_frame,
@@ -277,22 +358,19 @@ class ModernEditorUI:
         )
         tree_title.pack(pady=(20, 10))
         
-        # 创建滚动框架来模拟树形视图
+        # 数据树: 只创建可见区域内的行控件，滚动时复用
+        self.data_tree = VirtualTree(left_frame, on_select=self._on_tree_select, inline=self._is_small_node,
+                                     width=400, height=400)
+        self.data_tree.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+        
+        # 搜索结果、场景视图和上下文视图显示在滚动框架中，显示时替换数据树
         self.tree_scroll_frame = ctk.CTkScrollableFrame(
             left_frame, 
             label_text="数据节点",
             width=400,
             height=400
         )
-        self.tree_scroll_frame.pack(fill="both", expand=True, padx=20, pady=(0, 20))
-        
-        # 绑定滚动事件来自动加载更多内容
-        self._bind_scroll_events()
-        
-        # 存储当前数据和加载状态
-        self.current_data = None
-        self.current_path_prefix = ""
-        self.is_loading_more = False
+        self.tree_scroll_canvas = self.tree_scroll_frame._parent_canvas
         
         # 右侧编辑面板
         right_frame = ctk.CTkFrame(main_frame, width=350)
@@ -368,93 +446,6 @@ class ModernEditorUI:
         )
         help_text.pack(pady=(0, 15), padx=15)
     
-    def _bind_scroll_events(self):
-        """
-        绑定滚动事件来自动加载更多内容
-        """
-        # 获取内部的canvas和scrollbar
-        canvas = None
-        for child in self.tree_scroll_frame.winfo_children():
-            if hasattr(child, 'winfo_class') and child.winfo_class() == 'Canvas':
-                canvas = child
-                break
-        
-        if canvas:
-            # 绑定鼠标滚轮事件
-            canvas.bind('<MouseWheel>', self._on_mousewheel)
-            # 绑定滚动条事件
-            canvas.bind('<Configure>', self._on_canvas_configure)
-    
-    def _on_mousewheel(self, event):
-        """
-        处理鼠标滚轮事件
-        """
-        # 检查是否滚动到底部
-        self.root.after(50, self._check_scroll_position)
-    
-    def _on_canvas_configure(self, event):
-        """
-        处理canvas配置变化事件
-        """
-        # 检查是否滚动到底部
-        self.root.after(50, self._check_scroll_position)
-    
-    def _check_scroll_position(self):
-        """
-        检查滚动位置，如果接近底部则自动加载更多内容
-        """
-        if self.is_loading_more:
-            return
-            
-        # 获取滚动框架的canvas
-        canvas = None
-        for child in self.tree_scroll_frame.winfo_children():
-            if hasattr(child, 'winfo_class') and child.winfo_class() == 'Canvas':
-                canvas = child
-                break
-        
-        if canvas:
-            # 获取滚动位置
-            try:
-                scroll_top = canvas.canvasy(0)
-                scroll_bottom = canvas.canvasy(canvas.winfo_height())
-                canvas_height = canvas.bbox("all")[3] if canvas.bbox("all") else 0
-                
-                # 如果滚动到接近底部（90%），自动加载更多
-                if canvas_height > 0 and scroll_bottom >= canvas_height * 0.9:
-                    self._auto_load_more()
-            except:
-                pass
-    
-    def _auto_load_more(self):
-        """
-        自动加载更多内容
-        """
-        if self.is_loading_more:
-            return
-            
-        # 查找"加载更多"按钮并自动点击
-        self._find_and_click_load_more_button(self.tree_scroll_frame)
-    
-    def _find_and_click_load_more_button(self, parent):
-        """
-        递归查找并点击"加载更多"按钮
-        """
-        for widget in parent.winfo_children():
-            if isinstance(widget, ctk.CTkButton):
-                button_text = widget.cget("text")
-                if "还有" in button_text and "点击加载更多" in button_text:
-                    self.is_loading_more = True
-                    # 模拟点击按钮
-                    widget.invoke()
-                    # 延迟重置加载状态
-                    self.root.after(1000, lambda: setattr(self, 'is_loading_more', False))
-                    return True
-            elif hasattr(widget, 'winfo_children'):
-                if self._find_and_click_load_more_button(widget):
-                    return True
-        return False
-    
     def _create_status_bar(self):
         """
         创建状态栏
@@ -532,13 +523,20 @@ class ModernEditorUI:
         """
         处理窗口关闭事件
         """
+        if self.saving:
+            # 等待正在进行的保存完成后再关闭
+            self.close_after_save = True
+            self.update_status('正在保存，完成后将关闭窗口...')
+            return
+        
         if self.modified:
             result = messagebox.askyesnocancel(
                 '确认', 
                 '文件已修改，是否保存？'
             )
             if result is True:
-                self.save_file()
+                self.save_file(close_after=True)
+                return
             elif result is None:
                 return
         
@@ -547,8 +545,12 @@ class ModernEditorUI:
     
     def load_file(self):
         """
-        加载文件
+        加载文件，读取、解密和解析在后台线程中进行
         """
+        if self.saving:
+            self.update_status('正在保存文件，请稍候再打开')
+            return
+        
         try:
             file_path = filedialog.askopenfilename(
                 title="选择存档文件",
@@ -562,41 +564,32 @@ class ModernEditorUI:
             )
             
             if file_path:
+                # 新的加载开始后，之前尚未完成的加载会在下一个阶段中止
+                self.load_generation += 1
+                self.loading = True
+                self.indexing = True
                 self.update_status('正在加载文件...')
-                result = self.file_utils.load_file(file_path)
-                
-                if result and result[0] is not None:
-                    self.data = result[0]
-                    self.file_path = file_path
-                    self.modified = False
-                    self.populate_tree_modern()
-                    
-                    # 文件已加载，菜单中的保存选项将可用
-                    # 注意：按钮已移至菜单栏，不再需要在此处更新按钮状态
-                    
-                    # 更新文件信息
-                    filename = os.path.basename(file_path)
-                    self.file_info_label.configure(text=f"文件: {filename}")
-                    
-                    self.update_status('文件加载成功')
-                else:
-                    self.update_status('文件加载失败')
+                self._start_worker(self._load_worker, file_path, self.load_generation)
                     
         except Exception as e:
             messagebox.showerror('错误', f'加载文件失败: {str(e)}')
             self.update_status('加载失败')
     
-    def save_file(self):
+    def save_file(self, close_after=False):
         """
-        保存文件
+        保存文件，备份和加密在后台线程中进行
+        
+        参数:
+            close_after: 保存成功后是否关闭窗口
         """
         if self.file_path and self.data is not None:
-            try:
-                self.file_utils.save_file(self.data, self.file_path)
-                self.modified = False
-                self.update_status('文件保存成功')
-            except Exception as e:
-                messagebox.showerror('错误', f'保存文件失败: {str(e)}')
+            if self.watcher.is_stale() and not messagebox.askyesno(
+                '确认',
+                '磁盘上的存档已被其他程序修改，比编辑器中的版本更新。\n继续保存将覆盖这些修改，是否继续？'
+            ):
+                self.update_status('已取消保存')
+                return
+            self._start_save(self.file_path, close_after)
     
     def save_as_game_file(self):
         """
@@ -615,585 +608,435 @@ class ModernEditorUI:
                 )
                 
                 if file_path:
-                    self.file_utils.save_file(self.data, file_path)
-                    self.update_status('文件另存成功')
+                    self._start_save(file_path)
                     
             except Exception as e:
                 messagebox.showerror('错误', f'另存文件失败: {str(e)}')
     
-    def populate_tree_modern(self):
+    def _start_save(self, file_path, close_after=False):
         """
-        填充数据树
+        开始后台保存，保存期间禁止修改数据
         """
-        # 清空现有内容
-        for widget in self.tree_scroll_frame.winfo_children():
-            widget.destroy()
+        if self.saving:
+            self.update_status('正在保存，请稍候...')
+            return
+        if self.loading:
+            self.update_status('正在加载文件，请稍候再保存')
+            return
+        if self.reloading:
+            # 外部修改的合并会修改文档，不能与保存线程同时进行，读取结束后再保存
+            self.pending_save = (file_path, close_after)
+            self.update_status('正在读取外部修改，完成后将自动保存...')
+            return
         
-        if self.data:
-            # 存储当前数据和状态
-            self.current_data = self.data
-            self.current_path_prefix = ""
-            self.is_loading_more = False
-            
-            # 显示加载提示
-            self.update_status('正在加载数据树...')
-            # 使用after方法异步创建树节点，避免界面卡死
-            self.root.after(100, lambda: self._create_tree_nodes_async(self.tree_scroll_frame, self.data, ""))
-            # 延迟绑定滚动事件，确保内容已加载
-            self.root.after(1000, self._bind_scroll_events)
+        self.saving = True
+        self.close_after_save = close_after
+        self.update_button.configure(state="disabled")
+        self.update_status(f'正在保存: {os.path.basename(file_path)}...')
+        self._start_worker(self._save_worker, self.data, file_path)
     
-    def _create_tree_nodes_async(self, parent, data, path_prefix, processed_count=0, max_per_batch=100):
+    def _start_worker(self, target, *args):
         """
-        异步创建树节点，分批处理避免界面卡死
+        启动后台线程，并确保主线程在轮询结果队列
         """
-        if isinstance(data, dict):
-            items = list(data.items())
-            batch_items = items[processed_count:processed_count + max_per_batch]
-            
-            for key, value in batch_items:
-                current_path = f"{path_prefix}.{key}" if path_prefix else key
-                
-                if isinstance(value, (dict, list)):
-                    # 创建可展开的节点
-                    node_frame = ctk.CTkFrame(parent)
-                    node_frame.pack(fill="x", padx=5, pady=2)
-                    
-                    node_button = ctk.CTkButton(
-                        node_frame,
-                        text=f"📁 {key}",
-                        command=lambda p=current_path: self.select_node(p),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    node_button.pack(fill="x", padx=5, pady=2)
-                    
-                    # 只显示前几个子项，其余延迟加载
-                    if len(str(value)) < 1000:  # 小数据直接显示
-                        child_frame = ctk.CTkFrame(node_frame, fg_color="transparent")
-                        child_frame.pack(fill="x", padx=20)
-                        self._create_tree_nodes_simple(child_frame, value, current_path)
-                    else:
-                        # 大数据显示可点击的展开按钮
-                        expand_button = ctk.CTkButton(
-                            node_frame,
-                            text="📂 点击展开查看内容...",
-                            command=lambda p=current_path, v=value, nf=node_frame: self.expand_large_data(p, v, nf),
-                            anchor="w",
-                            fg_color="transparent",
-                            text_color=("gray30", "gray70"),
-                            hover_color=("gray80", "gray20")
-                        )
-                        expand_button.pack(fill="x", padx=25, pady=2)
-                        
-                else:
-                    # 创建叶子节点
-                    leaf_frame = ctk.CTkFrame(parent)
-                    leaf_frame.pack(fill="x", padx=5, pady=1)
-                    
-                    leaf_button = ctk.CTkButton(
-                        leaf_frame,
-                        text=f"📄 {key}: {str(value)[:30]}{'...' if len(str(value)) > 30 else ''}",
-                        command=lambda p=current_path, v=value: self.select_leaf_node(p, v),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    leaf_button.pack(fill="x", padx=5, pady=1)
-            
-            # 如果还有更多项目，继续异步处理
-            new_processed = processed_count + max_per_batch
-            if new_processed < len(items):
-                self.root.after(50, lambda: self._create_tree_nodes_async(parent, data, path_prefix, new_processed, max_per_batch))
-            else:
-                self.update_status('数据树加载完成')
-        
-        elif isinstance(data, list):
-            # 处理列表类型
-            for i, item in enumerate(data[:max_per_batch]):  # 限制显示数量
-                current_path = f"{path_prefix}[{i}]" if path_prefix else f"[{i}]"
-                
-                item_frame = ctk.CTkFrame(parent)
-                item_frame.pack(fill="x", padx=5, pady=1)
-                
-                item_button = ctk.CTkButton(
-                    item_frame,
-                    text=f"📋 [{i}]: {str(item)[:30]}{'...' if len(str(item)) > 30 else ''}",
-                    command=lambda p=current_path, v=item: self.select_leaf_node(p, v),
-                    anchor="w",
-                    fg_color="transparent",
-                    text_color=("gray10", "gray90"),
-                    hover_color=("gray80", "gray20")
-                )
-                item_button.pack(fill="x", padx=5, pady=1)
-            
-            if len(data) > max_per_batch:
-                remaining_count = len(data) - max_per_batch
-                load_more_button = ctk.CTkButton(
-                    parent,
-                    text=f"📋 还有 {remaining_count} 个项目，点击加载更多...",
-                    command=lambda: self.load_more_list_items(parent, data, path_prefix, max_per_batch),
-                    anchor="w",
-                    fg_color=("#3B82F6", "#1E40AF"),
-                    text_color="white",
-                    hover_color=("#2563EB", "#1D4ED8")
-                )
-                load_more_button.pack(fill="x", padx=25, pady=2)
-            
-            self.update_status('数据树加载完成')
+        threading.Thread(target=target, args=args, daemon=True).start()
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.POLL_INTERVAL, self._poll_worker_queue)
     
-    def _calculate_json_lines(self, data):
+    def _load_worker(self, file_path, generation):
         """
-        计算JSON数据的行数（用于分页控制）
+        后台线程: 读取、解密、解析文件并建立索引，结果通过队列交给主线程
         """
-        if isinstance(data, dict):
-            if not data:
-                return 2  # {} 空字典占2行
-            lines = 1  # 开始的 {
-            for key, value in data.items():
-                lines += 1  # key行
-                if isinstance(value, (dict, list)):
-                    lines += self._calculate_json_lines(value)
-                else:
-                    # 简单值不额外增加行数，已在key行计算
-                    pass
-            lines += 1  # 结束的 }
-            return lines
-        elif isinstance(data, list):
-            if not data:
-                return 2  # [] 空列表占2行
-            lines = 1  # 开始的 [
-            for item in data:
-                if isinstance(item, (dict, list)):
-                    lines += self._calculate_json_lines(item)
-                else:
-                    lines += 1  # 简单值占1行
-            lines += 1  # 结束的 ]
-            return lines
-        else:
-            return 1  # 简单值占1行
+        def progress(stage):
+            if generation != self.load_generation:
+                raise LoadCancelled()
+            self.worker_queue.put(('progress', generation, (file_path, stage)))
+        
+        try:
+            result = self.file_utils.load_document(file_path, progress, self._build_subtree_stats, lazy=True)
+            data, index, _, _, signature = result
+            lazy = isinstance(data, LazyDocument)
+            # 保留一份磁盘版本的副本，检测到外部修改时用来计算改动了哪些字段；
+            # sceneData延迟解析时先显示playerData，副本在后台解析完剩余部分后再交给主线程
+            disk_document = None if lazy else copy_document(data)
+            scene_index = None if lazy else self._build_scene_index(data)
+            self.worker_queue.put(('loaded', generation, (file_path,) + result
+                                   + (disk_document, scene_index, PathIndex.build(data))))
+            if lazy:
+                disk_document, index = self.file_utils.complete_document(data, signature, self._build_subtree_stats)
+                self.worker_queue.put(('parsed', generation, (disk_document, self._build_scene_index(data), index,
+                                                              PathIndex.build(data))))
+        except LoadCancelled:
+            return
+        except Exception as e:
+            self.worker_queue.put(('load_error', generation, str(e)))
+            return
+        
+        if generation != self.load_generation:
+            return
+        try:
+            search_index = SearchIndex.build(data)
+        except RuntimeError:
+            # 建立期间主线程合并了增加键的外部修改，搜索时改为逐个节点比较
+            search_index = None
+        self.worker_queue.put(('indexed', generation, search_index))
+    
+    @staticmethod
+    def _build_scene_index(data):
+        scene_index = SceneIndex()
+        scene_index.build(data)
+        return scene_index
+    
+    @staticmethod
+    def _build_subtree_stats(data):
+        """
+        预先统计每个容器的子树，避免在主线程中遍历整个存档（尚未解析的成员按原始文本的长度计入）
+        """
+        return SubtreeStats.build(data).entries
+    
+    def _save_worker(self, data, file_path):
+        """
+        后台线程: 备份并保存文件，结果通过队列交给主线程
+        """
+        try:
+            backup, reuse_info = self.file_utils.write_document(data, file_path)
+            # 保存期间禁止修改，此时的数据就是刚写入磁盘的版本
+            signature = DocumentCache.signature(file_path)
+            self.worker_queue.put(('saved', None, (file_path, backup, reuse_info, signature, copy_document(data))))
+        except Exception as e:
+            self.worker_queue.put(('save_error', None, str(e)))
+    
+    def _reload_worker(self, file_path, base, generation):
+        """
+        后台线程: 解码被外部修改的存档，并计算它相对于编辑器所基于的磁盘版本的补丁
+        """
+        try:
+            data, _, _, _, signature = self.file_utils.load_document(file_path)
+            patch = json_patch.diff(base, data)
+            self.worker_queue.put(('reloaded', generation, (file_path, base, data, patch, signature)))
+        except Exception as e:
+            self.worker_queue.put(('reload_error', generation, str(e)))
     
-    def _create_tree_nodes_simple(self, parent, data, path_prefix, start_index=0, items_per_page=100):
+    def _watch_tick(self):
         """
-        简单版本的树节点创建，支持基于行数的分页加载
+        定期检查打开的存档是否被外部程序修改，发现修改时在后台重新解码
         """
-        if isinstance(data, dict):
-            items = list(data.items())
-            current_lines = 0
-            processed_items = 0
+        if self.data is not None and not (self.loading or self.saving or self.reloading or self.parsing):
+            try:
+                signature = self.watcher.check()
+            except OSError:
+                signature = None  # 文件正在被改写，下次再检查
+            if signature is not None:
+                self.reloading = True
+                self.update_status('检测到存档被外部修改，正在读取...')
+                self._start_worker(self._reload_worker, self.file_path, self.disk_document, self.load_generation)
+        self.root.after(self.WATCH_INTERVAL, self._watch_tick)
+    
+    def _poll_worker_queue(self):
+        """
+        在主线程中处理后台任务的进度和结果
+        """
+        while True:
+            try:
+                kind, generation, payload = self.worker_queue.get_nowait()
+            except queue.Empty:
+                break
             
-            for i, (key, value) in enumerate(items[start_index:], start_index):
-                # 计算当前项的行数
-                if isinstance(value, (dict, list)):
-                    item_lines = 1 + self._calculate_json_lines(value)  # key行 + 值的行数
-                else:
-                    item_lines = 1  # 简单值只占1行
-                
-                # 检查是否超过页面限制
-                if current_lines + item_lines > items_per_page and processed_items > 0:
-                    # 创建"加载更多"按钮
-                    load_more_frame = ctk.CTkFrame(parent)
-                    load_more_frame.pack(fill="x", padx=5, pady=5)
-                    
-                    load_more_button = ctk.CTkButton(
-                        load_more_frame,
-                        text=f"📥 加载更多... (剩余 {len(items) - i} 项)",
-                        command=lambda p=parent, d=data, pp=path_prefix, si=i: self._create_tree_nodes_simple(p, d, pp, si, items_per_page),
-                        fg_color=("#1f538d", "#14375e"),
-                        hover_color=("#144870", "#1f538d")
-                    )
-                    load_more_button.pack(fill="x", padx=5, pady=2)
-                    break
-                
-                current_path = f"{path_prefix}.{key}" if path_prefix else key
-                
-                if isinstance(value, (dict, list)):
-                    # 创建展开的节点标题
-                    node_frame = ctk.CTkFrame(parent)
-                    node_frame.pack(fill="x", padx=5, pady=1)
-                    
-                    node_button = ctk.CTkButton(
-                        node_frame,
-                        text=f"📂 {key}: {type(value).__name__} ({len(value)} items)",
-                        command=lambda p=current_path, v=value: self.select_leaf_node(p, v),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    node_button.pack(fill="x", padx=5, pady=1)
-                    
-                    # 自动展开嵌套内容
-                    child_frame = ctk.CTkFrame(node_frame, fg_color="transparent")
-                    child_frame.pack(fill="x", padx=20, pady=2)
-                    self._create_tree_nodes_simple(child_frame, value, current_path)
-                    
-                else:
-                    # 创建叶子节点
-                    leaf_frame = ctk.CTkFrame(parent)
-                    leaf_frame.pack(fill="x", padx=5, pady=1)
-                    
-                    leaf_button = ctk.CTkButton(
-                        leaf_frame,
-                        text=f"📄 {key}: {str(value)[:20]}{'...' if len(str(value)) > 20 else ''}",
-                        command=lambda p=current_path, v=value: self.select_leaf_node(p, v),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    leaf_button.pack(fill="x", padx=5, pady=1)
-                
-                # 更新行数和处理项目计数
-                current_lines += item_lines
-                processed_items += 1
-        
-        elif isinstance(data, list):
-            # 处理列表类型数据，基于行数分页
-            current_lines = 0
-            processed_items = 0
+            if kind in ('reloaded', 'reload_error'):
+                self.reloading = False
+            if kind in ('progress', 'loaded', 'parsed', 'indexed', 'load_error', 'reloaded', 'reload_error') and generation != self.load_generation:
+                continue  # 已被新的加载取代
             
-            for i in range(start_index, len(data)):
-                item = data[i]
-                
-                # 计算当前项的行数
-                if isinstance(item, (dict, list)):
-                    item_lines = self._calculate_json_lines(item)
+            if kind == 'progress':
+                file_path, stage = payload
+                self.update_status(f'正在加载 {os.path.basename(file_path)}: {LOAD_STAGES[stage]}...')
+            elif kind == 'loaded':
+                self._on_load_finished(*payload)
+            elif kind == 'parsed':
+                self.parsing = False
+                disk_document, self.scene_index, entries, path_index = payload
+                if not self.path_index.is_complete():
+                    # 搜索时已经在主线程中补全过的索引不再替换
+                    self.path_index = path_index
+                for key in LAZY_KEYS:
+                    # 解析期间被修改过的成员已经由update()统计过，不能用磁盘版本的统计覆盖
+                    if key in self.data and (key,) not in self.subtree_stats.entries:
+                        self.subtree_stats.merge(self.data, SubtreeStats(entries), (key,))
+                if self.disk_document is None:
+                    # 解析期间已经保存过时，保存后的版本才是磁盘版本
+                    self.disk_document = disk_document
+            elif kind == 'indexed':
+                self._on_search_index_built(payload)
+            elif kind == 'load_error':
+                self.loading = False
+                self.parsing = False
+                self.indexing = False
+                messagebox.showerror('错误', f'无法加载文件: {payload}')
+                self.update_status('文件加载失败')
+            elif kind == 'saved':
+                self._on_save_finished(*payload)
+            elif kind == 'reloaded':
+                if self.saving:
+                    # 保存线程正在序列化文档，保存结束后再合并
+                    self.deferred_reload = (generation, payload)
                 else:
-                    item_lines = 1  # 简单值占1行
-                
-                # 检查是否超过页面限制
-                if current_lines + item_lines > items_per_page and processed_items > 0:
-                    # 创建"加载更多"按钮
-                    load_more_frame = ctk.CTkFrame(parent)
-                    load_more_frame.pack(fill="x", padx=5, pady=5)
-                    
-                    load_more_button = ctk.CTkButton(
-                        load_more_frame,
-                        text=f"📥 加载更多... (剩余 {len(data) - i} 项)",
-                        command=lambda p=parent, d=data, pp=path_prefix, si=i: self._create_tree_nodes_simple(p, d, pp, si, items_per_page),
-                        fg_color=("#1f538d", "#14375e"),
-                        hover_color=("#144870", "#1f538d")
-                    )
-                    load_more_button.pack(fill="x", padx=5, pady=2)
-                    break
-                current_path = f"{path_prefix}[{i}]" if path_prefix else f"[{i}]"
-                
-                if isinstance(item, (dict, list)):
-                    # 创建展开的节点标题
-                    node_frame = ctk.CTkFrame(parent)
-                    node_frame.pack(fill="x", padx=5, pady=1)
-                    
-                    # 尝试获取有意义的名称
-                    display_name = f"[{i}]"
-                    if isinstance(item, dict) and 'Name' in item:
-                        display_name = str(item['Name'])
-                    elif isinstance(item, dict) and 'name' in item:
-                        display_name = str(item['name'])
-                    
-                    node_button = ctk.CTkButton(
-                        node_frame,
-                        text=f"📂 {display_name}: {type(item).__name__} ({len(item)} items)",
-                        command=lambda p=current_path, v=item: self.select_leaf_node(p, v),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    node_button.pack(fill="x", padx=5, pady=1)
-                    
-                    # 自动展开嵌套内容
-                    child_frame = ctk.CTkFrame(node_frame, fg_color="transparent")
-                    child_frame.pack(fill="x", padx=20, pady=2)
-                    self._create_tree_nodes_simple(child_frame, item, current_path)
-                    
-                else:
-                    # 创建叶子节点
-                    leaf_frame = ctk.CTkFrame(parent)
-                    leaf_frame.pack(fill="x", padx=5, pady=1)
-                    
-                    leaf_button = ctk.CTkButton(
-                        leaf_frame,
-                        text=f"📄 [{i}]: {str(item)[:20]}{'...' if len(str(item)) > 20 else ''}",
-                        command=lambda p=current_path, v=item: self.select_leaf_node(p, v),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    leaf_button.pack(fill="x", padx=5, pady=1)
-                
-                # 更新行数和处理项目计数
-                current_lines += item_lines
-                processed_items += 1
+                    self._on_external_change(*payload)
+            elif kind == 'reload_error':
+                self.update_status(f'读取外部修改的存档失败: {payload}')
+            elif kind == 'save_error':
+                self.saving = False
+                self.close_after_save = False
+                self._restore_update_button()
+                messagebox.showerror('错误', f'保存文件时出错: {payload}')
+                self.update_status('保存失败')
+        
+        if self.deferred_reload is not None and not self.saving:
+            self._merge_deferred_reload()
+        if self.pending_save is not None and not (self.reloading or self.saving):
+            file_path, close_after = self.pending_save
+            self.pending_save = None
+            self._start_save(file_path, close_after)
+        
+        if self.loading or self.saving or self.reloading or self.parsing or self.indexing or not self.worker_queue.empty():
+            self.root.after(self.POLL_INTERVAL, self._poll_worker_queue)
+        else:
+            self.polling = False
     
-    def load_more_list_items(self, parent, data, path_prefix, start_index):
+    def _merge_deferred_reload(self):
         """
-        加载更多列表项目
+        保存结束后处理保存期间读取到的外部修改: 磁盘文件仍是读取时的版本才合并，
+        否则（通常已被刚才的保存覆盖）丢弃，之后的外部修改由监视器重新发现
         """
-        # 移除"加载更多"按钮
-        for widget in parent.winfo_children():
-            if isinstance(widget, ctk.CTkButton) and "还有" in widget.cget("text") and "点击加载更多" in widget.cget("text"):
-                widget.destroy()
-                break
+        generation, payload = self.deferred_reload
+        self.deferred_reload = None
+        file_path, signature = payload[0], payload[-1]
+        if generation != self.load_generation or file_path != self.file_path:
+            return
+        try:
+            current = DocumentCache.signature(file_path)
+        except OSError:
+            current = None
+        if current is None or current[3] != signature[3]:
+            self.update_status('保存期间读取到的外部修改已被覆盖，未合并')
+            return
+        self._on_external_change(*payload)
+    
+    def _on_load_finished(self, file_path, data, stats, cache_hit, seconds, signature, disk_document, scene_index,
+                          path_index):
+        """
+        后台加载完成，在主线程中显示数据
+        """
+        self.loading = False
+        self.data = data
+        self.file_path = file_path
+        self.pending_save = None
+        self.deferred_reload = None
+        self.modified = False
+        self.subtree_stats = SubtreeStats(stats) if stats is not None else SubtreeStats.build(data)
+        self.disk_document = disk_document
+        self.parsing = disk_document is None
+        self.scene_index = scene_index
+        self.path_index = path_index
+        self.search_index = None
+        self.search_index_pending = []
+        self.record_index.build(data)
+        self.watcher.watch(file_path, signature)
+        self.populate_tree_modern()
         
-        # 继续显示更多列表项
-        max_per_batch = 50
-        end_index = start_index + max_per_batch
+        # 文件已加载，菜单中的保存选项将可用
+        # 注意：按钮已移至菜单栏，不再需要在此处更新按钮状态
         
-        for i, item in enumerate(data[start_index:end_index], start_index):
-            current_path = f"{path_prefix}[{i}]" if path_prefix else f"[{i}]"
-            
-            item_frame = ctk.CTkFrame(parent)
-            item_frame.pack(fill="x", padx=5, pady=1)
-            
-            item_button = ctk.CTkButton(
-                item_frame,
-                text=f"📋 [{i}]: {str(item)[:30]}{'...' if len(str(item)) > 30 else ''}",
-                command=lambda p=current_path, v=item: self.select_leaf_node(p, v),
-                anchor="w",
-                fg_color="transparent",
-                text_color=("gray10", "gray90"),
-                hover_color=("gray80", "gray20")
-            )
-            item_button.pack(fill="x", padx=5, pady=1)
-        
-        # 如果还有更多项目，继续显示加载更多按钮
-        if end_index < len(data):
-            remaining_count = len(data) - end_index
-            load_more_button = ctk.CTkButton(
-                parent,
-                text=f"📋 还有 {remaining_count} 个项目，点击加载更多...",
-                command=lambda: self.load_more_list_items(parent, data, path_prefix, end_index),
-                anchor="w",
-                fg_color=("#3B82F6", "#1E40AF"),
-                text_color="white",
-                hover_color=("#2563EB", "#1D4ED8")
-            )
-            load_more_button.pack(fill="x", padx=25, pady=2)
+        # 更新文件信息
+        filename = os.path.basename(file_path)
+        self.file_info_label.configure(text=f"文件: {filename}")
+        
+        self.update_status(f'文件加载成功: {self.file_utils.describe_load(cache_hit, seconds)}')
     
-    def load_more_items(self, parent, data, path_prefix, start_index, items_per_page):
+    def _on_search_index_built(self, search_index):
         """
-        加载更多项目
+        后台线程建立完搜索索引，补上建立期间的修改后开始使用
         """
-        # 移除"加载更多"按钮
-        for widget in parent.winfo_children():
-            if isinstance(widget, ctk.CTkButton) and "还有" in widget.cget("text") and "点击加载更多" in widget.cget("text"):
-                widget.destroy()
-                break
-        
-        # 继续加载更多项目
-        self._create_tree_nodes_simple(parent, data, path_prefix, start_index, items_per_page)
+        self.indexing = False
+        if search_index is not None:
+            for tokens, structural in self.search_index_pending:
+                search_index.update(self.data, tokens, structural)
+        self.search_index = search_index
+        self.search_index_pending = []
     
-    def expand_nested_data(self, path, data, node_frame):
+    def _update_search_index(self, tokens, structural=False):
         """
-        展开嵌套文档数据
+        文档在tokens处被修改后更新搜索索引（索引尚未建立完成时先记录下来）
         """
-        # 检查是否已经展开
-        expanded = False
-        for widget in node_frame.winfo_children():
-            if isinstance(widget, ctk.CTkFrame) and widget.cget("fg_color") == "transparent":
-                expanded = True
-                break
-        
-        if expanded:
-            # 如果已展开，则折叠
-            for widget in list(node_frame.winfo_children()):
-                if isinstance(widget, ctk.CTkFrame) and widget.cget("fg_color") == "transparent":
-                    widget.destroy()
-            # 更新按钮文本
-            for widget in node_frame.winfo_children():
-                if isinstance(widget, ctk.CTkButton):
-                    current_text = widget.cget("text")
-                    if current_text.startswith("📂"):
-                        new_text = current_text.replace("📂", "📁")
-                        widget.configure(text=new_text)
-                    break
+        if self.search_index is None:
+            self.search_index_pending.append((tuple(tokens), structural))
         else:
-            # 如果未展开，则展开
-            child_frame = ctk.CTkFrame(node_frame, fg_color="transparent")
-            child_frame.pack(fill="x", padx=20, pady=2)
-            
-            # 显示加载提示
-            loading_label = ctk.CTkLabel(child_frame, text="正在加载...")
-            loading_label.pack(fill="x", padx=5, pady=2)
-            
-            # 更新按钮文本
-            for widget in node_frame.winfo_children():
-                if isinstance(widget, ctk.CTkButton):
-                    current_text = widget.cget("text")
-                    if current_text.startswith("📁"):
-                        new_text = current_text.replace("📁", "📂")
-                        widget.configure(text=new_text)
-                    break
-            
-            # 异步加载内容
-            self.root.after(100, lambda: self._load_nested_content(child_frame, data, path, loading_label))
+            self.search_index.update(self.data, tokens, structural)
     
-    def _load_nested_content(self, parent, data, path, loading_label):
+    def _on_save_finished(self, file_path, backup, reuse_info, signature, disk_document):
         """
-        异步加载嵌套内容
+        后台保存完成，在主线程中更新状态
         """
-        # 移除加载提示
-        loading_label.destroy()
+        self.saving = False
+        self._restore_update_button()
+        if file_path == self.file_path:
+            self.modified = False
+            self.disk_document = disk_document
+            self.watcher.acknowledge(signature)
+        
+        backup_info = self.file_utils.describe_backup(backup)
+        self.update_status(f'已保存: {os.path.basename(file_path)}, {backup_info}{reuse_info}')
         
-        # 创建内容
-        self._create_tree_nodes_simple(parent, data, path)
+        if self.close_after_save:
+            self.root.quit()
+            self.root.destroy()
+            return
+        messagebox.showinfo('成功', f'文件已保存，{backup_info}')
     
-    def expand_large_data(self, path, data, node_frame):
+    def _on_external_change(self, file_path, base, data, patch, signature):
         """
-        展开/收回大数据内容
+        存档被外部程序修改后，只把改动的字段合并到编辑器中的文档和可见的节点
+        
+        参数:
+            base: 计算补丁时所基于的磁盘版本副本
         """
-        # 检查是否已经展开
-        expanded = False
-        for widget in node_frame.winfo_children():
-            if isinstance(widget, ctk.CTkFrame) and widget.cget("fg_color") == "transparent":
-                expanded = True
-                break
+        if file_path != self.file_path:
+            return
+        if self.saving:
+            # 保存期间禁止修改，保存结束后再处理
+            self.deferred_reload = (self.load_generation, (file_path, base, data, patch, signature))
+            return
+        if base is not self.disk_document:
+            # 读取期间保存过或合并过其他修改，补丁所基于的版本已经过时，之后的修改由监视器重新发现
+            self.update_status('外部修改读取期间磁盘版本已变化，未合并')
+            return
         
-        if expanded:
-            # 如果已展开，则折叠
-            for widget in list(node_frame.winfo_children()):
-                if isinstance(widget, ctk.CTkFrame) and widget.cget("fg_color") == "transparent":
-                    widget.destroy()
-            # 重新创建展开按钮
-            expand_button = ctk.CTkButton(
-                node_frame,
-                text="📋 点击展开查看内容...",
-                command=lambda: self.expand_large_data(path, data, node_frame),
-                anchor="w",
-                fg_color=("#10B981", "#059669"),
-                text_color="white",
-                hover_color=("#059669", "#047857")
-            )
-            expand_button.pack(fill="x", padx=25, pady=2)
-        else:
-            # 如果未展开，则展开
-            # 移除展开按钮
-            for widget in node_frame.winfo_children():
-                if isinstance(widget, ctk.CTkButton) and "点击展开" in widget.cget("text"):
-                    widget.destroy()
-                    break
-            
-            # 创建子框架显示内容
-            child_frame = ctk.CTkFrame(node_frame, fg_color="transparent")
-            child_frame.pack(fill="x", padx=20)
-            
-            # 显示加载提示
-            loading_label = ctk.CTkLabel(child_frame, text="正在加载...")
-            loading_label.pack(fill="x", padx=5, pady=2)
-            
-            # 异步加载内容
-            self.root.after(100, lambda: self._load_large_data_content(child_frame, data, path, loading_label))
+        if not patch:
+            self.disk_document = data
+            self.watcher.acknowledge(signature)
+            self.update_status('存档已被外部程序改写，内容没有变化')
+            return
+        
+        if self.modified and not messagebox.askyesno(
+            '存档已被外部修改',
+            f'存档文件已被其他程序修改（{len(patch)} 处改动）。\n'
+            '是否将这些改动合并到编辑器中？未保存的修改中涉及相同字段的将被覆盖。'
+        ):
+            self.update_status('已忽略外部修改，保存时将提示是否覆盖')
+            return
+        
+        # 补丁中的值引用新文档中的对象，复制一份以免编辑时同时改动磁盘版本的副本
+        self.data = json_patch.apply(self.data, copy_document(patch))
+        self.disk_document = data
+        self.watcher.acknowledge(signature)
+        # 外部修改可能增删或替换整条记录，重新建立记录索引和场景索引
+        self.record_index.build(self.data)
+        if self.scene_index is not None:
+            self.scene_index.build(self.data)
+        
+        rebuild = False
+        for op in patch:
+            tokens = self._pointer_tokens(op['path'])
+            self.subtree_stats.update(self.data, tokens, op['op'] != 'replace')
+            self.path_index.update(self.data, tokens, op['op'] != 'replace')
+            self._update_search_index(tokens, op['op'] != 'replace')
+            value = op.get('value')
+            if op['op'] != 'replace' or isinstance(value, (dict, list)):
+                rebuild = True
+                continue
+            path = self._path_from_pointer(op['path'])
+            self._update_tree_node_display(path, value)
+            if getattr(self, 'current_path', None) == path and hasattr(self, 'current_value'):
+                self.select_leaf_node(path, value)
+        
+        if rebuild:
+            self.populate_tree_modern()
+        self.update_status(f'已合并外部修改: {len(patch)} 处改动')
+    
+    def _path_from_pointer(self, pointer):
+        """
+        将JSON指针转换为界面使用的路径（如 playerData.Tools.savedData[0].Name）
+        """
+        return format_path(self._pointer_tokens(pointer))
     
-    def _load_large_data_content(self, parent, data, path, loading_label):
+    def _pointer_tokens(self, pointer):
+        """
+        将JSON指针转换为路径段列表（列表下标转换为int），指针末尾指向已删除的元素时也可以转换
         """
-        异步加载大数据内容
+        tokens = []
+        node = self.data
+        for token in json_patch.split_pointer(pointer):
+            if isinstance(node, list):
+                token = int(token)
+            tokens.append(token)
+            try:
+                node = node.loaded(token) if isinstance(node, LazyDocument) else node[token]
+            except (KeyError, IndexError, TypeError):
+                node = None
+        return tokens
+    
+    def _restore_update_button(self):
         """
-        # 移除加载提示
-        loading_label.destroy()
+        保存结束后按当前选中的节点恢复更新按钮状态
+        """
+        self.update_button.configure(state="normal" if self.editable_selected else "disabled")
+    
+    def populate_tree_modern(self):
+        """
+        填充数据树；同一文档保留原有的展开状态，新打开的文档默认展开较小的顶层容器
+        """
+        self.tree_scroll_frame.pack_forget()
+        self.data_tree.pack(fill="both", expand=True, padx=20, pady=(0, 20))
         
-        # 创建内容
-        self._create_tree_nodes_simple(parent, data, path)
+        if self.data_tree.model.data is self.data:
+            self.data_tree.refresh()
+        else:
+            self.data_tree.set_data(self.data, ())
     
-    def _create_tree_nodes(self, parent, data, path_prefix):
+    def _is_small_node(self, path):
         """
-        递归创建树节点
+        上级容器格式化后不超过SMALL_NODE_LINES行时，容器随上级一起展开（尚未解析的成员没有统计，不展开）
         """
-        if isinstance(data, dict):
-            for key, value in data.items():
-                current_path = f"{path_prefix}.{key}" if path_prefix else key
-                
-                if isinstance(value, (dict, list)):
-                    # 创建可展开的节点
-                    node_frame = ctk.CTkFrame(parent)
-                    node_frame.pack(fill="x", padx=5, pady=2)
-                    
-                    node_button = ctk.CTkButton(
-                        node_frame,
-                        text=f"📁 {key}",
-                        command=lambda p=current_path: self.select_node(p),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    node_button.pack(fill="x", padx=5, pady=2)
-                    
-                    # 递归创建子节点
-                    child_frame = ctk.CTkFrame(node_frame, fg_color="transparent")
-                    child_frame.pack(fill="x", padx=20)
-                    self._create_tree_nodes(child_frame, value, current_path)
-                    
-                else:
-                    # 创建叶子节点
-                    leaf_frame = ctk.CTkFrame(parent)
-                    leaf_frame.pack(fill="x", padx=5, pady=1)
-                    
-                    leaf_button = ctk.CTkButton(
-                        leaf_frame,
-                        text=f"📄 {key}: {str(value)[:30]}{'...' if len(str(value)) > 30 else ''}",
-                        command=lambda p=current_path, v=value: self.select_leaf_node(p, v),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    leaf_button.pack(fill="x", padx=5, pady=1)
-        
-        elif isinstance(data, list):
-            for i, item in enumerate(data):
-                current_path = f"{path_prefix}[{i}]" if path_prefix else f"[{i}]"
-                
-                if isinstance(item, (dict, list)):
-                    # 创建数组节点
-                    node_frame = ctk.CTkFrame(parent)
-                    node_frame.pack(fill="x", padx=5, pady=2)
-                    
-                    node_button = ctk.CTkButton(
-                        node_frame,
-                        text=f"📋 [{i}]",
-                        command=lambda p=current_path: self.select_node(p),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    node_button.pack(fill="x", padx=5, pady=2)
-                    
-                    # 递归创建子节点
-                    child_frame = ctk.CTkFrame(node_frame, fg_color="transparent")
-                    child_frame.pack(fill="x", padx=20)
-                    self._create_tree_nodes(child_frame, item, current_path)
-                    
-                else:
-                    # 创建数组元素节点
-                    leaf_frame = ctk.CTkFrame(parent)
-                    leaf_frame.pack(fill="x", padx=5, pady=1)
-                    
-                    leaf_button = ctk.CTkButton(
-                        leaf_frame,
-                        text=f"📄 [{i}]: {str(item)[:30]}{'...' if len(str(item)) > 30 else ''}",
-                        command=lambda p=current_path, v=item: self.select_leaf_node(p, v),
-                        anchor="w",
-                        fg_color="transparent",
-                        text_color=("gray10", "gray90"),
-                        hover_color=("gray80", "gray20")
-                    )
-                    leaf_button.pack(fill="x", padx=5, pady=1)
+        parent = self.subtree_stats.get(path[:-1])
+        return parent is not None and parent[1] <= self.SMALL_NODE_LINES
+    
+    def _clear_tree_frame(self):
+        """
+        用滚动框架替换数据树并清空其内容，用于显示搜索结果、场景视图等
+        """
+        self.data_tree.pack_forget()
+        self.tree_scroll_frame.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+        for widget in self.tree_scroll_frame.winfo_children():
+            widget.destroy()
+    
+    def _on_tree_select(self, row):
+        """
+        数据树中的行被点击（容器节点已由数据树展开或折叠）
+        """
+        path = format_path(row.path)
+        if row.is_container():
+            self.select_node(path)
+        else:
+            self.select_leaf_node(path, row.value())
     
     def select_node(self, path):
         """
         选择节点（容器节点）
         """
         self.current_path = path
-        self.path_label.configure(text=f"路径: {path}")
+        self.path_label.configure(text=f"路径: {self._display_path(path)}")
+        self._select_in_tree(path)
         self.value_entry.delete(0, "end")
         self.value_entry.configure(placeholder_text="此节点包含子项，无法直接编辑")
+        self.editable_selected = False
         self.update_button.configure(state="disabled")
-        self.type_label.configure(text="类型: 容器节点")
+        tokens = self._tree_path(path)
+        stats = self.subtree_stats.get(tokens) if tokens is not None else None
+        if stats is None:
+            self.type_label.configure(text="类型: 容器节点")
+        else:
+            nodes, lines, size = stats
+            self.type_label.configure(text=f"类型: 容器节点（{nodes} 个节点，{lines} 行，约 {size / 1024:.1f} KB）")
     
     def select_leaf_node(self, path, value):
         """
@@ -1201,19 +1044,58 @@ class ModernEditorUI:
         """
         self.current_path = path
         self.current_value = value
-        self.path_label.configure(text=f"路径: {path}")
+        self.path_label.configure(text=f"路径: {self._display_path(path)}")
+        self._select_in_tree(path)
         
         # 设置当前值
         self.value_entry.delete(0, "end")
         self.value_entry.insert(0, str(value))
         self.value_entry.configure(placeholder_text="")
         
-        # 启用更新按钮
-        self.update_button.configure(state="normal")
+        # 启用更新按钮（保存期间保持禁用）
+        self.editable_selected = True
+        self.update_button.configure(state="disabled" if self.saving else "normal")
         
-        # 显示数据类型
+        # 显示数据类型，架构中该字段出现过其他类型或可能缺失时一并显示
         value_type = type(value).__name__
-        self.type_label.configure(text=f"类型: {value_type}")
+        schema_types = self._schema_types(path)
+        if schema_types and schema_types != value_type:
+            self.type_label.configure(text=f"类型: {value_type} (存档中: {schema_types})")
+        else:
+            self.type_label.configure(text=f"类型: {value_type}")
+    
+    def _select_in_tree(self, path, reveal=False):
+        """
+        在数据树中高亮选中的节点，reveal为True时展开上级节点并滚动到该节点
+        """
+        tokens = self._tree_path(path)
+        if tokens is not None:
+            self.data_tree.select(tokens, reveal)
+    
+    def _schema_types(self, path):
+        """
+        架构中该路径出现过的类型，如 int|float，可能缺失的字段以?结尾；没有架构或路径不在架构中时返回None
+        """
+        if self.key_schema is None:
+            return None
+        try:
+            node = self.key_schema.lookup(self.record_index.resolve(self.data, parse_path(path)))
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+        if node is None:
+            return None
+        return node.type_names() + ('?' if node.optional else '')
+    
+    def _display_path(self, path):
+        """
+        界面显示的路径: 带键的记录列表用 {Name=...} 代替下标，可以直接复制到搜索框中定位
+        """
+        if self.data is None:
+            return path
+        try:
+            return self.record_index.natural_path(self.data, parse_path(path))
+        except ValueError:
+            return path
     
     def update_value(self):
         """
@@ -1222,6 +1104,11 @@ class ModernEditorUI:
         if not hasattr(self, 'current_path') or not hasattr(self, 'current_value'):
             return
         
+        if self.saving:
+            # 后台线程正在序列化数据，保存完成前不允许修改
+            self.update_status('正在保存，请稍候再修改')
+            return
+        
         try:
             new_value = self.value_entry.get()
             
@@ -1229,7 +1116,9 @@ class ModernEditorUI:
             if isinstance(self.current_value, bool):
                 new_value = new_value.lower() in ('true', '1', 'yes', 'on')
             elif isinstance(self.current_value, int):
-                new_value = int(new_value)
+                # 架构中该字段也出现过小数时允许输入小数
+                schema_types = self._schema_types(self.current_path) or ''
+                new_value = float(new_value) if 'float' in schema_types.split('|') and '.' in new_value else int(new_value)
             elif isinstance(self.current_value, float):
                 new_value = float(new_value)
             # 字符串保持原样
@@ -1243,6 +1132,8 @@ class ModernEditorUI:
             
             # 更新左侧树视图中对应节点的显示值
             self._update_tree_node_display(self.current_path, new_value)
+            if self._scene_view_visible():
+                self._display_scene_view(self.scene_view_scene)
             
             self.update_status(f'已更新: {self.current_path} = {new_value}')
             
@@ -1255,92 +1146,25 @@ class ModernEditorUI:
         """
         更新树视图中对应节点的显示值
         """
-        try:
-            # 递归查找并更新对应路径的叶子节点按钮
-            self._find_and_update_node_button(self.tree_scroll_frame, path, new_value)
-        except Exception as e:
-            print(f"更新树节点显示失败: {e}")
-    
-    def _find_and_update_node_button(self, parent, target_path, new_value):
-        """
-        递归查找并更新指定路径的节点按钮文本
-        """
-        for widget in parent.winfo_children():
-            if isinstance(widget, ctk.CTkFrame):
-                # 检查这个框架中的按钮
-                for child in widget.winfo_children():
-                    if isinstance(child, ctk.CTkButton):
-                        button_text = child.cget("text")
-                        # 检查是否是叶子节点按钮
-                        if button_text.startswith("📄"):
-                            # 从按钮的command中获取路径信息
-                            try:
-                                # 通过按钮文本推断路径
-                                if self._is_target_leaf_button(button_text, target_path):
-                                    # 更新按钮文本
-                                    key = target_path.split('.')[-1] if '.' in target_path else target_path
-                                    key = key.replace('[', '').replace(']', '') if '[' in key else key
-                                    new_text = f"📄 {key}: {str(new_value)[:20]}{'...' if len(str(new_value)) > 20 else ''}"
-                                    child.configure(text=new_text)
-                                    return True
-                            except:
-                                pass
-                # 递归搜索子框架
-                if self._find_and_update_node_button(widget, target_path, new_value):
-                    return True
-        return False
-    
-    def _is_target_leaf_button(self, button_text, target_path):
-        """
-        判断按钮是否对应目标路径
+        # 数据树的行显示时从文档读取值，只需更新显示该路径的那一个行按钮（不在可见区域时无需更新）
+        tokens = self._tree_path(path)
+        if tokens is not None and self.data_tree.winfo_ismapped():
+            self.data_tree.update_row(tokens)
+    
+    def _tree_path(self, path):
+        """
+        界面路径对应的数据树路径（选择器替换为下标的路径段元组）；路径无效时返回None
         """
         try:
-            # 从路径中提取最后一个键名
-            if '.' in target_path:
-                key = target_path.split('.')[-1]
-            else:
-                key = target_path
-            
-            # 处理数组索引
-            if '[' in key and ']' in key:
-                key = key.replace('[', '').replace(']', '')
-            
-            # 检查按钮文本是否包含这个键名
-            return f"📄 {key}:" in button_text
-        except:
-            return False
+            return tuple(self.record_index.resolve(self.data, parse_path(path)))
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
     
     def set_value_from_path(self, data, path, value):
         """
-        根据路径设置值
-        """
-        parts = []
-        current_part = ""
-        in_brackets = False
-        
-        for char in path:
-            if char == '[':
-                if current_part:
-                    parts.append(current_part)
-                    current_part = ""
-                in_brackets = True
-            elif char == ']':
-                if current_part:
-                    parts.append(int(current_part))
-                    current_part = ""
-                in_brackets = False
-            elif char == '.' and not in_brackets:
-                if current_part:
-                    parts.append(current_part)
-                    current_part = ""
-            else:
-                current_part += char
-        
-        if current_part:
-            if in_brackets:
-                parts.append(int(current_part))
-            else:
-                parts.append(current_part)
+        根据路径设置值，路径中可以用 {Name=...} 或 {SceneName=...,ID=...} 按键定位记录
+        """
+        parts = self.record_index.resolve(data, parse_path(path))
         
         # 导航到目标位置并设置值
         current = data
@@ -1348,6 +1172,12 @@ class ModernEditorUI:
             current = current[part]
         
         current[parts[-1]] = value
+        self.record_index.touch(parts)
+        self.subtree_stats.update(data, parts)
+        self.path_index.update(data, parts)
+        self._update_search_index(parts)
+        if self.scene_index is not None:
+            self.scene_index.touch(data, parts)
     
     def search_keys(self, event=None):
         """
@@ -1369,8 +1199,12 @@ class ModernEditorUI:
         if self.original_tree_data is None:
             self.original_tree_data = self.data
             
-        # 搜索匹配的键值对
-        self._search_in_data(self.data, "")
+        if '{' in search_term:
+            # 按键定位的路径（如 playerData.Tools.savedData{Name=Bone Necklace}）直接通过索引查找
+            self._search_by_address(search_term)
+        else:
+            # 搜索匹配的键值对
+            self._search_in_data()
         
         if self.search_results:
             # 重置分页状态
@@ -1384,73 +1218,73 @@ class ModernEditorUI:
             messagebox.showinfo("搜索结果", f"未找到包含 '{search_term}' 的键或值")
             self.update_status("未找到匹配项")
     
-    def _search_in_data(self, data, path_prefix):
+    def _search_by_address(self, address):
         """
-        递归搜索数据中包含关键词的key或value
+        通过记录索引定位路径，找到时作为唯一的搜索结果
         """
-        if isinstance(data, dict):
-            for key, value in data.items():
-                current_path = f"{path_prefix}.{key}" if path_prefix else key
-                
-                # 检查key是否包含搜索词
-                key_match = self.current_search_term in key.lower()
-                
-                # 检查value是否包含搜索词（如果value是字符串类型）
-                value_match = False
-                if isinstance(value, str):
-                    value_match = self.current_search_term in value.lower()
-                elif isinstance(value, (int, float, bool)):
-                    # 对于数字和布尔值，转换为字符串后比较
-                    value_match = self.current_search_term in str(value).lower()
-                
-                # 如果key或value匹配，添加到结果中
-                if key_match or value_match:
-                    match_type = "键" if key_match else "值"
-                    if key_match and value_match:
-                        match_type = "键和值"
-                        
-                    self.search_results.append({
-                        'path': current_path,
-                        'key': key,
-                        'value': value,
-                        'type': type(value).__name__,
-                        'match_type': match_type
-                    })
-                
-                # 递归搜索嵌套数据
-                if isinstance(value, (dict, list)):
-                    self._search_in_data(value, current_path)
-                    
-        elif isinstance(data, list):
-            for i, item in enumerate(data):
-                current_path = f"{path_prefix}[{i}]" if path_prefix else f"[{i}]"
-                
-                # 检查列表项的值是否包含搜索词（如果是基本类型）
-                if isinstance(item, str):
-                    if self.current_search_term in item.lower():
-                        self.search_results.append({
-                            'path': current_path,
-                            'key': f"[{i}]",
-                            'value': item,
-                            'type': type(item).__name__,
-                            'match_type': "值"
-                        })
-                elif isinstance(item, (int, float, bool)):
-                    # 对于数字和布尔值，转换为字符串后比较
-                    if self.current_search_term in str(item).lower():
-                        self.search_results.append({
-                            'path': current_path,
-                            'key': f"[{i}]",
-                            'value': item,
-                            'type': type(item).__name__,
-                            'match_type': "值"
-                        })
-                
-                # 对于列表项，如果是字典或列表则递归搜索
-                if isinstance(item, dict):
-                    self._search_in_data(item, current_path)
-                elif isinstance(item, list):
-                    self._search_in_data(item, current_path)
+        try:
+            parts = self.record_index.resolve(self.data, parse_path(address))
+            value = self.record_index.get(self.data, format_path(parts))
+        except (KeyError, IndexError, TypeError, ValueError):
+            return
+        self.search_results.append({
+            'path': format_path(parts),
+            'key': str(parts[-1]) if parts else '',
+            'value': value,
+            'type': type(value).__name__,
+            'match_type': '路径'
+        })
+    
+    def _search_in_data(self):
+        """
+        搜索包含关键词的key或value（对象的键，以及字符串、数字和布尔值），结果按文档顺序排列；
+        搜索索引建立完成后只确认候选文本，否则遍历路径索引逐个比较
+        """
+        index = self._complete_path_index()
+        term = self.current_search_term
+        if self.search_index is not None:
+            key_matches, value_matches = self.search_index.search(term)
+            positions = index.positions
+            for row in sorted(positions[path] for path in key_matches | value_matches if path in positions):
+                path = index.paths[row]
+                self._add_search_result(index, row, path in key_matches, path in value_matches)
+            return
+        
+        keys, types = index.keys, index.types
+        for row in range(len(index)):
+            key = keys[row]
+            code = types[row]
+            # 列表元素没有键
+            key_match = type(key) is str and term in key.lower()
+            value_match = False
+            if STR <= code <= BOOL:
+                value = index.value(row)
+                value_match = term in (value if code == STR else str(value)).lower()
+            if key_match or value_match:
+                self._add_search_result(index, row, key_match, value_match)
+    
+    def _add_search_result(self, index, row, key_match, value_match):
+        if key_match and value_match:
+            match_type = "键和值"
+        else:
+            match_type = "键" if key_match else "值"
+        key = index.keys[row]
+        value = index.value(row)
+        self.search_results.append({
+            'path': index.format(row),
+            'key': key if type(key) is str else f"[{key}]",
+            'value': value,
+            'type': type(value).__name__,
+            'match_type': match_type
+        })
+    
+    def _complete_path_index(self):
+        """
+        返回完整的路径索引；sceneData尚未在后台解析完时立即解析并补全
+        """
+        if not self.path_index.is_complete():
+            self.path_index.complete(self.data)
+        return self.path_index
     
     def _display_search_results(self, page=1, items_per_page=20):
         """
@@ -1460,9 +1294,8 @@ class ModernEditorUI:
             page: 当前页码，从1开始
             items_per_page: 每页显示的结果数量
         """
-        # 清空当前树视图
-        for widget in self.tree_scroll_frame.winfo_children():
-            widget.destroy()
+        # 用滚动框架替换数据树
+        self._clear_tree_frame()
             
         # 创建搜索结果标题
         result_title = ctk.CTkLabel(
@@ -1568,7 +1401,8 @@ class ModernEditorUI:
             match_type_colors = {
                 "键": ("#16A34A", "#22C55E"),  # 绿色
                 "值": ("#9333EA", "#A855F7"),  # 紫色
-                "键和值": ("#EA580C", "#F97316")  # 橙色
+                "键和值": ("#EA580C", "#F97316"),  # 橙色
+                "路径": ("#2563EB", "#3B82F6")  # 蓝色
             }
             match_color = match_type_colors.get(result['match_type'], ("#6B7280", "#9CA3AF"))
             
@@ -1643,6 +1477,204 @@ class ModernEditorUI:
         )
         view_button.pack(side="left")
     
+    # 场景视图中各部分的标题
+    SCENE_SECTION_TITLES = {
+        'persistentBools': '布尔记录',
+        'persistentInts': '整数记录',
+        'geoRocks': '矿石',
+        'StoryEvents': '剧情事件',
+        'SteelQuestSpots': '钢魂任务地点',
+        'scenesVisited': '已访问',
+        'scenesMapped': '已绘制地图',
+    }
+    # 场景列表最多显示的数量，更多的场景需要输入名称筛选
+    SCENE_LIST_LIMIT = 100
+    
+    def show_scene_view(self):
+        """
+        显示场景视图
+        """
+        if not self.data:
+            messagebox.showwarning("警告", "请先加载文件")
+            return
+        if self.scene_index is None:
+            self.update_status('正在解析场景数据，请稍候')
+            return
+        self._display_scene_view(None)
+    
+    def _scene_view_visible(self):
+        return self.scene_view_title is not None and self.scene_view_title.winfo_exists()
+    
+    def _display_scene_view(self, scene, filter_text=''):
+        """
+        在数据树区域显示场景视图: 未指定场景时显示场景列表，否则显示该场景的全部记录和标记
+        
+        Args:
+            scene: 场景名，None表示显示场景列表
+            filter_text: 场景列表的筛选文本
+        """
+        self._clear_tree_frame()
+        self.scene_view_scene = scene
+        
+        self.scene_view_title = ctk.CTkLabel(
+            self.tree_scroll_frame,
+            text=f"🗺️ 场景视图: {scene}" if scene else "🗺️ 场景视图",
+            font=ctk.CTkFont(size=16, weight="bold")
+        )
+        self.scene_view_title.pack(fill="x", padx=10, pady=10)
+        
+        back_button = ctk.CTkButton(
+            self.tree_scroll_frame,
+            text="🏠 返回主页",
+            command=self._return_to_main_view,
+            width=120,
+            height=30,
+            font=ctk.CTkFont(size=12),
+            fg_color=("#DC2626", "#EF4444"),
+            hover_color=("#B91C1C", "#DC2626")
+        )
+        back_button.pack(anchor="w", padx=10, pady=(0, 10))
+        
+        # 场景名筛选
+        filter_frame = ctk.CTkFrame(self.tree_scroll_frame, fg_color="transparent")
+        filter_frame.pack(fill="x", padx=10, pady=(0, 10))
+        filter_entry = ctk.CTkEntry(filter_frame, placeholder_text="输入场景名筛选...", width=220)
+        filter_entry.pack(side="left", padx=(0, 5))
+        if filter_text or scene:
+            filter_entry.insert(0, filter_text or scene)
+        show = lambda event=None: self._on_scene_filter(filter_entry.get().strip())
+        filter_entry.bind("<Return>", show)
+        ctk.CTkButton(filter_frame, text="查看", command=show, width=60).pack(side="left")
+        
+        if scene is None or scene not in self.scene_index:
+            self._display_scene_list(filter_text)
+        else:
+            self._display_scene_detail(scene)
+        
+        self.tree_scroll_canvas.yview_moveto(0.0)
+    
+    def _on_scene_filter(self, text):
+        if text in self.scene_index:
+            self._display_scene_view(text)
+        else:
+            self._display_scene_view(None, text)
+    
+    def _display_scene_list(self, filter_text):
+        names = self.scene_index.scene_names(filter_text)
+        shown = names[:self.SCENE_LIST_LIMIT]
+        ctk.CTkLabel(
+            self.tree_scroll_frame,
+            text=f"共 {len(names)} 个场景" + (f"，显示前 {len(shown)} 个" if len(shown) < len(names) else ""),
+            font=ctk.CTkFont(size=12)
+        ).pack(anchor="w", padx=10)
+        for name in shown:
+            ctk.CTkButton(
+                self.tree_scroll_frame,
+                text=f"📍 {name}",
+                command=lambda n=name: self._display_scene_view(n),
+                anchor="w",
+                height=25,
+                fg_color="transparent",
+                text_color=("gray10", "gray90"),
+                hover_color=("gray80", "gray20")
+            ).pack(fill="x", padx=10, pady=1)
+    
+    def _display_scene_detail(self, scene):
+        view = self.scene_index.view(self.data, scene)
+        
+        # 访问/地图标记和整个场景的批量开关
+        flag_frame = ctk.CTkFrame(self.tree_scroll_frame, fg_color="transparent")
+        flag_frame.pack(fill="x", padx=10, pady=(0, 5))
+        for name in ('scenesVisited', 'scenesMapped'):
+            flag = self.scene_index.flag(scene, name)
+            ctk.CTkButton(
+                flag_frame,
+                text=f"{'✅' if flag else '⬜'} {self.SCENE_SECTION_TITLES[name]}",
+                command=lambda n=name, f=flag: self._toggle_scene(scene, not f, (n,)),
+                width=110,
+                height=28
+            ).pack(side="left", padx=(0, 5))
+        ctk.CTkButton(
+            flag_frame,
+            text="全部开启",
+            command=lambda: self._toggle_scene(scene, True),
+            width=80,
+            height=28,
+            fg_color=("#16A34A", "#22C55E"),
+            hover_color=("#15803D", "#16A34A")
+        ).pack(side="left", padx=(0, 5))
+        ctk.CTkButton(
+            flag_frame,
+            text="全部关闭",
+            command=lambda: self._toggle_scene(scene, False),
+            width=80,
+            height=28,
+            fg_color="gray",
+            hover_color="darkgray"
+        ).pack(side="left")
+        
+        for name in SCENE_RECORDS:
+            entries = view.get(name)
+            if not entries:
+                continue
+            header = ctk.CTkFrame(self.tree_scroll_frame, fg_color="transparent")
+            header.pack(fill="x", padx=10, pady=(10, 2))
+            ctk.CTkLabel(
+                header,
+                text=f"{self.SCENE_SECTION_TITLES[name]} ({len(entries)})",
+                font=ctk.CTkFont(size=13, weight="bold")
+            ).pack(side="left")
+            if name == 'persistentBools':
+                for value in (False, True):
+                    ctk.CTkButton(
+                        header,
+                        text=f"全部设为 {value}",
+                        command=lambda v=value: self._toggle_scene(scene, v, ('persistentBools',)),
+                        width=110,
+                        height=24,
+                        font=ctk.CTkFont(size=10)
+                    ).pack(side="right", padx=(5, 0))
+            
+            for tokens, record in entries:
+                if 'Value' in record:
+                    path = format_path(tokens + ['Value'])
+                    text = f"📄 {record.get('ID', tokens[-1])}: {record['Value']}"
+                    command = lambda p=path, v=record['Value']: self.select_leaf_node(p, v)
+                else:
+                    path = format_path(tokens)
+                    text = "📁 " + ", ".join(f"{k}={v}" for k, v in record.items() if k != 'SceneName')
+                    command = lambda p=path: self.select_node(p)
+                ctk.CTkButton(
+                    self.tree_scroll_frame,
+                    text=text,
+                    command=command,
+                    anchor="w",
+                    height=25,
+                    fg_color="transparent",
+                    text_color=("gray10", "gray90"),
+                    hover_color=("gray80", "gray20")
+                ).pack(fill="x", padx=20, pady=1)
+    
+    def _toggle_scene(self, scene, value, collections=('persistentBools', 'scenesVisited', 'scenesMapped')):
+        """
+        把场景的布尔记录和访问/地图标记批量设为value: 整个修改作为一个补丁应用到文档，之后只刷新一次场景视图
+        """
+        if self.saving:
+            self.update_status('正在保存，请稍候再修改')
+            return
+        patch = self.scene_index.toggle_patch(self.data, scene, value, collections)
+        if patch:
+            # 补丁只修改记录的Value字段和场景名列表，不涉及记录索引的键
+            self.data = self.scene_index.apply(self.data, patch)
+            self.modified = True
+            for op in patch:
+                tokens = self._pointer_tokens(op['path'])
+                self.subtree_stats.update(self.data, tokens, op['op'] != 'replace')
+                self.path_index.update(self.data, tokens, op['op'] != 'replace')
+                self._update_search_index(tokens, op['op'] != 'replace')
+        self._display_scene_view(scene)
+        self.update_status(f'场景 {scene}: 已修改 {len(patch)} 处')
+    
     def _return_to_main_view(self):
         """
         返回主页视图，清除搜索结果并重新显示树形结构
@@ -1665,8 +1697,9 @@ class ModernEditorUI:
         """
         将搜索结果添加到右侧编辑面板
         """
-        # 直接选择该节点，这会在右侧显示编辑界面
+        # 直接选择该节点，这会在右侧显示编辑界面，返回主页时数据树会定位到该节点
         self.select_leaf_node(result['path'], result['value'])
+        self._select_in_tree(result['path'], reveal=True)
         
         # 更新状态栏
         self.update_status(f"已添加到右侧编辑面板: {result['path']}")
@@ -1685,9 +1718,8 @@ class ModernEditorUI:
         """
         显示搜索结果的上下文内容（上下25行）
         """
-        # 清空当前树视图
-        for widget in self.tree_scroll_frame.winfo_children():
-            widget.destroy()
+        # 用滚动框架替换数据树
+        self._clear_tree_frame()
             
         # 创建上下文标题
         context_title = ctk.CTkLabel(
@@ -1716,57 +1748,23 @@ class ModernEditorUI:
     
     def _get_context_data(self, target_result, context_lines):
         """
-        获取目标结果周围的上下文数据
+        获取目标结果周围的上下文数据（路径索引中前后各context_lines行）
         """
+        if not self.data:
+            return []
+        index = self._complete_path_index()
+        tokens = self._tree_path(target_result['path'])
+        rows = index.context(tokens, context_lines) if tokens is not None else None
+        if rows is None:
+            return []
+        target = index.position(tokens)
         context_data = []
-        target_path = target_result['path']
-        
-        # 递归收集所有数据项
-        all_items = []
-        if self.data:
-            self._collect_all_items(self.data, "", all_items)
-        else:
-            return context_data
-        
-        # 找到目标项的索引
-        target_index = -1
-        for i, (path, key, value) in enumerate(all_items):
-            if path == target_path:
-                target_index = i
-                break
-                
-        if target_index == -1:
-            return context_data
-            
-        # 获取上下文范围
-        start_index = max(0, target_index - context_lines)
-        end_index = min(len(all_items), target_index + context_lines + 1)
-        
-        # 构建上下文数据
-        for i in range(start_index, end_index):
-            path, key, value = all_items[i]
-            is_target = (i == target_index)
-            context_data.append((path, key, value, is_target))
-            
+        for row in rows:
+            key = index.keys[row]
+            context_data.append((index.format(row), key if type(key) is str else f"[{key}]",
+                                 index.value(row), row == target))
         return context_data
         
-    def _collect_all_items(self, data, path_prefix, items_list):
-        """
-        递归收集所有数据项
-        """
-        if isinstance(data, dict):
-            for key, value in data.items():
-                current_path = f"{path_prefix}.{key}" if path_prefix else key
-                items_list.append((current_path, key, value))
-                if isinstance(value, (dict, list)):
-                    self._collect_all_items(value, current_path, items_list)
-        elif isinstance(data, list):
-            for i, value in enumerate(data):
-                current_path = f"{path_prefix}[{i}]"
-                items_list.append((current_path, f"[{i}]", value))
-                if isinstance(value, (dict, list)):
-                    self._collect_all_items(value, current_path, items_list)
-                    
     def _create_context_item(self, path, key, value, is_target, search_term):
         """
         创建上下文项
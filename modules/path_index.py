@@ -0,0 +1,216 @@
+from array import array
+from .lazy_document import LazyDocument, UNPARSED
+from .record_index import format_path
+
+# 节点类型代码；容器的代码最小，code <= LIST即为容器
+DICT, LIST, STR, INT, FLOAT, BOOL, NULL, OTHER, PENDING = range(9)
+TYPE_NAMES = ('dict', 'list', 'str', 'int', 'float', 'bool', 'NoneType', 'object', 'unparsed')
+_CODES = {dict: DICT, list: LIST, str: STR, int: INT, float: FLOAT, bool: BOOL, type(None): NULL}
+
+def type_code(value):
+    """
+    值的类型代码，延迟解析的文档中尚未解析的成员为PENDING
+    """
+    code = _CODES.get(type(value))
+    if code is not None:
+        return code
+    if value is UNPARSED:
+        return PENDING
+    if isinstance(value, dict):
+        return DICT
+    return LIST if isinstance(value, list) else OTHER
+
+def _items(container):
+    if isinstance(container, LazyDocument):
+        return container.loaded_items()
+    if isinstance(container, dict):
+        return container.items()
+    return enumerate(container)
+
+def _rows(container, prefix, parent, depth, start):
+    """
+    按文档顺序生成container的所有子孙节点的行
+
+    参数:
+        container: 容器
+        prefix: 容器的路径段元组
+        parent: 容器所在的行（根为-1）
+        depth: 子节点的深度
+        start: 第一个子节点所在的行
+
+    返回:
+        (paths, parents, depths, keys, types, containers)
+    """
+    paths, parents, depths, keys, types, containers = [], [], [], [], [], []
+
+    def visit(node, path, parent_row, level):
+        for key, value in _items(node):
+            row = start + len(paths)
+            child_path = path + (key,)
+            code = type_code(value)
+            paths.append(child_path)
+            parents.append(parent_row)
+            depths.append(level)
+            keys.append(key)
+            types.append(code)
+            containers.append(node)
+            if code <= LIST:
+                visit(value, child_path, row, level + 1)
+
+    visit(container, prefix, parent, depth)
+    return paths, parents, depths, keys, types, containers
+
+class PathIndex:
+    """
+    文档中所有节点（不含根）按文档顺序排列的扁平索引
+
+    每个节点占一行，各属性保存在并行数组中: 路径段元组、父节点所在的行（顶层为-1）、深度、键、
+    类型代码，以及包含它的容器（值即containers[行][键]，原地修改标量后无需更新）。
+    一个节点的子孙节点紧跟在它后面，上下文就是行的切片。
+    加载时在后台线程中建立一次，之后搜索、上下文视图和键提取都直接遍历这里的数组；
+    修改文档后调用update()，标量的替换只更新类型代码，增删元素时只重建父容器的那一段。
+    延迟解析的文档中尚未解析的成员只占一行（类型为PENDING），解析后调用complete()补全。
+    """
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.paths = []
+        self.parents = array('i')
+        self.depths = array('H')
+        self.keys = []
+        self.types = array('B')
+        self.containers = []
+        # 路径段元组 -> 行
+        self.positions = {}
+
+    @classmethod
+    def build(cls, data):
+        index = cls()
+        if isinstance(data, (dict, list)):
+            index._splice(0, 0, _rows(data, (), -1, 0, 0))
+        return index
+
+    def __len__(self):
+        return len(self.paths)
+
+    def position(self, tokens):
+        """
+        路径所在的行，路径不在索引中时返回None
+        """
+        return self.positions.get(tuple(tokens))
+
+    def value(self, row):
+        """
+        第row行的值（只读访问，不触发解析，也不把延迟解析的文档的成员记为已改动）
+        """
+        container = self.containers[row]
+        if isinstance(container, LazyDocument):
+            return container.loaded(self.keys[row])
+        return container[self.keys[row]]
+
+    def format(self, row):
+        """
+        第row行的界面路径，如 playerData.Tools.savedData[0].Name
+        """
+        return format_path(self.paths[row])
+
+    def subtree_end(self, row):
+        """
+        第row行的子孙节点之后的行
+        """
+        depths = self.depths
+        depth = depths[row]
+        end = row + 1
+        while end < len(depths) and depths[end] > depth:
+            end += 1
+        return end
+
+    def context(self, tokens, radius):
+        """
+        路径前后各radius行的范围，路径不在索引中时返回None
+        """
+        row = self.position(tokens)
+        if row is None:
+            return None
+        return range(max(0, row - radius), min(len(self.paths), row + radius + 1))
+
+    def _splice(self, start, end, rows):
+        """
+        用rows替换[start, end)中的行，并调整之后各行的位置和父节点
+        """
+        paths = self.paths
+        positions = self.positions
+        for path in paths[start:end]:
+            del positions[path]
+        new_paths, parents, depths, keys, types, containers = rows
+        delta = len(new_paths) - (end - start)
+        paths[start:end] = new_paths
+        self.parents[start:end] = array('i', parents)
+        self.depths[start:end] = array('H', depths)
+        self.keys[start:end] = keys
+        self.types[start:end] = array('B', types)
+        self.containers[start:end] = containers
+        for row in range(start, start + len(new_paths)):
+            positions[paths[row]] = row
+        if delta:
+            parents = self.parents
+            for row in range(start + len(new_paths), len(paths)):
+                positions[paths[row]] = row
+                if parents[row] >= end:
+                    parents[row] += delta
+
+    def refresh(self, data, tokens):
+        """
+        重新索引tokens处的节点及其子孙节点；tokens为空或不在索引中时重建整个索引
+        """
+        tokens = tuple(tokens)
+        row = self.positions.get(tokens) if tokens else None
+        if row is None:
+            self._reset()
+            if isinstance(data, (dict, list)):
+                self._splice(0, 0, _rows(data, (), -1, 0, 0))
+            return
+        value = self.value(row)
+        self.types[row] = type_code(value)
+        if isinstance(value, (dict, list)):
+            rows = _rows(value, tokens, row, self.depths[row] + 1, row + 1)
+        else:
+            rows = ([], [], [], [], [], [])
+        self._splice(row + 1, self.subtree_end(row), rows)
+
+    def update(self, data, tokens, structural=False):
+        """
+        文档在tokens处被修改后更新索引
+
+        参数:
+            data: 文档
+            tokens: 被修改的位置（只含键和下标的路径段）
+            structural: 是否增删了元素（列表中后面元素的路径会变化）
+        """
+        tokens = tuple(tokens)
+        if not tokens:
+            self.refresh(data, ())
+            return
+        row = self.positions.get(tokens)
+        if structural or row is None:
+            # 增删了元素或新增了键，重建父容器的那一段
+            self.refresh(data, tokens[:-1])
+            return
+        code = type_code(self.value(row))
+        if code > LIST and self.types[row] > LIST:
+            self.types[row] = code
+        else:
+            self.refresh(data, tokens)
+
+    def is_complete(self):
+        return PENDING not in self.types
+
+    def complete(self, data):
+        """
+        解析延迟解析的文档的剩余部分，并索引之前尚未解析的成员
+        """
+        if isinstance(data, LazyDocument):
+            data.materialize()
+        for row in reversed([row for row, code in enumerate(self.types) if code == PENDING]):
+            self.refresh(data, self.paths[row])
@@ -0,0 +1,242 @@
+import os
+import re
+import mmap
+import json
+from collections import OrderedDict
+from .save_codec import SaveCodec
+from . import json_engine
+
+# JSON结构字符，以及字符串中需要关注的引号和转义符
+_STRUCTURAL = re.compile(rb'["\\{}\[\]:,]')
+
+def iter_spans(source, max_depth=3, chunk_size=65536):
+    """
+    扫描UTF-8 JSON明文，按文档顺序产出对象成员值的字节区间
+
+    只记录从根对象开始、路径上全部是对象（不经过数组）的成员，
+    例如 ('sceneData', 'persistentBools', 'serializedList')。
+    区间包含值两侧可能存在的空白，可以直接交给json.loads解析。
+
+    参数:
+        source: 支持len()和切片的明文（bytes/bytearray/SavePlaintextView）
+        max_depth: 记录的最大路径深度
+        chunk_size: 每次扫描的字节数
+
+    返回:
+        generator: (path, start, end)，在成员值结束时产出
+    """
+    # 每层: [类型, 路径(数组内为None), 当前键, 值起始位置, 是否等待键]
+    stack = []
+    in_string = False
+    string_start = 0
+    last_string = None
+    skip_until = 0
+
+    for offset in range(0, len(source), chunk_size):
+        chunk = source[offset:offset + chunk_size]
+        for match in _STRUCTURAL.finditer(chunk):
+            position = offset + match.start()
+            if position < skip_until:
+                continue
+            char = match.group()
+
+            if in_string:
+                if char == b'\\':
+                    # 跳过被转义的字符
+                    skip_until = position + 2
+                elif char == b'"':
+                    in_string = False
+                    last_string = (string_start, position + 1)
+                continue
+
+            if char == b'"':
+                in_string = True
+                string_start = position
+            elif char == b':':
+                frame = stack[-1]
+                frame[2] = json.loads(source[last_string[0]:last_string[1]])
+                frame[3] = position + 1
+                frame[4] = False
+            elif char == b',' or char == b'}' or char == b']':
+                frame = stack[-1]
+                if frame[0] == b'{' and not frame[4] and frame[1] is not None and frame[2] is not None:
+                    yield frame[1] + (frame[2],), frame[3], position
+                    frame[2] = None
+                frame[4] = True
+                if char != b',':
+                    stack.pop()
+            else:
+                # '{' 或 '['
+                path = None
+                if stack:
+                    parent = stack[-1]
+                    if parent[0] == b'{' and parent[1] is not None and len(parent[1]) + 1 < max_depth:
+                        path = parent[1] + (parent[2],)
+                else:
+                    path = ()
+                stack.append([char, path, None, 0, True])
+
+class SavePlaintextView:
+    """
+    加密存档的随机访问明文视图
+
+    ECB模式下每个AES块独立，Base64每64个字符对应48字节明文，
+    因此任意明文区间都能映射到少量Base64字符，按需解密。
+    已解密的页保存在一个小的LRU缓存中。
+    """
+    # 每页的明文字节数，必须是48的倍数
+    PAGE_BYTES = 48 * 256
+
+    def __init__(self, file_path, codec=None, cache_pages=32):
+        """
+        打开存档并建立明文视图
+
+        参数:
+            file_path: 存档文件路径
+            codec: 使用的SaveCodec，默认新建
+            cache_pages: LRU缓存的最大页数
+        """
+        self.file_path = file_path
+        self.codec = codec or SaveCodec()
+        self.cache_pages = cache_pages
+        self._pages = OrderedDict()
+        self._index = None
+
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError('存档文件为空')
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        start, end = self.codec.payload_bounds(self._map)
+        self._payload_start = start
+        self._payload_chars = end - start
+        if self._payload_chars == 0 or self._payload_chars % 4:
+            raise ValueError('Base64数据长度无效')
+
+        # 解密最后一页得到填充长度，从而得到明文的精确大小
+        padding_chars = self._map[end - 2:end].count(b'=')
+        cipher_size = self._payload_chars // 4 * 3 - padding_chars
+        last_page = self._page((cipher_size - 1) // self.PAGE_BYTES)
+        padding_length = last_page[-1]
+        if not 0 < padding_length <= 16:
+            raise ValueError('Invalid padding')
+        self._size = cipher_size - padding_length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        关闭底层的内存映射
+        """
+        self._pages.clear()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._size)
+            if step != 1:
+                raise ValueError('不支持步长切片')
+            return self.read(start, stop)
+        if key < 0:
+            key += self._size
+        return self.read(key, key + 1)[0]
+
+    def _page(self, number):
+        """
+        获取解密后的页，优先从LRU缓存中读取
+        """
+        page = self._pages.get(number)
+        if page is not None:
+            self._pages.move_to_end(number)
+            return page
+
+        chars = self.PAGE_BYTES // 3 * 4
+        start = self._payload_start + number * chars
+        end = min(start + chars, self._payload_start + self._payload_chars)
+        page = self.codec.decrypt_blocks(self._map[start:end])
+
+        self._pages[number] = page
+        if len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+        return page
+
+    def read(self, start, end):
+        """
+        读取明文区间，只解密覆盖该区间的页
+
+        参数:
+            start: 起始偏移
+            end: 结束偏移（不含）
+
+        返回:
+            bytes: 明文字节
+        """
+        end = min(end, self._size)
+        if start >= end:
+            return b''
+
+        first = start // self.PAGE_BYTES
+        last = (end - 1) // self.PAGE_BYTES
+        if first == last:
+            base = first * self.PAGE_BYTES
+            return self._page(first)[start - base:end - base]
+
+        parts = []
+        for number in range(first, last + 1):
+            base = number * self.PAGE_BYTES
+            parts.append(self._page(number)[max(start - base, 0):end - base])
+        return b''.join(parts)
+
+    def build_index(self, max_depth=3):
+        """
+        扫描一次明文，建立对象成员路径到明文区间的索引
+
+        参数:
+            max_depth: 记录的最大路径深度
+
+        返回:
+            dict: {路径元组: (start, end)}
+        """
+        self._index = {path: (start, end) for path, start, end in iter_spans(self, max_depth)}
+        return self._index
+
+    def span(self, path):
+        """
+        获取成员值的明文区间；尚未建立索引时只扫描到该成员结束为止
+
+        参数:
+            path: 点分隔的路径字符串或路径元组，如 'sceneData.geoRocks'
+
+        返回:
+            (start, end): 明文区间
+        """
+        if isinstance(path, str):
+            path = tuple(path.split('.'))
+        if self._index is not None:
+            return self._index[path]
+
+        for found, start, end in iter_spans(self, len(path)):
+            if found == path:
+                return start, end
+        raise KeyError('.'.join(path))
+
+    def load(self, path):
+        """
+        只解密并解析指定路径的子树
+
+        参数:
+            path: 点分隔的路径字符串或路径元组
+
+        返回:
+            解析后的值
+        """
+        return json_engine.loads(self.read(*self.span(path)))
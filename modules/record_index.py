@@ -0,0 +1,404 @@
+from operator import itemgetter
+from .lazy_document import LazyDocument, UNPARSED
+
+# 可以作为记录键的字段组合，按优先顺序排列
+KEY_FIELDS = (('SceneName', 'ID'), ('Name',), ('SceneName',))
+
+_CONTAINERS = (dict, list)
+
+# 选择器中需要转义的字符
+_SELECTOR_SPECIAL = '\\,=}'
+
+class RecordKey:
+    """
+    路径中按键定位列表元素的选择器，如 {Name=Bone Necklace} 或 {SceneName=Tut_01,ID=Remasker}
+    """
+    __slots__ = ('pairs',)
+
+    def __init__(self, pairs):
+        self.pairs = tuple(pairs)
+
+    @property
+    def fields(self):
+        return tuple(field for field, _ in self.pairs)
+
+    def matches(self, record):
+        return isinstance(record, dict) and all(record.get(field) == value for field, value in self.pairs)
+
+    def __eq__(self, other):
+        return isinstance(other, RecordKey) and self.pairs == other.pairs
+
+    def __hash__(self):
+        return hash(self.pairs)
+
+    def __str__(self):
+        return '{' + ','.join(f'{_escape(field)}={_escape(value)}' for field, value in self.pairs) + '}'
+
+    def __repr__(self):
+        return f'RecordKey({self.pairs!r})'
+
+def _escape(text):
+    return ''.join('\\' + ch if ch in _SELECTOR_SPECIAL else ch for ch in str(text))
+
+def _parse_selector(path, start):
+    """
+    解析从start开始（'{'之后）的选择器，返回(RecordKey, '}'的位置)
+    """
+    pairs = []
+    field = None
+    current = ''
+    i = start
+    while i < len(path):
+        ch = path[i]
+        if ch == '\\' and i + 1 < len(path):
+            i += 1
+            current += path[i]
+        elif ch == '=' and field is None:
+            field, current = current, ''
+        elif ch in ',}':
+            if field is None:
+                raise ValueError(f'选择器缺少"=": {path}')
+            pairs.append((field, current))
+            field, current = None, ''
+            if ch == '}':
+                return RecordKey(pairs), i
+        else:
+            current += ch
+        i += 1
+    raise ValueError(f'选择器缺少"}}": {path}')
+
+def parse_path(path):
+    """
+    将界面路径拆分为路径段
+
+    支持三种路径段: 对象的键（用.分隔）、列表下标（[37]）和按键定位的记录（{Name=Bone Necklace}），
+    例如 playerData.Tools.savedData{Name=Bone Necklace}.Data.AmountLeft。
+    选择器中的 \\ , = } 需要用反斜杠转义。
+
+    参数:
+        path: 路径字符串
+
+    返回:
+        list: 路径段，依次为str、int或RecordKey
+    """
+    tokens = []
+    current = ''
+    i = 0
+    while i < len(path):
+        ch = path[i]
+        if ch in '.[{':
+            if current:
+                tokens.append(current)
+                current = ''
+            if ch == '[':
+                end = path.find(']', i)
+                if end < 0:
+                    raise ValueError(f'下标缺少"]": {path}')
+                tokens.append(int(path[i + 1:end]))
+                i = end
+            elif ch == '{':
+                selector, i = _parse_selector(path, i + 1)
+                tokens.append(selector)
+        else:
+            current += ch
+        i += 1
+    if current:
+        tokens.append(current)
+    return tokens
+
+def format_path(tokens):
+    """
+    将路径段拼接为界面路径（parse_path的逆操作）
+    """
+    path = ''
+    for token in tokens:
+        if isinstance(token, int):
+            path += f'[{token}]'
+        elif isinstance(token, RecordKey):
+            path += str(token)
+        else:
+            path = f'{path}.{token}' if path else token
+    return path
+
+def _child(node, token):
+    # 只读访问，延迟解析的文档不会因此把成员记为已改动
+    if isinstance(node, LazyDocument):
+        return node.peek(token)
+    return node[token]
+
+def _detect_keys(records):
+    """
+    判断列表是否为带键的记录列表
+
+    返回:
+        (键字段, 各记录的键)；不是带键的记录列表时返回None
+    """
+    if len(records) < 2 or type(records[0]) is not dict:
+        return None
+    for fields in KEY_FIELDS:
+        getter = itemgetter(*fields)
+        try:
+            keys = [getter(record) for record in records]
+        except (KeyError, TypeError):
+            continue
+        if len(fields) == 1:
+            keys = [(key,) for key in keys]
+        if all(type(value) is str for key in keys for value in key) and len(set(keys)) == len(keys):
+            return fields, keys
+    return None
+
+class _KeyedList:
+    """
+    一个记录列表的索引: 键 -> 下标
+    """
+    __slots__ = ('records', 'fields', 'positions')
+
+    def __init__(self, records, fields, keys):
+        self.records = records
+        self.fields = fields
+        self.positions = dict(zip(keys, range(len(keys))))
+
+    def key_of(self, record):
+        return tuple(record.get(field) for field in self.fields) if type(record) is dict else None
+
+class RecordIndex:
+    """
+    带键的记录列表（如Tools.savedData按Name、persistentBools按SceneName+ID）的哈希索引
+
+    build()在加载时找出文档中所有带键的记录列表并建立 键 -> 下标 的索引，
+    之后用 {Name=...} 形式的路径段定位记录只需一次字典查找。
+    索引项保存列表对象本身，每次查找都会核对该下标处记录的键，
+    列表被替换、记录被插入/删除或键字段被修改后，索引会在下一次查找时自动重建，
+    因此即使漏掉了touch()通知也不会定位到错误的记录。
+    """
+    def __init__(self):
+        # 列表的路径（不含选择器的路径段元组） -> _KeyedList
+        self._lists = {}
+        # 尚未建立索引的顶层成员（延迟解析的文档中还没有解析的部分）
+        self._pending = set()
+
+    def build(self, data):
+        """
+        查找文档中所有带键的记录列表并建立索引；延迟解析的文档中尚未解析的部分在第一次查找时再建立
+
+        参数:
+            data: 文档
+        """
+        self._lists = {}
+        self._pending = set()
+        if isinstance(data, LazyDocument):
+            for key, value in data.loaded_items():
+                if value is UNPARSED:
+                    self._pending.add(key)
+                else:
+                    self._scan(value, (key,))
+        else:
+            self._scan(data, ())
+
+    def _scan(self, node, path):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if type(value) in _CONTAINERS:
+                    self._scan(value, path + (key,))
+        elif isinstance(node, list):
+            detected = _detect_keys(node)
+            if detected is not None:
+                self._lists[path] = _KeyedList(node, *detected)
+            for i, value in enumerate(node):
+                if type(value) in _CONTAINERS and any(type(child) in _CONTAINERS for child in (
+                        value.values() if type(value) is dict else value)):
+                    self._scan(value, path + (i,))
+
+    def _ensure_section(self, data, tokens):
+        """
+        第一次访问延迟解析的顶层成员时为它建立索引
+        """
+        if tokens and tokens[0] in self._pending:
+            self._pending.discard(tokens[0])
+            self._scan(_child(data, tokens[0]), (tokens[0],))
+
+    def keyed_lists(self):
+        """
+        返回已建立索引的列表: [(路径段元组, 键字段)]
+        """
+        return [(path, entry.fields) for path, entry in self._lists.items()]
+
+    def _entry(self, path, records):
+        """
+        获取列表的索引项，列表对象不同时重新检测并建立
+        """
+        entry = self._lists.get(path)
+        if entry is None or entry.records is not records:
+            detected = _detect_keys(records)
+            if detected is None:
+                self._lists.pop(path, None)
+                return None
+            entry = self._lists[path] = _KeyedList(records, *detected)
+        return entry
+
+    def position(self, path, records, selector):
+        """
+        查找记录在列表中的下标
+
+        参数:
+            path: 列表的路径段元组（只含键和下标）
+            records: 列表对象
+            selector: RecordKey
+
+        返回:
+            int: 下标
+
+        异常:
+            KeyError: 没有匹配的记录
+            ValueError: 列表没有以这些字段为键的索引，且线性查找匹配到多条记录
+        """
+        entry = self._entry(path, records)
+        if entry is not None and set(selector.fields) == set(entry.fields):
+            values = dict(selector.pairs)
+            key = tuple(values[field] for field in entry.fields)
+            i = entry.positions.get(key)
+            if i is not None and i < len(records) and entry.key_of(records[i]) == key:
+                return i
+            # 索引可能已过期（列表在没有通知的情况下被修改过）: 丢弃它，
+            # 这次按线性查找的结果为准，下次查找时重新检测并建立
+            del self._lists[path]
+
+        matches = [i for i, record in enumerate(records) if selector.matches(record)]
+        if not matches:
+            raise KeyError(f'没有匹配的记录: {format_path(list(path) + [selector])}')
+        if len(matches) > 1:
+            raise ValueError(f'匹配到 {len(matches)} 条记录: {format_path(list(path) + [selector])}')
+        return matches[0]
+
+    def resolve(self, data, tokens):
+        """
+        将路径段中的选择器替换为下标
+
+        参数:
+            data: 文档
+            tokens: parse_path的返回值
+
+        返回:
+            list: 只含键和下标的路径段
+        """
+        self._ensure_section(data, tokens)
+        resolved = []
+        node = data
+        for token in tokens:
+            if isinstance(token, RecordKey):
+                if not isinstance(node, list):
+                    raise KeyError(f'{format_path(resolved)} 不是列表，不能使用选择器 {token}')
+                token = self.position(tuple(resolved), node, token)
+            resolved.append(token)
+            node = _child(node, token)
+        return resolved
+
+    def get(self, data, path):
+        """
+        按路径读取值，路径中可以使用选择器
+        """
+        node = data
+        for token in self.resolve(data, parse_path(path)):
+            node = _child(node, token)
+        return node
+
+    def natural_path(self, data, tokens):
+        """
+        将路径中带键列表的下标替换为选择器，例如 savedData[0] -> savedData{Name=Bone Necklace}
+
+        参数:
+            data: 文档
+            tokens: 只含键和下标的路径段
+
+        返回:
+            str: 界面路径；路径无效时按原样格式化
+        """
+        natural = []
+        node = data
+        try:
+            self._ensure_section(data, tokens)
+            for depth, token in enumerate(tokens):
+                child = _child(node, token)
+                if isinstance(token, int) and isinstance(node, list):
+                    entry = self._entry(tuple(tokens[:depth]), node)
+                    if entry is not None:
+                        key = entry.key_of(child)
+                        if key is not None and entry.positions.get(key) == token:
+                            natural.append(RecordKey(zip(entry.fields, key)))
+                            node = child
+                            continue
+                natural.append(token)
+                node = child
+        except (KeyError, IndexError, TypeError):
+            return format_path(tokens)
+        return format_path(natural)
+
+    def touch(self, tokens, op='replace'):
+        """
+        文档在tokens处被修改后调用，增量更新受影响的索引
+
+        参数:
+            tokens: 被修改的位置（只含键和下标的路径段）
+            op: 'add'、'remove'或'replace'
+        """
+        tokens = tuple(tokens)
+        for path in list(self._lists):
+            entry = self._lists[path]
+            depth = len(path)
+            if tokens[:depth] != path:
+                # 列表本身或它的上级被替换/删除，下次查找时重新检测
+                if path[:len(tokens)] == tokens:
+                    del self._lists[path]
+                continue
+            if len(tokens) == depth:
+                del self._lists[path]
+            elif len(tokens) == depth + 1:
+                i = tokens[depth]
+                if op == 'add' and isinstance(i, int) and i == len(entry.records) - 1:
+                    # 追加到末尾的记录
+                    key = entry.key_of(entry.records[i])
+                    if key is not None and None not in key and key not in entry.positions:
+                        entry.positions[key] = i
+                        continue
+                if op == 'replace' and isinstance(i, int) and i < len(entry.records):
+                    self._rekey(entry, i)
+                    continue
+                del self._lists[path]
+            elif len(tokens) == depth + 2 and tokens[depth + 1] in entry.fields:
+                # 记录的键字段被修改
+                self._rekey(entry, tokens[depth])
+
+    def _rekey(self, entry, i):
+        for key, position in list(entry.positions.items()):
+            if position == i:
+                del entry.positions[key]
+        key = entry.key_of(entry.records[i])
+        if key is not None:
+            entry.positions.setdefault(key, i)
+
+    def add_record(self, data, list_path, record):
+        """
+        向带键的记录列表末尾追加记录，并更新索引
+
+        参数:
+            data: 文档
+            list_path: 列表的路径（可以包含选择器）
+            record: 新记录
+
+        返回:
+            list: 新记录的路径段
+
+        异常:
+            ValueError: 列表中已有相同键的记录
+        """
+        tokens = self.resolve(data, parse_path(list_path))
+        records = data
+        for token in tokens:
+            records = records[token]
+        entry = self._entry(tuple(tokens), records)
+        if entry is not None and entry.key_of(record) in entry.positions:
+            raise ValueError(f'已存在相同键的记录: {entry.key_of(record)}')
+        records.append(record)
+        tokens.append(len(records) - 1)
+        self.touch(tokens, 'add')
+        return tokens
@@ -0,0 +1,743 @@
+import os
+import mmap
+import json
+import stat
+import codecs
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from .crypto_backends import get_backend
+from . import json_engine
+from .lazy_document import LazyDocument, dumps_document
+
+@contextmanager
+def atomic_write(file_path, mode='wb', **kwargs):
+    """
+    先写入同目录下的临时文件，fsync后再用os.replace替换目标文件，
+    写入中途出错或崩溃时原文件保持不变
+
+    参数:
+        file_path: 目标文件路径
+        mode: 打开临时文件的模式
+        **kwargs: 传给open的其他参数（如encoding）
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(file_path)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # 保留原文件的权限；新文件使用与open()相同的默认权限，而不是mkstemp的0600
+        if os.path.exists(file_path):
+            os.chmod(temp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+# 增量JSON编码时，连续的简单项每批最多合并的数量
+_JSON_BATCH = 256
+
+def _is_flat(value):
+    """
+    判断值是否不包含嵌套容器（简单值或只含简单值的容器）
+    """
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, list):
+        return True
+    for item in value:
+        if isinstance(item, (dict, list)):
+            return False
+    return True
+
+def iter_json(data):
+    """
+    增量生成JSON文本片段，拼接结果与json.dumps(data, ensure_ascii=False)完全一致
+
+    连续的扁平项（简单值或只含简单值的容器）按批交给C实现的json.dumps，
+    含有嵌套容器的项逐层展开，因此每个片段的大小只与一批扁平项有关。
+
+    延迟解析的文档（LazyDocument）未改动的顶层成员直接输出原始文本。
+
+    参数:
+        data: 要序列化的数据
+
+    返回:
+        generator: JSON文本片段
+    """
+    if isinstance(data, LazyDocument):
+        yield from data.json_pieces()
+        return
+    if _is_flat(data) or (isinstance(data, dict) and not all(isinstance(key, str) for key in data)):
+        yield json.dumps(data, ensure_ascii=False)
+        return
+
+    is_dict = isinstance(data, dict)
+    separator = '{' if is_dict else '['
+    batch = {} if is_dict else []
+    for entry in (data.items() if is_dict else data):
+        value = entry[1] if is_dict else entry
+        if _is_flat(value):
+            if is_dict:
+                batch[entry[0]] = value
+            else:
+                batch.append(value)
+            if len(batch) < _JSON_BATCH:
+                continue
+        if batch:
+            # 去掉批量序列化结果两侧的括号，得到 "a, b, c" 形式的片段
+            yield separator + json.dumps(batch, ensure_ascii=False)[1:-1]
+            separator = ', '
+            batch = {} if is_dict else []
+        if not _is_flat(value):
+            yield separator + (json.dumps(entry[0], ensure_ascii=False) + ': ' if is_dict else '')
+            yield from iter_json(value)
+            separator = ', '
+    if batch:
+        yield separator + json.dumps(batch, ensure_ascii=False)[1:-1]
+    yield '}' if is_dict else ']'
+
+def _move(f, start, end, target, chunk_size=1 << 20):
+    """
+    将文件中[start, end)的内容移动到target处，并截断到移动后的末尾
+    """
+    size = end - start
+    # 向后移动时从末尾开始复制，向前移动时从开头开始复制，避免覆盖尚未复制的内容
+    offsets = range(0, size, chunk_size)
+    for offset in (reversed(offsets) if target > start else offsets):
+        length = min(chunk_size, size - offset)
+        f.seek(start + offset)
+        block = f.read(length)
+        f.seek(target + offset)
+        f.write(block)
+    f.truncate(target + size)
+
+class SaveCodec:
+    """
+    存档编解码器
+
+    .dat 存档的结构为: C#固定头部 + 7位长度前缀 + Base64(AES-ECB(JSON)) + 结束字节11。
+    解码时直接在文件的 memoryview/mmap 上分块进行 Base64 解码和解密，
+    明文写入预先分配好的 bytearray，原地移除填充后直接交给 JSON 解析，
+    避免整份数据被复制多次。
+
+    ECB模式下每个块相互独立，超过并行阈值的数据会按48字节对齐分块，
+    交给线程池同时进行Base64编解码和AES运算，各块直接写入输出缓冲区的对应位置。
+
+    传入cache_key时会记住该文件最近一次的明文/密文对，再次加密时
+    第一个不同字节所在的48字节边界之前的密文可以直接复用。
+    """
+    # AES块大小
+    BLOCK_SIZE = 16
+
+    # 固定密钥
+    KEY = 'UKu52ePUBwetZ9wNX88o54dnfKRu0T1l'.encode('utf-8')[:32]
+
+    # C# fixed header
+    HEADER = bytes([0, 1, 0, 0, 0, 255, 255, 255, 255, 1, 0, 0, 0, 0, 0, 0, 0, 6, 1, 0, 0, 0])
+
+    # fixed ending byte (MessageEnd)
+    FOOTER = 11
+
+    # 每次解码的Base64字符数，必须是64的倍数（64字符 = 48字节 = 3个AES块）
+    CHUNK_CHARS = 64 * 1024
+
+    # 每次加密的明文字节数，与CHUNK_CHARS对应
+    CHUNK_BYTES = CHUNK_CHARS // 4 * 3
+
+    # 流式写入时为长度前缀预留的字节数: Base64负载在16KB到2MB之间时为3字节（常见存档约1.5MB）
+    PREFIX_RESERVE = 3
+
+    # 存档列表所需的playerData字段
+    METADATA_KEYS = ('version', 'date', 'profileID', 'playTime', 'permadeathMode')
+
+    # 读取元数据时第一次解密的Base64字符数，不够时加倍
+    PEEK_CHARS = 1024
+
+    # 默认的多线程阈值（Base64字符数或明文字节数）
+    PARALLEL_THRESHOLD = 4 * 1024 * 1024
+
+    def __init__(self, key=KEY, max_workers=None, parallel_threshold=PARALLEL_THRESHOLD, backend=None):
+        """
+        初始化编解码器，密钥和AES对象只创建一次，之后可反复使用
+
+        参数:
+            key: AES密钥
+            max_workers: 并行处理的最大线程数，默认为CPU核心数（最多8个）
+            parallel_threshold: 超过该大小时启用多线程，None表示始终单线程
+            backend: 使用的CryptoBackend，默认为自测选出的最快后端
+        """
+        self.backend = backend or get_backend()
+        self._cipher = self.backend.new_cipher(key)
+        self._b64decode = self.backend.b64decode
+        self._b64encode = self.backend.b64encode
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.parallel_threshold = parallel_threshold
+        self._executor = None
+        self._executor_workers = 0
+        # 加载和保存可能在不同的后台线程中同时使用同一个编解码器
+        self._executor_lock = threading.Lock()
+
+        # 增量加密: cache_key -> (明文, Base64密文)
+        self._snapshots = {}
+        # 延迟建立的快照: cache_key -> 文件路径，第一次需要时才解密
+        self._deferred_snapshots = {}
+        # 最近一次加密复用的明文字节数，以及累计复用字节数
+        self.last_reused_bytes = 0
+        self.total_reused_bytes = 0
+
+    def _map_chunks(self, func, starts, size):
+        """
+        按数据大小选择串行或线程池方式处理所有分块
+
+        参数:
+            func: 处理单个分块的函数，参数为分块起始偏移
+            starts: 各分块的起始偏移
+            size: 数据总大小，用于和并行阈值比较
+        """
+        if (self.parallel_threshold is None or size < self.parallel_threshold
+                or self.max_workers <= 1 or len(starts) <= 1):
+            for start in starts:
+                func(start)
+            return
+
+        with self._executor_lock:
+            if self._executor is None or self._executor_workers != self.max_workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='SaveCodec')
+                self._executor_workers = self.max_workers
+            executor = self._executor
+
+        # 等待所有分块完成，并传播其中的异常
+        for _ in executor.map(func, starts):
+            pass
+
+    def _chunk_chars(self, total_chars):
+        """
+        计算每个分块的Base64字符数，多线程时保证每个线程至少分到几块
+        """
+        if self.parallel_threshold is None or total_chars < self.parallel_threshold:
+            return self.CHUNK_CHARS
+        per_worker = -(-total_chars // (self.max_workers * 4))
+        # 向上取整到64字符（48字节）的整数倍
+        return max(self.CHUNK_CHARS, -(-per_worker // 64) * 64)
+
+    @staticmethod
+    def _common_prefix(a, b):
+        """
+        返回两段字节数据相同前缀的长度
+        """
+        a = memoryview(a)
+        b = memoryview(b)
+        size = min(len(a), len(b))
+
+        # 先按大块比较，定位到第一个不同的块后再二分查找
+        low = 0
+        for start in range(0, size, SaveCodec.CHUNK_BYTES):
+            end = min(start + SaveCodec.CHUNK_BYTES, size)
+            if a[start:end] != b[start:end]:
+                high = end
+                low = start
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if a[low:middle] == b[low:middle]:
+                        low = middle
+                    else:
+                        high = middle
+                return low if a[low] != b[low] else high
+            low = end
+
+        return size
+
+    @staticmethod
+    def length_prefix(length):
+        """
+        生成BinaryFormatter LengthPrefixedString的7位编码长度前缀
+
+        参数:
+            length: 字符串字节长度
+
+        返回:
+            bytes: 长度前缀
+        """
+        result = bytearray()
+
+        # 7-bit encoded int
+        while True:
+            value = length & 0x7F
+            length >>= 7
+            if length > 0:
+                # Set the high bit
+                value |= 0x80
+            result.append(value)
+            if length == 0:
+                break
+
+        return bytes(result)
+
+    def payload_bounds(self, data, total_size=None):
+        """
+        解析C#头部和LengthPrefixedString，得到Base64负载的精确位置
+
+        参数:
+            data: 原始存档数据（bytes/memoryview/mmap）
+            total_size: 文件总大小，只传入文件开头部分时使用
+
+        返回:
+            (start, end): 负载的起止偏移
+        """
+        if total_size is None:
+            total_size = len(data)
+
+        header_size = len(self.HEADER)
+        if len(data) <= header_size or data[:header_size] != self.HEADER:
+            raise ValueError('存档头部无效')
+
+        # 读取7位编码的长度，最多5个字节
+        length = 0
+        offset = header_size
+        for shift in range(0, 35, 7):
+            if offset >= len(data):
+                raise ValueError('长度前缀不完整')
+            byte = data[offset]
+            offset += 1
+            length |= (byte & 0x7F) << shift
+            if (byte & 0x80) == 0:
+                break
+        else:
+            raise ValueError('长度前缀过长')
+
+        end = offset + length
+        if end + 1 != total_size:
+            raise ValueError(f'长度前缀({length})与负载长度({total_size - offset - 1})不一致')
+        if end < len(data) and data[end] != self.FOOTER:
+            raise ValueError('存档结束字节无效')
+
+        return offset, end
+
+    def decrypt_payload(self, payload):
+        """
+        将Base64负载解密到预分配的缓冲区中
+
+        参数:
+            payload: Base64编码的密文（bytes-like，推荐memoryview）
+
+        返回:
+            bytearray: 去除PKCS7填充后的明文
+        """
+        payload = memoryview(payload)
+        total_chars = len(payload)
+        if total_chars == 0 or total_chars % 4:
+            raise ValueError('Base64数据长度无效')
+
+        # 根据Base64长度和末尾的'='计算密文长度，一次性分配输出缓冲区
+        padding_chars = 0
+        if payload[-1] == ord('='):
+            padding_chars = 2 if payload[-2] == ord('=') else 1
+        size = total_chars // 4 * 3 - padding_chars
+        if size % self.BLOCK_SIZE:
+            raise ValueError('密文长度不是AES块大小的整数倍')
+
+        plaintext = bytearray(size)
+        chunk_chars = self._chunk_chars(total_chars)
+        with memoryview(plaintext) as output:
+            def decrypt_chunk(start):
+                # 分块Base64解码，每块解码结果都是48字节的整数倍
+                block = self._b64decode(payload[start:start + chunk_chars])
+                position = start // 4 * 3
+                self._cipher.decrypt(block, output=output[position:position + len(block)])
+
+            self._map_chunks(decrypt_chunk, range(0, total_chars, chunk_chars), total_chars)
+
+        # 原地移除PKCS7填充
+        padding_length = plaintext[-1]
+        if not 0 < padding_length <= self.BLOCK_SIZE:
+            raise ValueError('Invalid padding')
+        if plaintext[-padding_length:] != bytes([padding_length]) * padding_length:
+            raise ValueError('Invalid padding')
+        del plaintext[-padding_length:]
+
+        return plaintext
+
+    def decrypt_blocks(self, encoded):
+        """
+        解密一段Base64密文，不处理填充，用于只解密部分块的场景
+
+        参数:
+            encoded: 64字符对齐的Base64数据（bytes-like）
+
+        返回:
+            bytes: 对应的明文块
+        """
+        return self._cipher.decrypt(self._b64decode(encoded))
+
+    def decrypt(self, data):
+        """
+        解密完整的.dat存档数据
+
+        参数:
+            data: 原始存档数据（bytes/memoryview/mmap）
+
+        返回:
+            bytearray: UTF-8编码的JSON明文
+        """
+        with memoryview(data) as view:
+            start, end = self.payload_bounds(view)
+            return self.decrypt_payload(view[start:end])
+
+    def decode(self, data):
+        """
+        解码.dat存档数据为JSON对象
+
+        参数:
+            data: 原始存档数据（bytes/memoryview/mmap）
+
+        返回:
+            dict: 解析后的存档数据
+        """
+        return json_engine.loads(self.decrypt(data))
+
+    def decrypt_file(self, file_path, cache_key=None):
+        """
+        通过mmap读取并解密.dat存档文件
+
+        参数:
+            file_path: 存档文件路径
+            cache_key: 如果提供，记住明文/密文对以便之后增量加密
+
+        返回:
+            bytearray: 解密后的明文
+        """
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError('存档文件为空')
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    start, end = self.payload_bounds(view)
+                    plaintext = self.decrypt_payload(view[start:end])
+                    if cache_key is not None:
+                        self._snapshots[cache_key] = (plaintext, bytes(view[start:end]))
+                        self._deferred_snapshots.pop(cache_key, None)
+
+        return plaintext
+
+    def decode_file(self, file_path, cache_key=None):
+        """
+        通过mmap读取并解码.dat存档文件
+
+        解密阶段（decrypt_file）的内存峰值约为明文的1.25倍；解析阶段还要加上解析出的文档本身（约3.7倍）
+        和解析时的临时占用（orjson约1倍，标准库约2倍），可以用 python -m modules.codec memory-check 检查
+
+        参数:
+            file_path: 存档文件路径
+            cache_key: 如果提供，记住明文/密文对以便之后增量加密
+
+        返回:
+            dict: 解析后的存档数据
+        """
+        return json_engine.loads(self.decrypt_file(file_path, cache_key))
+
+    def peek_metadata(self, file_path, keys=METADATA_KEYS):
+        """
+        只解密存档开头的若干AES块，读取playerData中的元数据字段
+
+        参数:
+            file_path: 存档文件路径
+            keys: 要读取的playerData字段
+
+        返回:
+            dict: 找到的字段及其值
+        """
+        with open(file_path, 'rb') as f:
+            total_size = os.fstat(f.fileno()).st_size
+            head = f.read(len(self.HEADER) + 5)
+            start, end = self.payload_bounds(head, total_size)
+            f.seek(start)
+
+            encoded = bytearray()
+            plaintext = bytearray()
+            chars = self.PEEK_CHARS
+            while True:
+                # 每次补读到chars个字符，始终保持64字符（48字节）对齐
+                want = min(chars, end - start)
+                encoded += f.read(want - len(encoded))
+                if want == end - start:
+                    # 已读到负载末尾，按完整数据处理（含去除填充）
+                    plaintext = self.decrypt_payload(encoded)
+                else:
+                    plaintext += self.decrypt_blocks(memoryview(encoded)[len(plaintext) // 3 * 4:])
+
+                complete = want == end - start
+                found = self._scan_metadata(plaintext, keys, complete)
+                if found is not None:
+                    return found
+                chars *= 2
+
+    @staticmethod
+    def _scan_metadata(plaintext, keys, complete):
+        """
+        从明文前缀中解析playerData的字段
+
+        参数:
+            plaintext: 明文前缀
+            keys: 要读取的字段
+            complete: 明文是否已完整
+
+        返回:
+            dict: 找到的字段；前缀不足以确定结果时返回None
+        """
+        # 末尾可能截断了多字节字符，使用增量解码器保留不完整的部分
+        text = codecs.getincrementaldecoder('utf-8')().decode(bytes(plaintext), final=complete)
+        decoder = json.JSONDecoder()
+        skip = json.decoder.WHITESPACE.match
+        wanted = set(keys)
+        found = {}
+
+        try:
+            index = skip(text, 0).end()
+            if text[index] != '{':
+                raise ValueError('存档内容不是JSON对象')
+            index = skip(text, index + 1).end()
+            key, index = json.decoder.scanstring(text, index + 1)
+            if key != 'playerData':
+                raise ValueError('存档第一个字段不是playerData')
+            index = skip(text, index).end()
+            index = skip(text, index + 1).end()
+            if text[index] != '{':
+                raise ValueError('playerData不是JSON对象')
+            index = skip(text, index + 1).end()
+
+            while wanted and text[index] != '}':
+                key, index = json.decoder.scanstring(text, index + 1)
+                index = skip(text, index).end()
+                value, index = decoder.raw_decode(text, skip(text, index + 1).end())
+                # 数字可能被截断，值后面必须还有分隔符才算完整
+                if index >= len(text):
+                    raise IndexError
+                if key in wanted:
+                    found[key] = value
+                    wanted.discard(key)
+                index = skip(text, index).end()
+                if text[index] == ',':
+                    index = skip(text, index + 1).end()
+        except (IndexError, json.JSONDecodeError):
+            if not complete:
+                return None
+            raise ValueError('存档内容不完整')
+
+        return found
+
+    def forget(self, cache_key):
+        """
+        丢弃指定文件的明文/密文快照
+
+        参数:
+            cache_key: 快照键
+        """
+        self._snapshots.pop(cache_key, None)
+        self._deferred_snapshots.pop(cache_key, None)
+
+    def remember_file(self, file_path, cache_key):
+        """
+        登记一个延迟建立的快照: 文档没有经过解密得到（例如来自缓存）时，
+        等第一次增量加密需要时再解密文件得到明文/密文对
+
+        参数:
+            file_path: 存档文件路径
+            cache_key: 快照键
+        """
+        self._snapshots.pop(cache_key, None)
+        self._deferred_snapshots[cache_key] = file_path
+
+    def _snapshot(self, cache_key):
+        """
+        获取快照，必要时解密延迟登记的文件；文件已不可读时返回None
+        """
+        if cache_key is None:
+            return None
+        file_path = self._deferred_snapshots.pop(cache_key, None)
+        if file_path is not None:
+            try:
+                self.decrypt_file(file_path, cache_key)
+            except (OSError, ValueError):
+                pass
+        return self._snapshots.get(cache_key)
+
+    def encrypt_payload(self, plaintext, previous=None):
+        """
+        加密明文并进行Base64编码
+
+        参数:
+            plaintext: UTF-8编码的明文（bytes-like）
+            previous: 上一次的(明文, Base64密文)，相同的48字节对齐前缀直接复用其密文
+
+        返回:
+            bytearray: Base64编码的密文
+        """
+        plaintext = memoryview(plaintext)
+        size = len(plaintext)
+        padding_length = self.BLOCK_SIZE - (size % self.BLOCK_SIZE)
+        padded_size = size + padding_length
+
+        # 一次性分配Base64输出缓冲区
+        encoded = bytearray((padded_size + 2) // 3 * 4)
+        chunk_bytes = self._chunk_chars(padded_size // 3 * 4) // 4 * 3
+        with memoryview(encoded) as output:
+            # ECB + Base64下，48字节对齐的相同明文前缀对应完全相同的输出
+            reused = 0
+            if previous is not None:
+                reused = self._common_prefix(plaintext, previous[0]) // 48 * 48
+                output[:reused // 3 * 4] = memoryview(previous[1])[:reused // 3 * 4]
+
+            def encrypt_chunk(start):
+                block = plaintext[start:start + chunk_bytes]
+                if start + chunk_bytes >= padded_size:
+                    # 最后一块追加PKCS7填充
+                    block = bytes(block) + bytes([padding_length] * padding_length)
+                chunk = self._b64encode(self._cipher.encrypt(block))
+                position = start // 3 * 4
+                output[position:position + len(chunk)] = chunk
+
+            self._map_chunks(encrypt_chunk, range(reused, padded_size, chunk_bytes), padded_size - reused)
+
+        self.last_reused_bytes = reused
+        self.total_reused_bytes += reused
+        return encoded
+
+    def wrap(self, payload):
+        """
+        为Base64负载添加C#固定头部、长度前缀和结束字节
+
+        参数:
+            payload: Base64编码的密文
+
+        返回:
+            bytearray: 完整的.dat存档数据
+        """
+        prefix = self.length_prefix(len(payload))
+        result = bytearray(len(self.HEADER) + len(prefix) + len(payload) + 1)
+        with memoryview(result) as view:
+            offset = len(self.HEADER)
+            view[:offset] = self.HEADER
+            view[offset:offset + len(prefix)] = prefix
+            offset += len(prefix)
+            view[offset:offset + len(payload)] = payload
+        result[-1] = self.FOOTER
+
+        return result
+
+    def encrypt(self, plaintext, cache_key=None):
+        """
+        加密JSON明文为完整的.dat存档数据
+
+        参数:
+            plaintext: JSON字符串或UTF-8字节
+            cache_key: 如果提供，复用并更新该文件上一次的明文/密文对
+
+        返回:
+            bytearray: 完整的.dat存档数据
+        """
+        if isinstance(plaintext, str):
+            plaintext = plaintext.encode('utf-8')
+
+        payload = self.encrypt_payload(plaintext, self._snapshot(cache_key))
+        if cache_key is not None:
+            self._snapshots[cache_key] = (plaintext, payload)
+
+        return self.wrap(payload)
+
+    def write_file(self, file_path, data, cache_key=None, plaintext_size=None):
+        """
+        写入.dat存档，始终先写同目录临时文件，fsync后用os.replace原子替换
+
+        如果cache_key对应的明文/密文快照存在，则整体序列化后增量加密；
+        否则流式写入: 增量JSON编码 -> 分块加密 -> Base64 -> 临时文件，
+        内存占用只有几个分块大小，文档只序列化一遍，长度前缀在写完负载后填入。
+
+        参数:
+            file_path: 目标文件路径
+            data: 存档数据
+            cache_key: 增量加密使用的快照键
+            plaintext_size: 已知的JSON明文字节数，用于预留长度前缀并检查写入的大小；可以为None
+
+        返回:
+            int: 写入的明文字节数
+        """
+        if self._snapshot(cache_key) is not None:
+            encrypted_data = self.encode(data, cache_key)
+            with atomic_write(file_path) as f:
+                f.write(encrypted_data)
+            return len(self._snapshots[cache_key][0])
+
+        self.last_reused_bytes = 0
+        # 长度前缀是变长的: 先预留位置写入负载，写完后再填入；预留的长度不对时移动已写入的负载
+        reserved = self.PREFIX_RESERVE
+        if plaintext_size is not None:
+            reserved = len(self.length_prefix(self._payload_size(plaintext_size)))
+        body_start = len(self.HEADER) + reserved
+
+        with atomic_write(file_path, 'w+b') as f:
+            f.write(self.HEADER)
+            f.seek(body_start)
+
+            pending = bytearray()
+            written = 0
+            for piece in iter_json(data):
+                pending += piece.encode('utf-8')
+                if len(pending) >= self.CHUNK_BYTES:
+                    # 只加密48字节对齐的部分，剩余部分留到下一轮
+                    size = len(pending) // 48 * 48
+                    with memoryview(pending) as view:
+                        f.write(self._b64encode(self._cipher.encrypt(view[:size])))
+                    del pending[:size]
+                    written += size
+
+            written += len(pending)
+            if plaintext_size is not None and written != plaintext_size:
+                raise ValueError(f'明文大小({written})与预计算的长度({plaintext_size})不一致')
+
+            # 最后一块追加PKCS7填充
+            padding_length = self.BLOCK_SIZE - (written % self.BLOCK_SIZE)
+            pending += bytes([padding_length] * padding_length)
+            f.write(self._b64encode(self._cipher.encrypt(pending)))
+            f.write(bytes([self.FOOTER]))
+
+            prefix = self.length_prefix(self._payload_size(written))
+            if len(prefix) != reserved:
+                _move(f, body_start, f.tell(), len(self.HEADER) + len(prefix))
+            f.seek(len(self.HEADER))
+            f.write(prefix)
+
+        return written
+
+    def _payload_size(self, plaintext_size):
+        """
+        明文加上PKCS7填充、加密并Base64编码后的字节数
+        """
+        padding_length = self.BLOCK_SIZE - (plaintext_size % self.BLOCK_SIZE)
+        return (plaintext_size + padding_length + 2) // 3 * 4
+
+    def encode(self, data, cache_key=None):
+        """
+        编码JSON对象为.dat存档数据
+
+        参数:
+            data: 存档数据
+            cache_key: 如果提供，复用并更新该文件上一次的明文/密文对
+
+        返回:
+            bytearray: 完整的.dat存档数据
+        """
+        return self.encrypt(dumps_document(data), cache_key)
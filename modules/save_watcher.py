@@ -0,0 +1,80 @@
+import os
+from .doc_cache import DocumentCache
+
+class SaveWatcher:
+    """
+    轮询检测打开的存档是否被外部程序（例如游戏本身）改写
+
+    先比较(大小, mtime_ns)，变化时才计算内容哈希，只有内容真正不同才算修改。
+    按路径而不是按文件句柄检测，游戏通过临时文件+重命名的方式写入时同样能发现。
+    """
+    def __init__(self):
+        self.file_path = None
+        # 编辑器中的文档对应的磁盘版本: (绝对路径, 大小, mtime_ns, SHA-256)
+        self._acknowledged = None
+        # 已经报告过的版本，避免同一次修改被重复报告
+        self._reported = None
+        self._last_stat = None
+
+    def watch(self, file_path, signature):
+        """
+        开始监视文件
+
+        参数:
+            file_path: 存档文件路径
+            signature: 编辑器中的文档对应的文件签名（DocumentCache.signature的返回值）
+        """
+        self.file_path = os.path.abspath(file_path)
+        self.acknowledge(signature)
+
+    def acknowledge(self, signature):
+        """
+        记录编辑器中的文档已经与该版本的磁盘文件一致（加载、保存或合并外部修改之后调用）
+        """
+        self._acknowledged = signature
+        self._reported = signature
+        self._last_stat = signature[1:3] if signature else None
+
+    def stop(self):
+        """
+        停止监视
+        """
+        self.file_path = None
+        self._acknowledged = self._reported = self._last_stat = None
+
+    def _current(self):
+        """
+        获取磁盘文件的当前签名，大小和修改时间都没变时返回None表示无需计算哈希
+        """
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) == self._last_stat:
+            return None
+        signature = DocumentCache.signature(self.file_path)
+        self._last_stat = signature[1:3]
+        return signature
+
+    def check(self):
+        """
+        检查文件是否有尚未报告的修改
+
+        返回:
+            tuple: 新版本的文件签名；没有新的修改时返回None
+        """
+        if self.file_path is None:
+            return None
+        signature = self._current()
+        if signature is None or signature[3] in (self._acknowledged[3], self._reported[3]):
+            return None
+        self._reported = signature
+        return signature
+
+    def is_stale(self):
+        """
+        磁盘上的文件内容是否与编辑器中的文档对应的版本不同（无论是否已经报告过）
+        """
+        if self.file_path is None or not os.path.exists(self.file_path):
+            return False
+        return DocumentCache.signature(self.file_path)[3] != self._acknowledged[3]
@@ -0,0 +1,178 @@
+from . import json_patch
+from .lazy_document import LazyDocument
+
+# 记录中带SceneName字段的列表: 名称 -> 路径
+SCENE_RECORDS = {
+    'persistentBools': ('sceneData', 'persistentBools', 'serializedList'),
+    'persistentInts': ('sceneData', 'persistentInts', 'serializedList'),
+    'geoRocks': ('sceneData', 'geoRocks', 'serializedList'),
+    'StoryEvents': ('playerData', 'StoryEvents'),
+    'SteelQuestSpots': ('playerData', 'SteelQuestSpots'),
+}
+
+# 场景名列表（场景名出现在列表中即为True）: 名称 -> 路径
+SCENE_FLAGS = {
+    'scenesVisited': ('playerData', 'scenesVisited'),
+    'scenesMapped': ('playerData', 'scenesMapped'),
+}
+
+def _lookup(data, path):
+    """
+    只读地按路径取值，路径不存在时返回None
+    """
+    node = data
+    for token in path:
+        if isinstance(node, LazyDocument):
+            node = node.peek(token) if token in node else None
+        elif isinstance(node, dict):
+            node = node.get(token)
+        else:
+            return None
+    return node
+
+def _pointer(path):
+    return ''.join(f'/{json_patch.escape_token(token)}' for token in path)
+
+class SceneIndex:
+    """
+    场景名 -> 引用该场景的所有记录和列表位置
+
+    加载时遍历一次scenesVisited、scenesMapped、sceneData的三个记录列表以及StoryEvents等，
+    之后查看一个场景的全部数据只需一次字典查找。
+    批量修改通过toggle_patch生成一个JSON补丁，由apply一次应用到文档并更新索引。
+    """
+    def __init__(self):
+        # 场景名 -> {集合名称: [下标]}
+        self.scenes = {}
+
+    def build(self, data):
+        """
+        遍历文档建立索引
+
+        参数:
+            data: 文档
+        """
+        self.scenes = {}
+        for name in list(SCENE_RECORDS) + list(SCENE_FLAGS):
+            self._index_collection(data, name)
+
+    def _index_collection(self, data, name):
+        is_flag = name in SCENE_FLAGS
+        items = _lookup(data, SCENE_FLAGS[name] if is_flag else SCENE_RECORDS[name])
+        if not isinstance(items, list):
+            return
+        for i, item in enumerate(items):
+            scene = item if is_flag else (item.get('SceneName') if type(item) is dict else None)
+            if type(scene) is str:
+                self.scenes.setdefault(scene, {}).setdefault(name, []).append(i)
+
+    def reindex(self, data, name):
+        """
+        重新索引一个集合（增删元素或修改SceneName之后调用）
+        """
+        for scene in list(self.scenes):
+            collections = self.scenes[scene]
+            collections.pop(name, None)
+            if not collections:
+                del self.scenes[scene]
+        self._index_collection(data, name)
+
+    def touch(self, data, tokens):
+        """
+        文档在tokens处被修改后调用，修改位于某个集合内时重新索引该集合
+        （只修改记录的Value等字段不影响索引，但无法廉价地区分，一律重建；每个集合最多几千项）
+        """
+        tokens = tuple(tokens)
+        for name, path in list(SCENE_RECORDS.items()) + list(SCENE_FLAGS.items()):
+            if tokens[:len(path)] == path or path[:len(tokens)] == tokens:
+                if len(tokens) == len(path) + 2 and tokens[-1] != 'SceneName':
+                    continue
+                self.reindex(data, name)
+
+    def scene_names(self, text=''):
+        """
+        返回包含text（不区分大小写）的场景名，按名称排序
+        """
+        text = text.lower()
+        return sorted(scene for scene in self.scenes if text in scene.lower())
+
+    def __contains__(self, scene):
+        return scene in self.scenes
+
+    def view(self, data, scene):
+        """
+        读取一个场景的全部数据
+
+        参数:
+            data: 文档
+            scene: 场景名
+
+        返回:
+            dict: 集合名称 -> [(路径段列表, 值)]；记录列表的值是记录dict，场景名列表的值是True
+        """
+        result = {}
+        for name, positions in self.scenes.get(scene, {}).items():
+            path = SCENE_FLAGS.get(name) or SCENE_RECORDS[name]
+            items = _lookup(data, path)
+            result[name] = [(list(path) + [i], True if name in SCENE_FLAGS else items[i]) for i in positions]
+        return result
+
+    def flag(self, scene, name):
+        """
+        场景是否出现在scenesVisited/scenesMapped中
+        """
+        return name in self.scenes.get(scene, {})
+
+    def toggle_patch(self, data, scene, value, collections=('persistentBools', 'scenesVisited', 'scenesMapped')):
+        """
+        生成把场景的布尔记录和场景名标记全部设为value的补丁
+
+        参数:
+            data: 文档
+            scene: 场景名
+            value: True或False
+            collections: 要修改的集合；记录列表只修改布尔类型的Value
+
+        返回:
+            list: JSON补丁，没有需要修改的内容时为空
+        """
+        patch = []
+        entries = self.scenes.get(scene, {})
+        for name in collections:
+            if name in SCENE_FLAGS:
+                path = SCENE_FLAGS[name]
+                items = _lookup(data, path)
+                if value and name not in entries and isinstance(items, list):
+                    patch.append({'op': 'add', 'path': f'{_pointer(path)}/{len(items)}', 'value': scene})
+                elif not value:
+                    # 从后往前删除，保证前面的下标不变
+                    for i in sorted(entries.get(name, ()), reverse=True):
+                        patch.append({'op': 'remove', 'path': f'{_pointer(path)}/{i}'})
+            else:
+                path = SCENE_RECORDS[name]
+                records = _lookup(data, path)
+                for i in entries.get(name, ()):
+                    current = records[i].get('Value')
+                    if type(current) is bool and current != value:
+                        patch.append({'op': 'replace', 'path': f'{_pointer(path)}/{i}/Value', 'value': bool(value)})
+        return patch
+
+    def apply(self, data, patch):
+        """
+        将补丁一次应用到文档，并更新增删过元素的集合的索引
+
+        返回:
+            应用补丁后的文档
+        """
+        data = json_patch.apply(data, patch)
+        structural = set()
+        for op in patch:
+            if op['op'] == 'replace':
+                continue
+            tokens = tuple(json_patch.split_pointer(op['path']))
+            for name, path in list(SCENE_RECORDS.items()) + list(SCENE_FLAGS.items()):
+                if tokens[:len(path)] == path:
+                    structural.add(name)
+        for name in structural:
+            self.reindex(data, name)
+        return data
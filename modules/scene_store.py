@@ -0,0 +1,343 @@
+import sys
+import json
+from array import array
+
+# sceneData中结构为 {serializedList: [{SceneName, ID, Value, Mutator}]} 的部分
+SECTIONS = ('persistentBools', 'persistentInts', 'geoRocks')
+
+# 每条记录的键及其顺序（序列化时按此顺序输出）
+FIELDS = ('SceneName', 'ID', 'Value', 'Mutator')
+
+def _int_column(values=()):
+    """
+    创建整数列，超出32位的值自动改用64位
+    """
+    try:
+        return array('i', values)
+    except OverflowError:
+        return array('q', values)
+
+def _column_append(column, value):
+    try:
+        column.append(value)
+    except OverflowError:
+        column = array('q', column)
+        column.append(value)
+    return column
+
+class _StringTable:
+    """
+    驻留字符串表: 每个不同的字符串只保存一次，同时缓存它的JSON编码
+    """
+    __slots__ = ('strings', 'encoded', 'codes')
+
+    def __init__(self):
+        self.strings = []
+        self.encoded = []
+        self.codes = {}
+
+    def code(self, text):
+        code = self.codes.get(text)
+        if code is None:
+            code = self.codes[text] = len(self.strings)
+            self.strings.append(text)
+            self.encoded.append(json.dumps(text, ensure_ascii=False))
+        return code
+
+class SceneRow:
+    """
+    SceneTable中一行的视图，读写直接作用于表的各列
+    """
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def scene_name(self):
+        return self.table.scenes.strings[self.table.scene_codes[self.index]]
+
+    @scene_name.setter
+    def scene_name(self, text):
+        self.table.scene_codes[self.index] = self.table.scenes.code(text)
+
+    @property
+    def id(self):
+        return self.table.ids.strings[self.table.id_codes[self.index]]
+
+    @id.setter
+    def id(self, text):
+        self.table.id_codes[self.index] = self.table.ids.code(text)
+
+    @property
+    def value(self):
+        value = self.table.values[self.index]
+        return bool(value) if self.table.is_bool else value
+
+    @value.setter
+    def value(self, value):
+        self.table.set_value(self.index, value)
+
+    @property
+    def mutator(self):
+        return self.table.mutators[self.index]
+
+    @mutator.setter
+    def mutator(self, value):
+        self.table.set_mutator(self.index, value)
+
+    def as_record(self):
+        """
+        返回与原存档格式相同的记录dict
+        """
+        return {'SceneName': self.scene_name, 'ID': self.id, 'Value': self.value, 'Mutator': self.mutator}
+
+    def __repr__(self):
+        return f'SceneRow({self.scene_name!r}, {self.id!r}, value={self.value!r}, mutator={self.mutator!r})'
+
+class SceneTable:
+    """
+    sceneData中一个记录列表的列式存储
+
+    SceneName和ID保存在驻留字符串表中，各行只记录编号；Value和Mutator分别保存在
+    array('b')（布尔表）或array('i')中。与几千个dict相比内存占用小得多，
+    按场景或ID的批量操作也只需要遍历整数列。
+
+    只接受键顺序为SceneName、ID、Value、Mutator，类型分别为字符串、字符串、
+    布尔值（布尔表）或整数、整数的记录，保证序列化结果与原JSON逐字节一致。
+    """
+    def __init__(self, is_bool):
+        """
+        参数:
+            is_bool: Value列是否为布尔值（persistentBools）
+        """
+        self.is_bool = is_bool
+        self.scenes = _StringTable()
+        self.ids = _StringTable()
+        self.scene_codes = array('I')
+        self.id_codes = array('I')
+        self.values = array('b') if is_bool else _int_column()
+        self.mutators = _int_column()
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        从记录列表构建列式表
+
+        参数:
+            records: [{SceneName, ID, Value, Mutator}, ...]
+
+        返回:
+            SceneTable
+
+        异常:
+            ValueError: 记录的键、顺序或类型不符合要求，无法保证原样序列化
+        """
+        first = records[0] if records else None
+        is_bool = isinstance(first, dict) and type(first.get('Value')) is bool
+        table = cls(is_bool)
+        value_type = bool if is_bool else int
+        for i, record in enumerate(records):
+            if type(record) is not dict or tuple(record) != FIELDS:
+                raise ValueError(f'第{i}条记录的键不是 {", ".join(FIELDS)}')
+            scene_name, record_id, value, mutator = record.values()
+            if (type(scene_name) is not str or type(record_id) is not str
+                    or type(value) is not value_type or type(mutator) is not int):
+                raise ValueError(f'第{i}条记录的值类型不受支持')
+            table.append(scene_name, record_id, value, mutator)
+        return table
+
+    def append(self, scene_name, record_id, value, mutator=0):
+        """
+        追加一行
+
+        返回:
+            SceneRow: 新行的视图
+        """
+        self.scene_codes.append(self.scenes.code(scene_name))
+        self.id_codes.append(self.ids.code(record_id))
+        if self.is_bool:
+            self.values.append(1 if value else 0)
+        else:
+            self.values = _column_append(self.values, value)
+        self.mutators = _column_append(self.mutators, mutator)
+        return SceneRow(self, len(self.scene_codes) - 1)
+
+    def set_value(self, index, value):
+        if self.is_bool:
+            self.values[index] = 1 if value else 0
+        else:
+            try:
+                self.values[index] = value
+            except OverflowError:
+                self.values = array('q', self.values)
+                self.values[index] = value
+
+    def set_mutator(self, index, value):
+        try:
+            self.mutators[index] = value
+        except OverflowError:
+            self.mutators = array('q', self.mutators)
+            self.mutators[index] = value
+
+    def __len__(self):
+        return len(self.scene_codes)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return SceneRow(self, index)
+
+    def __iter__(self):
+        return (SceneRow(self, i) for i in range(len(self)))
+
+    def scene_names(self):
+        """
+        返回表中出现过的所有场景名（按首次出现的顺序）
+        """
+        return list(self.scenes.strings)
+
+    def rows_in_scene(self, scene_name):
+        """
+        返回属于某个场景的所有行号
+        """
+        code = self.scenes.codes.get(scene_name)
+        if code is None:
+            return []
+        return [i for i, c in enumerate(self.scene_codes) if c == code]
+
+    def find(self, scene_name, record_id):
+        """
+        查找指定场景和ID的行号，找不到时返回None
+        """
+        scene = self.scenes.codes.get(scene_name)
+        rid = self.ids.codes.get(record_id)
+        if scene is None or rid is None:
+            return None
+        for i, (s, r) in enumerate(zip(self.scene_codes, self.id_codes)):
+            if s == scene and r == rid:
+                return i
+        return None
+
+    def set_values(self, indices, value):
+        """
+        批量设置Value列
+
+        返回:
+            int: 值实际发生变化的行数
+        """
+        stored = (1 if value else 0) if self.is_bool else value
+        changed = 0
+        for i in indices:
+            if self.values[i] != stored:
+                self.set_value(i, value)
+                changed += 1
+        return changed
+
+    def to_records(self):
+        """
+        还原为记录列表
+        """
+        return [row.as_record() for row in self]
+
+    def dumps(self):
+        """
+        序列化为JSON数组，与json.dumps(self.to_records(), ensure_ascii=False)逐字节一致
+        """
+        scenes = self.scenes.encoded
+        ids = self.ids.encoded
+        values = ('false', 'true') if self.is_bool else None
+        parts = [
+            f'{{"SceneName": {scenes[s]}, "ID": {ids[r]}, "Value": {values[v] if values else v}, "Mutator": {m}}}'
+            for s, r, v, m in zip(self.scene_codes, self.id_codes, self.values, self.mutators)
+        ]
+        return '[' + ', '.join(parts) + ']'
+
+    def write_records(self, records):
+        """
+        将表中的内容写回原来的记录列表，只修改值不同的记录；多出的行追加到列表末尾
+
+        参数:
+            records: 构建本表时使用的记录列表
+
+        返回:
+            list: 被修改或追加的行号
+        """
+        changed = []
+        for i, row in enumerate(self):
+            record = row.as_record()
+            if i >= len(records):
+                records.append(record)
+                changed.append(i)
+            elif records[i] != record or type(records[i]['Value']) is not type(record['Value']):
+                records[i].update(record)
+                changed.append(i)
+        return changed
+
+    def nbytes(self):
+        """
+        估算列和字符串表占用的字节数
+        """
+        total = sum(sys.getsizeof(column) for column in (self.scene_codes, self.id_codes, self.values, self.mutators))
+        for table in (self.scenes, self.ids):
+            total += sys.getsizeof(table.strings) + sys.getsizeof(table.encoded) + sys.getsizeof(table.codes)
+            total += sum(sys.getsizeof(s) for s in table.strings) + sum(sys.getsizeof(s) for s in table.encoded)
+        return total
+
+class SceneStore:
+    """
+    sceneData中各记录列表的列式存储
+    """
+    def __init__(self, tables):
+        """
+        参数:
+            tables: 部分名称（如persistentBools） -> SceneTable
+        """
+        self.tables = tables
+
+    @classmethod
+    def from_scene_data(cls, scene_data, sections=SECTIONS):
+        """
+        从sceneData构建列式存储，不符合记录格式的部分会被跳过
+
+        参数:
+            scene_data: 存档中的sceneData
+            sections: 要转换的部分
+
+        返回:
+            SceneStore
+        """
+        tables = {}
+        for name in sections:
+            section = scene_data.get(name) if isinstance(scene_data, dict) else None
+            records = section.get('serializedList') if isinstance(section, dict) else None
+            if not isinstance(records, list):
+                continue
+            try:
+                tables[name] = SceneTable.from_records(records)
+            except ValueError:
+                continue
+        return cls(tables)
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def __contains__(self, name):
+        return name in self.tables
+
+    def write_back(self, scene_data):
+        """
+        将修改写回sceneData中对应的记录列表
+
+        返回:
+            dict: 部分名称 -> 被修改或追加的行号列表（没有修改的部分不出现）
+        """
+        changes = {}
+        for name, table in self.tables.items():
+            changed = table.write_records(scene_data[name]['serializedList'])
+            if changed:
+                changes[name] = changed
+        return changes
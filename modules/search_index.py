@@ -0,0 +1,205 @@
+from .lazy_document import LazyDocument
+from .path_index import PathIndex, STR, BOOL, type_code
+
+# node_texts中表示没有可搜索文本的键或值（列表下标、null）和容器的值
+NO_TEXT = -1
+CONTAINER = -2
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def search_text(value):
+    """
+    值参与搜索的文本（小写），容器和null返回None
+    """
+    code = type_code(value)
+    if code == STR:
+        return value.lower()
+    if STR < code <= BOOL:
+        return str(value).lower()
+    return None
+
+def _lookup(data, tokens):
+    node = data
+    for token in tokens:
+        node = node.loaded(token) if isinstance(node, LazyDocument) else node[token]
+    return node
+
+class SearchIndex:
+    """
+    对象的键和标量值（小写文本）的三字母组倒排索引
+
+    相同的文本只保存一次: 每个文本有一个编号，三字母组 -> 包含它的文本编号，
+    文本编号 -> 以它为键的节点路径、值为它的节点路径。
+    查询时取关键词所有三字母组的编号集合的交集，再逐个确认文本确实包含关键词；
+    不足3个字符的关键词直接检查所有文本（存档中不同的文本只有几千个）。
+    加载后在后台线程中建立，修改文档后调用update()。
+    """
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.texts = []
+        self.text_ids = {}
+        self.grams = {}
+        self.key_nodes = []
+        self.value_nodes = []
+        # 路径 -> (键的文本编号, 值的文本编号)
+        self.node_texts = {}
+        # 容器路径 -> 子节点路径集合，重新索引子树时不必遍历所有路径
+        self.children = {}
+        self._free = []
+
+    @classmethod
+    def build(cls, data):
+        index = cls()
+        index._add_subtree(data, ())
+        return index
+
+    def _intern(self, text):
+        text_id = self.text_ids.get(text)
+        if text_id is not None:
+            return text_id
+        if self._free:
+            text_id = self._free.pop()
+            self.texts[text_id] = text
+        else:
+            text_id = len(self.texts)
+            self.texts.append(text)
+            self.key_nodes.append(set())
+            self.value_nodes.append(set())
+        self.text_ids[text] = text_id
+        grams = self.grams
+        for gram in trigrams(text):
+            postings = grams.get(gram)
+            if postings is None:
+                grams[gram] = {text_id}
+            else:
+                postings.add(text_id)
+        return text_id
+
+    def _release(self, text_id):
+        """
+        文本不再被任何节点引用时从索引中删除
+        """
+        if self.key_nodes[text_id] or self.value_nodes[text_id]:
+            return
+        text = self.texts[text_id]
+        for gram in trigrams(text):
+            postings = self.grams[gram]
+            postings.discard(text_id)
+            if not postings:
+                del self.grams[gram]
+        del self.text_ids[text]
+        self.texts[text_id] = None
+        self._free.append(text_id)
+
+    def _add(self, path, value):
+        key = path[-1]
+        key_id = value_id = NO_TEXT
+        if type(key) is str:
+            key_id = self._intern(key.lower())
+            self.key_nodes[key_id].add(path)
+        text = search_text(value)
+        if text is not None:
+            value_id = self._intern(text)
+            self.value_nodes[value_id].add(path)
+        elif isinstance(value, (dict, list)):
+            value_id = CONTAINER
+        self.node_texts[path] = (key_id, value_id)
+        siblings = self.children.get(path[:-1])
+        if siblings is None:
+            self.children[path[:-1]] = {path}
+        else:
+            siblings.add(path)
+
+    def _add_subtree(self, value, prefix):
+        if not isinstance(value, (dict, list)):
+            return
+        rows = PathIndex.build(value)
+        for row, path in enumerate(rows.paths):
+            self._add(prefix + path, rows.value(row))
+
+    def _drop(self, path):
+        key_id, value_id = self.node_texts.pop(path)
+        siblings = self.children[path[:-1]]
+        siblings.discard(path)
+        if not siblings:
+            del self.children[path[:-1]]
+        if key_id != NO_TEXT:
+            self.key_nodes[key_id].discard(path)
+            self._release(key_id)
+        if value_id >= 0:
+            self.value_nodes[value_id].discard(path)
+            self._release(value_id)
+
+    def update(self, data, tokens, structural=False):
+        """
+        文档在tokens处被修改后更新索引
+
+        参数:
+            data: 文档
+            tokens: 被修改的位置（只含键和下标的路径段）
+            structural: 是否增删了元素（列表中后面元素的路径会变化，重新索引父容器）
+        """
+        tokens = tuple(tokens)
+        if structural:
+            tokens = tokens[:-1]
+        entry = self.node_texts.get(tokens)
+        if entry is not None and entry[1] != CONTAINER:
+            # 标量替换为标量时只更新这一个节点
+            try:
+                value = _lookup(data, tokens)
+            except (KeyError, IndexError, TypeError):
+                value = None
+            else:
+                if not isinstance(value, (dict, list)):
+                    self._drop(tokens)
+                    self._add(tokens, value)
+                    return
+        self._reindex(data, tokens)
+
+    def _reindex(self, data, tokens):
+        """
+        重新索引tokens处的节点及其子孙节点
+        """
+        if not tokens:
+            self._reset()
+            self._add_subtree(data, ())
+            return
+        stale = []
+        pending = [tokens] if tokens in self.node_texts else []
+        while pending:
+            path = pending.pop()
+            stale.append(path)
+            pending.extend(self.children.get(path, ()))
+        for path in stale:
+            self._drop(path)
+        try:
+            value = _lookup(data, tokens)
+        except (KeyError, IndexError, TypeError):
+            return
+        self._add(tokens, value)
+        self._add_subtree(value, tokens)
+
+    def search(self, term):
+        """
+        查找键或值包含term（不区分大小写）的节点
+
+        返回:
+            (键匹配的路径集合, 值匹配的路径集合)
+        """
+        term = term.lower()
+        if len(term) >= 3:
+            postings = sorted((self.grams.get(gram, ()) for gram in trigrams(term)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            candidates = self.text_ids.values()
+        texts = self.texts
+        key_matches = set()
+        value_matches = set()
+        for text_id in candidates:
+            if term in texts[text_id]:
+                key_matches.update(self.key_nodes[text_id])
+                value_matches.update(self.value_nodes[text_id])
+        return key_matches, value_matches
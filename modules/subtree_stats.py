@@ -0,0 +1,152 @@
+from .lazy_document import LazyDocument, UNPARSED
+
+_CONTAINERS = (dict, list)
+
+def scalar_size(value):
+    """
+    标量序列化后长度的估计（字符串不计转义）
+    """
+    kind = type(value)
+    if kind is str:
+        return len(value) + 2
+    if kind is bool:
+        return 4 if value else 5
+    if value is None:
+        return 4
+    return len(repr(value))
+
+def _items(container):
+    if isinstance(container, LazyDocument):
+        return container.loaded_items()
+    if isinstance(container, dict):
+        return container.items()
+    return enumerate(container)
+
+def _child(container, token):
+    # 只读访问，不把延迟解析的文档的成员记为已改动
+    if isinstance(container, LazyDocument):
+        return container.loaded(token)
+    return container[token]
+
+class SubtreeStats:
+    """
+    每个容器的子树统计: 路径 -> (节点数, 行数, 序列化大小估计)
+
+    节点数包括容器自身；行数是indent格式化后的JSON行数；大小按json.dumps的默认分隔符估计。
+    加载后在后台线程中遍历一次建立（entries可以和文档一起缓存），
+    修改文档后调用update()，只重新计算被修改位置的父容器及其上级，界面中的判断都直接读取这里的结果。
+    延迟解析的文档中尚未解析的成员只按原始文本长度计入上级的大小。
+    """
+    def __init__(self, entries=None):
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def build(cls, data):
+        stats = cls()
+        if isinstance(data, _CONTAINERS):
+            stats._measure(data, ())
+        return stats
+
+    def get(self, path):
+        """
+        返回(节点数, 行数, 大小)，路径不是已统计的容器时返回None
+        """
+        return self.entries.get(tuple(path))
+
+    def size(self, path):
+        entry = self.entries.get(tuple(path))
+        return entry[2] if entry is not None else None
+
+    def _measure(self, container, path):
+        """
+        统计container及其所有子孙容器
+        """
+        return self._combine(container, path, True)
+
+    def _combine(self, container, path, deep):
+        """
+        由子节点的统计得到container的统计；deep为False时子容器直接使用已有的统计（缺失时才重新统计）
+        """
+        is_dict = isinstance(container, dict)
+        nodes, lines, size, count = 1, 2, 2, 0
+        for key, child in _items(container):
+            count += 1
+            if is_dict:
+                size += len(key) + 4  # "key":
+            if child is UNPARSED:
+                nodes += 1
+                lines += 1
+                size += container.raw_size(key)
+                continue
+            if type(child) in _CONTAINERS:
+                entry = None if deep else self.entries.get(path + (key,))
+                if entry is None:
+                    entry = self._combine(child, path + (key,), True)
+                nodes += entry[0]
+                lines += entry[1]
+                size += entry[2]
+            else:
+                nodes += 1
+                lines += 1
+                size += scalar_size(child)
+        if count:
+            size += 2 * (count - 1)  # ", "
+        else:
+            lines = 1
+        entry = self.entries[path] = (nodes, lines, size)
+        return entry
+
+    def update(self, data, tokens, structural=False):
+        """
+        文档在tokens处被修改后更新统计
+
+        参数:
+            data: 文档
+            tokens: 被修改的位置（只含键和下标的路径段）
+            structural: 是否增删了元素（列表中后面元素的路径会变化）
+        """
+        tokens = tuple(tokens)
+        if not tokens:
+            self.entries = {}
+            if isinstance(data, _CONTAINERS):
+                self._measure(data, ())
+            return
+        chain = [data]
+        try:
+            for token in tokens[:-1]:
+                chain.append(_child(chain[-1], token))
+        except (KeyError, IndexError, TypeError):
+            # 路径已不存在（如上级已被删除），重新统计整个文档
+            self.update(data, ())
+            return
+
+        parent_path = tokens[:-1]
+        changed = tokens if not structural else parent_path
+        # 被替换或删除的子树以及位置改变的兄弟节点的统计都已失效
+        depth = len(changed)
+        for path in [path for path in self.entries if len(path) >= depth and path[:depth] == changed]:
+            del self.entries[path]
+        if structural:
+            self._measure(chain[-1], parent_path)
+        else:
+            self._combine(chain[-1], parent_path, False)
+        for depth in range(len(chain) - 2, -1, -1):
+            self._combine(chain[depth], tokens[:depth], False)
+
+    def merge(self, data, other, prefix):
+        """
+        用other中prefix下的统计替换本对象中的对应项，并重新计算prefix的上级
+        （用于后台线程统计完延迟解析的部分之后）
+        """
+        prefix = tuple(prefix)
+        depth = len(prefix)
+        for path in [path for path in self.entries if path[:depth] == prefix]:
+            del self.entries[path]
+        for path, entry in other.entries.items():
+            if path[:depth] == prefix:
+                self.entries[path] = entry
+        chain = [data]
+        for token in prefix[:-1]:
+            chain.append(_child(chain[-1], token))
+        for depth in range(len(chain) - 1, -1, -1):
+            self._combine(chain[depth], prefix[:depth], False)
@@ -0,0 +1,403 @@
+import sys
+import customtkinter as ctk
+from .lazy_document import LazyDocument, UNPARSED
+
+class TreeRow:
+    """
+    可见行模型中的一行: 一个节点在其父容器中的位置
+    """
+    __slots__ = ('container', 'key', 'path', 'depth')
+
+    def __init__(self, container, key, path, depth):
+        self.container = container
+        self.key = key
+        self.path = path
+        self.depth = depth
+
+    def value(self):
+        """
+        节点当前的值（每次从父容器读取，编辑后无需更新行）；延迟解析的文档中尚未解析的成员返回UNPARSED
+        """
+        if isinstance(self.container, LazyDocument):
+            return self.container.loaded(self.key)
+        return self.container[self.key]
+
+    def is_container(self):
+        value = self.value()
+        return value is UNPARSED or isinstance(value, (dict, list))
+
+_END = object()
+
+def _children(value):
+    if isinstance(value, dict):
+        return list(value)
+    return range(len(value))
+
+class TreeModel:
+    """
+    数据树的扁平可见行模型
+
+    rows按显示顺序保存当前可见的所有行，展开节点时把子节点的行插入到它后面，
+    折叠时删除后面连续的、层级更深的行。界面只需要按滚动位置读取rows中的一小段，
+    因此重绘的开销只取决于可见区域的行数，与文档大小无关。
+    展开状态按路径记录，重新设置文档（如外部修改后刷新）时会按路径恢复。
+    """
+    def __init__(self, inline=None):
+        """
+        参数:
+            inline: inline(路径)为True的容器在上级展开时自动展开（用户折叠过的除外）
+        """
+        self.data = None
+        self.rows = []
+        self.inline = inline
+        # 已展开的节点路径（路径段元组）
+        self.expanded = set()
+        # 用户折叠过的节点路径，不再自动展开
+        self.collapsed = set()
+
+    def set_root(self, data, expanded=None):
+        """
+        设置要显示的文档
+
+        参数:
+            data: 文档
+            expanded: 要展开的节点路径，默认保留当前的展开状态
+        """
+        self.data = data
+        if expanded is not None:
+            self.expanded = set(expanded)
+            self.collapsed = set()
+        self.rows = self._build_rows(data, (), 0) if isinstance(data, (dict, list)) else []
+
+    def _build_rows(self, value, path, depth):
+        """
+        生成value的子节点的行，已展开的子节点递归生成
+        """
+        rows = []
+        stack = [(value, path, depth, iter(_children(value)))]
+        while stack:
+            container, prefix, level, keys = stack[-1]
+            key = next(keys, _END)
+            if key is _END:
+                stack.pop()
+                continue
+            row = TreeRow(container, key, prefix + (key,), level)
+            rows.append(row)
+            if row.path in self.expanded or self._inline(row.path):
+                child = row.value()
+                if child is UNPARSED:
+                    child = container.peek(key)
+                if isinstance(child, (dict, list)):
+                    stack.append((child, row.path, level + 1, iter(_children(child))))
+        return rows
+
+    def _inline(self, path):
+        if self.inline is None or path in self.collapsed or not self.inline(path):
+            return False
+        self.expanded.add(path)
+        return True
+
+    def is_expanded(self, row):
+        return row.path in self.expanded
+
+    def _subtree_end(self, index):
+        """
+        返回第index行的子孙行之后的位置
+        """
+        depth = self.rows[index].depth
+        end = index + 1
+        rows = self.rows
+        while end < len(rows) and rows[end].depth > depth:
+            end += 1
+        return end
+
+    def expand(self, index):
+        """
+        展开第index行，返回插入的行数；延迟解析的成员在这里解析
+        """
+        row = self.rows[index]
+        if row.path in self.expanded:
+            return 0
+        value = row.value()
+        if value is UNPARSED:
+            value = row.container.peek(row.key)
+        if not isinstance(value, (dict, list)):
+            return 0
+        self.expanded.add(row.path)
+        self.collapsed.discard(row.path)
+        children = self._build_rows(value, row.path, row.depth + 1)
+        self.rows[index + 1:index + 1] = children
+        return len(children)
+
+    def collapse(self, index):
+        """
+        折叠第index行，返回删除的行数；子孙节点的展开状态保留，再次展开时恢复
+        """
+        row = self.rows[index]
+        if row.path not in self.expanded:
+            return 0
+        self.expanded.discard(row.path)
+        self.collapsed.add(row.path)
+        end = self._subtree_end(index)
+        del self.rows[index + 1:end]
+        return end - index - 1
+
+    def index_of(self, path, start=0):
+        """
+        查找路径对应的可见行，从start开始向后查找；不可见时返回None
+        """
+        rows = self.rows
+        depth = len(path) - 1
+        for index in range(start, len(rows)):
+            row = rows[index]
+            if row.path == path:
+                return index
+            if row.depth < depth:
+                # 已经离开了父节点的子树
+                return None
+        return None
+
+    def reveal(self, path):
+        """
+        展开path的所有上级节点
+
+        返回:
+            int: path所在的行；路径不存在时返回None
+        """
+        path = tuple(path)
+        index = 0
+        for depth in range(1, len(path) + 1):
+            index = self.index_of(path[:depth], index)
+            if index is None:
+                return None
+            if depth < len(path):
+                self.expand(index)
+                index += 1
+        return index
+
+    def toggle(self, index):
+        if self.rows[index].path in self.expanded:
+            return -self.collapse(index)
+        return self.expand(index)
+
+    def label(self, row):
+        """
+        行的显示文本
+        """
+        value = row.value()
+        key = row.key
+        if isinstance(key, int):
+            key_text = f'[{key}]'
+            if isinstance(value, dict) and 'Name' in value:
+                key_text += f' {value["Name"]}'
+        else:
+            key_text = key
+        if value is UNPARSED:
+            return f'📁 {key_text}'
+        if isinstance(value, (dict, list)):
+            icon = '📂' if row.path in self.expanded else '📁'
+            return f'{icon} {key_text}: {type(value).__name__} ({len(value)} items)'
+        text = str(value)
+        return f'📄 {key_text}: {text[:30]}{"..." if len(text) > 30 else ""}'
+
+class VirtualTree(ctk.CTkFrame):
+    """
+    虚拟化的数据树控件
+
+    只创建能填满可见区域的一组行按钮，滚动时把它们重新指向TreeModel.rows中对应的行并更新文本，
+    控件数量和重绘开销只取决于可见区域的高度。
+    """
+    ROW_HEIGHT = 28
+    INDENT = 20
+
+    def __init__(self, master, on_select=None, inline=None, **kwargs):
+        """
+        参数:
+            master: 父控件
+            on_select: 点击行时的回调 on_select(row)，容器节点会先展开或折叠
+            inline: 见TreeModel
+        """
+        super().__init__(master, **kwargs)
+        self.model = TreeModel(inline)
+        self.on_select = on_select
+        self.offset = 0  # 可见区域顶部对应的像素位置
+        self.viewport_height = 0
+        self.selected_path = None
+        self.pool = []
+        # 每个行按钮当前显示的内容 (路径, 文本, 层级, 是否选中)，没有变化时跳过configure
+        self._slot_state = []
+        # 路径 -> 当前显示它的行按钮编号，随重绘同步更新，用于编辑后只更新一个控件
+        self._slot_of = {}
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.body.bind('<Configure>', self._on_resize)
+        self._bind_wheel(self.body)
+
+    def _bind_wheel(self, widget):
+        if sys.platform.startswith('linux'):
+            widget.bind('<Button-4>', self._on_wheel)
+            widget.bind('<Button-5>', self._on_wheel)
+        else:
+            widget.bind('<MouseWheel>', self._on_wheel)
+
+    def set_data(self, data, expanded=None):
+        """
+        显示文档；expanded为要展开的节点路径，默认保留当前的展开状态
+        """
+        self.model.set_root(data, expanded)
+        self.offset = 0
+        self.redraw()
+
+    def refresh(self):
+        """
+        文档结构被替换或增删后按当前展开状态重建可见行
+        """
+        self.model.set_root(self.model.data)
+        self.redraw()
+
+    def reveal(self, path):
+        """
+        展开path的所有上级节点并滚动到它（居中显示）
+
+        返回:
+            bool: 路径在文档中存在
+        """
+        index = self.model.reveal(path)
+        if index is None:
+            return False
+        self.offset = max(0, index * self.ROW_HEIGHT - self.viewport_height // 2)
+        self.redraw()
+        return True
+
+    def total_height(self):
+        return len(self.model.rows) * self.ROW_HEIGHT
+
+    def _on_resize(self, event):
+        # 事件中的高度是实际像素，place和按钮高度使用未缩放的尺寸
+        self.viewport_height = int(event.height / self._get_widget_scaling())
+        needed = self.viewport_height // self.ROW_HEIGHT + 2
+        while len(self.pool) < needed:
+            slot = len(self.pool)
+            button = ctk.CTkButton(
+                self.body,
+                text="",
+                command=lambda s=slot: self._on_click(s),
+                anchor="w",
+                height=self.ROW_HEIGHT - 2,
+                fg_color="transparent",
+                text_color=("gray10", "gray90"),
+                hover_color=("gray80", "gray20")
+            )
+            self._bind_wheel(button)
+            self.pool.append(button)
+            self._slot_state.append(None)
+        self.redraw()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.offset = int(float(amount) * self.total_height())
+        elif unit == 'pages':
+            self.offset += int(amount) * max(self.viewport_height - self.ROW_HEIGHT, self.ROW_HEIGHT)
+        else:
+            self.offset += int(float(amount)) * self.ROW_HEIGHT
+        self.redraw()
+
+    def _on_wheel(self, event):
+        if getattr(event, 'num', None) in (4, 5):
+            steps = -3 if event.num == 4 else 3
+        elif sys.platform == 'darwin':
+            steps = -event.delta
+        else:
+            steps = -round(event.delta / 40) or (-1 if event.delta > 0 else 1)
+        self.offset += steps * self.ROW_HEIGHT
+        self.redraw()
+
+    def redraw(self):
+        """
+        按滚动位置把行按钮指向对应的行；滚动以整行为单位，只有文本、缩进或选中状态变化的按钮才会被更新
+        """
+        rows = self.model.rows
+        height = self.ROW_HEIGHT
+        total = self.total_height()
+        # 滚动到底时最后一行完整显示
+        last_first = max(0, -(-(total - self.viewport_height) // height))
+        first = min(max(0, self.offset) // height, last_first)
+        self.offset = first * height
+        for slot in range(len(self.pool)):
+            index = first + slot
+            self._paint(slot, rows[index] if index < len(rows) else None)
+        if total > self.viewport_height > 0:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.viewport_height) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _paint(self, slot, row):
+        """
+        让一个行按钮显示row（None表示隐藏），同步更新路径 -> 按钮的登记
+        """
+        button = self.pool[slot]
+        previous = self._slot_state[slot]
+        if row is None:
+            if previous is not None:
+                button.place_forget()
+                if self._slot_of.get(previous[0]) == slot:
+                    del self._slot_of[previous[0]]
+                self._slot_state[slot] = None
+            return
+        state = (row.path, self.model.label(row), row.depth, row.path == self.selected_path)
+        if state == previous:
+            return
+        path, text, depth, selected = state
+        if previous is None or (previous[1], previous[3]) != (text, selected):
+            button.configure(text=text, fg_color=("gray75", "gray25") if selected else "transparent")
+        if previous is None or previous[2] != depth:
+            button.place(x=depth * self.INDENT, y=slot * self.ROW_HEIGHT, relwidth=1.0)
+        if previous is not None and previous[0] != path and self._slot_of.get(previous[0]) == slot:
+            del self._slot_of[previous[0]]
+        self._slot_of[path] = slot
+        self._slot_state[slot] = state
+
+    def update_row(self, path):
+        """
+        路径对应的值被修改后只更新显示它的那一个行按钮；该行不在可见区域时不做任何事
+
+        返回:
+            bool: 是否有按钮被更新
+        """
+        slot = self._slot_of.get(tuple(path))
+        if slot is None:
+            return False
+        self._paint(slot, self.model.rows[self.offset // self.ROW_HEIGHT + slot])
+        return True
+
+    def select(self, path, reveal=False):
+        """
+        选中路径对应的行: 只重绘之前选中的行和新选中的行；reveal为True时展开上级节点并滚动到该行
+        """
+        previous, self.selected_path = self.selected_path, tuple(path)
+        if reveal and self.reveal(self.selected_path):
+            return
+        for old in (previous, self.selected_path):
+            if old is not None:
+                self.update_row(old)
+
+    def row_at(self, slot):
+        index = self.offset // self.ROW_HEIGHT + slot
+        return index if index < len(self.model.rows) else None
+
+    def _on_click(self, slot):
+        index = self.row_at(slot)
+        if index is None:
+            return
+        row = self.model.rows[index]
+        if row.is_container():
+            self.selected_path = row.path
+            self.model.toggle(index)
+            self.redraw()
+        else:
+            self.select(row.path)
+        if self.on_select is not None:
+            self.on_select(row)
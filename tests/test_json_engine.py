@@ -0,0 +1,9 @@
+import json
+import pytest
+from modules.json_engine import ENGINES, probe_engine
+
+@pytest.mark.parametrize('text', [b'{"a": -9223372036854775809}', b'[9223372036854775808]'])
+def test_parsers_keep_integers_outside_int64(text):
+    for name in ENGINES:
+        if probe_engine(name)['available']:
+            assert ENGINES[name]().loads(text) == json.loads(text), name
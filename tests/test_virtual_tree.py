@@ -0,0 +1,42 @@
+from modules.virtual_tree import VirtualTree, TreeModel
+
+SELECTED = ("gray75", "gray25")
+
+class FakeButton:
+    def __init__(self):
+        self.fg_color = "transparent"
+
+    def configure(self, text=None, fg_color=None):
+        self.fg_color = fg_color
+
+    def place(self, **kwargs):
+        pass
+
+    def place_forget(self):
+        pass
+
+class FakeScrollbar:
+    def set(self, first, last):
+        pass
+
+def make_tree(data, slots=3):
+    # 不创建Tk窗口，只保留重绘和点击用到的状态
+    tree = VirtualTree.__new__(VirtualTree)
+    tree.model = TreeModel()
+    tree.on_select = None
+    tree.offset = 0
+    tree.viewport_height = slots * VirtualTree.ROW_HEIGHT
+    tree.selected_path = None
+    tree.pool = [FakeButton() for _ in range(slots)]
+    tree._slot_state = [None] * slots
+    tree._slot_of = {}
+    tree.scrollbar = FakeScrollbar()
+    tree.set_data(data)
+    return tree
+
+def test_clicking_second_leaf_clears_first():
+    tree = make_tree({'a': 1, 'b': 2, 'c': 3})
+    tree._on_click(0)
+    tree._on_click(1)
+    assert [button.fg_color for button in tree.pool] == ["transparent", SELECTED, "transparent"]
+    assert tree.selected_path == ('b',)